@@ -1,11 +1,29 @@
 """
 Fund NAV and Share Roll Calculator - Series Accounting
-Form-based input with roll-up logic and detailed output.
+Grid-based input with roll-up logic and detailed output.
 """
 
 import streamlit as st
 import pandas as pd
-import io
+
+import fund_store
+# excel_export (openpyxl) and nav_history (numpy) are imported where they are used,
+# so the first page render doesn't pay for them
+
+from engine import MONTHS, advance_share_roll, calculate_share_roll, build_output_rows, solve_redemption
+from audit_diff import diff_results
+from fund_inputs import (
+    TABLE_COLUMNS, NEW_SERIES, MULTIPLE_SERIES,
+    default_tables, tables_from_rows, table_rows, apply_delta,
+    prior_series_records, series_options, monthly_records, stored_calc_inputs, next_year_inputs,
+)
+
+# Excel export modes (see excel_export)
+FORMULA_MODES = {
+    'formulas': "Full formulas (audit)",
+    'sampled': "Sampled formulas",
+    'values': "Values only (fast)",
+}
 
 st.set_page_config(page_title="Fund NAV Calculator", page_icon="📊", layout="wide")
 
@@ -13,14 +31,164 @@ st.title("📊 Fund NAV & Share Roll Calculator")
 st.markdown("### Series Accounting")
 st.markdown("---")
 
-# Initialize session state
-if 'num_series' not in st.session_state:
-    st.session_state.num_series = 1
-
-for _i in range(12):
-    _key = f'num_multi_redemp_{_i}'
+# Initialize session state: one typed table per input grid, plus the settings
+# widgets (keyed so a stored fund can be re-opened into them)
+SETTING_DEFAULTS = {
+    'par_value': 1000.0,
+    'existing_series_pricing': 'post_pl',
+    'pl_allocation': 'month_end',
+    'new_series_mgmt_fee': 0.0,
+    'new_series_incentive_fee': 0.0,
+    'prior_year': 2023,
+}
+for _key, _value in SETTING_DEFAULTS.items():
     if _key not in st.session_state:
-        st.session_state[_key] = 2
+        st.session_state[_key] = _value
+
+if 'fund_inputs' not in st.session_state:
+    st.session_state.fund_inputs = default_tables()
+if 'editor_version' not in st.session_state:
+    st.session_state.editor_version = 0
+fund_inputs = st.session_state.fund_inputs
+editor_version = st.session_state.editor_version
+
+
+@st.cache_resource
+def get_store():
+    return fund_store.connect()
+
+
+def apply_editor_delta(table_name):
+    """Data editor callback: re-parse only the cells changed since the last edit."""
+    editor_key = f'{table_name}_editor_{st.session_state.editor_version}'
+    apply_delta(st.session_state.fund_inputs[table_name], st.session_state[editor_key])
+
+
+def open_stored_fund(fund, year):
+    """Load a stored fund-year into the grids and settings, showing its stored results."""
+    inputs = fund_store.load_inputs(get_store(), fund, year)
+    if inputs is None:
+        return
+    st.session_state.fund_inputs = tables_from_rows(inputs['tables'])
+    for key, default in SETTING_DEFAULTS.items():
+        st.session_state[key] = inputs['settings'].get(key, default)
+    st.session_state.fund_name = fund
+    st.session_state.editor_version += 1
+    st.session_state.show_stored_results = True
+
+
+def roll_forward_fund(fund, year):
+    """
+    Open the year after a stored fund-year, its Step 1 prefilled from that year's
+    stored result (ending shares, NAVs, fee rates and high-water marks).
+    """
+    store = get_store()
+    inputs = fund_store.load_inputs(store, fund, year)
+    calc_inputs, errors = stored_calc_inputs(inputs)
+    result = None if errors else fund_store.load_result(store, fund, year, fund_store.input_hash(calc_inputs))
+    if result is None or len(result['monthly_flows']) != 12:
+        st.session_state.roll_forward_error = (
+            f"Calculate {fund} ({year}) for the full year before rolling it forward" if result is None else
+            f"{fund} ({year}) is closed through {MONTHS[len(result['monthly_flows']) - 1]}; "
+            f"close December before rolling it forward"
+        )
+        return
+    next_inputs = next_year_inputs(inputs, result)
+    st.session_state.fund_inputs = tables_from_rows(next_inputs['tables'])
+    for key, default in SETTING_DEFAULTS.items():
+        st.session_state[key] = next_inputs['settings'].get(key, default)
+    st.session_state.fund_name = fund
+    st.session_state.editor_version += 1
+    st.session_state.pop('show_stored_results', None)
+
+
+def current_stored_inputs():
+    """The grids and settings as stored by fund_store."""
+    return {
+        'tables': {name: table_rows(table) for name, table in st.session_state.fund_inputs.items()},
+        'settings': {key: st.session_state[key] for key in SETTING_DEFAULTS},
+    }
+
+
+def save_current_inputs():
+    """Save button callback: store the current inputs under the fund name and year."""
+    inputs = current_stored_inputs()
+    calc_inputs, _ = stored_calc_inputs(inputs)
+    fund, year = st.session_state.fund_name, calc_inputs['current_year']
+    fund_store.save_inputs(get_store(), fund, year, inputs, fund_store.input_hash(calc_inputs))
+    st.session_state.save_message = f"Saved {fund} ({year})"
+
+
+def editor_frame(table_name):
+    """The frame a grid opens with; built once per loaded fund rather than on every rerun."""
+    if st.session_state.get('editor_frames_version') != st.session_state.editor_version:
+        st.session_state.editor_frames = {}
+        st.session_state.editor_frames_version = st.session_state.editor_version
+    frames = st.session_state.editor_frames
+    if table_name not in frames:
+        base = st.session_state.fund_inputs[table_name]['base']
+        if table_name == 'multi':
+            frames[table_name] = pd.DataFrame({
+                'Month': pd.Series(base['Month'], dtype=object),
+                'Redemp $': pd.Series(base['Redemp $'], dtype=object),
+                'Day': pd.Series(base['Day'], dtype=object),
+                'Full?': pd.Series(base['Full?'], dtype=bool),
+                'From Series': pd.Series(base['From Series'], dtype=object),
+            })
+        else:
+            frames[table_name] = pd.DataFrame(base, columns=TABLE_COLUMNS[table_name])
+    return frames[table_name]
+
+
+@st.cache_resource
+def prior_column_config():
+    return {
+        'Series': st.column_config.TextColumn("Series Name"),
+        'Ending Shares': st.column_config.TextColumn("Ending Shares"),
+        'NAV per Share': st.column_config.TextColumn("NAV per Share ($)"),
+        'Mgmt Fee %': st.column_config.TextColumn("Mgmt Fee %", help="Blank uses the sidebar default"),
+        'Incentive %': st.column_config.TextColumn("Incentive %", help="Blank uses the sidebar default"),
+        'High-Water Mark': st.column_config.TextColumn("High-Water Mark", help="Blank uses the NAV per share"),
+    }
+
+
+@st.fragment
+def fund_complex_export(stored_choices):
+    """Sidebar export of several saved fund-years into one workbook; reruns on its own."""
+    st.subheader("Fund Complex Export")
+    complex_choices = st.multiselect(
+        "Funds to Include",
+        options=stored_choices,
+        format_func=lambda choice: f"{choice[0]} ({choice[1]})",
+        help="One summary sheet per fund plus a consolidated roll-up sheet"
+    )
+    complex_inputs = []
+    for fund, year in complex_choices:
+        calc_inputs, errors = stored_calc_inputs(fund_store.load_inputs(get_store(), fund, year))
+        if errors or not calc_inputs['prior_series']:
+            st.warning(f"Skipping {fund} ({year}): fix its inputs first")
+        else:
+            complex_inputs.append((fund, year, calc_inputs))
+
+    # Built only when the button is clicked, from stored results where they are current
+    def fund_complex_workbook():
+        from excel_export import build_fund_complex_workbook
+        return build_fund_complex_workbook([{
+            'fund': fund,
+            'year': year,
+            'calc_inputs': calc_inputs,
+            'result': fund_store.load_result(get_store(), fund, year, fund_store.input_hash(calc_inputs)),
+        } for fund, year, calc_inputs in complex_inputs])
+
+    if complex_inputs:
+        st.download_button(
+            label="📥 Download Complex Workbook",
+            data=fund_complex_workbook,
+            file_name="fund_complex_share_roll.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click='ignore'
+        )
+
 
 # Sidebar configuration
 st.sidebar.header("Configuration")
@@ -28,12 +196,72 @@ st.sidebar.header("Configuration")
 par_value = st.sidebar.number_input(
     "Par Value / New Series Share Price ($)",
     min_value=0.01,
-    value=1000.0,
+    key='par_value',
     step=1.0,
     format="%.2f",
     help="Par value for roll-up determination and price for new series shares"
 )
 
+existing_series_pricing = st.sidebar.radio(
+    "Contributions into Existing Series Priced At",
+    options=['post_pl', 'pre_pl'],
+    key='existing_series_pricing',
+    format_func=lambda p: "Post-P/L NAV (month-end)" if p == 'post_pl' else "Pre-P/L NAV (month-start)",
+    help="NAV per share used when a contribution targets an existing series instead of creating a new one"
+)
+
+pl_allocation = st.sidebar.radio(
+    "Monthly P/L Allocated On",
+    options=['month_end', 'daily_capital'],
+    key='pl_allocation',
+    format_func=lambda a: "NAV after contributions" if a == 'month_end' else "Average daily capital (dated flows)",
+    help="Average daily capital weights each series' P/L share by the days its contributions and redemptions "
+         "were invested, using the Contrib Day / Redemp Day columns (blank: 1st of the month / month end)"
+)
+
+st.sidebar.subheader("New Series Fees")
+new_series_mgmt_fee = st.sidebar.number_input(
+    "Management Fee (% p.a.)",
+    min_value=0.0,
+    max_value=100.0,
+    key='new_series_mgmt_fee',
+    step=0.25,
+    format="%.2f",
+    help="Annual management fee, accrued monthly on post-P/L NAV. Also the default for prior series left blank."
+)
+new_series_incentive_fee = st.sidebar.number_input(
+    "Incentive Fee (%)",
+    min_value=0.0,
+    max_value=100.0,
+    key='new_series_incentive_fee',
+    step=1.0,
+    format="%.2f",
+    help="Charged at year end on gains above each series' high-water mark. Also the default for prior series left blank."
+)
+
+st.sidebar.subheader("Saved Funds")
+fund_name = st.sidebar.text_input("Fund Name", key='fund_name', help="Inputs and results are saved under this name and year")
+stored_funds = fund_store.list_fund_years(get_store())
+stored_choices = [(fund, year) for fund, years in stored_funds.items() for year in years]
+if stored_choices:
+    open_choice = st.sidebar.selectbox(
+        "Open Saved Fund",
+        options=stored_choices,
+        format_func=lambda choice: f"{choice[0]} ({choice[1]})"
+    )
+    st.sidebar.button("📂 Open", on_click=open_stored_fund, args=open_choice)
+    st.sidebar.button(f"⏭️ Start {open_choice[1] + 1} From Year End", on_click=roll_forward_fund, args=open_choice,
+                      help="Prefill Step 1 with this year's ending series, fee rates and high-water marks")
+    if 'roll_forward_error' in st.session_state:
+        st.sidebar.warning(st.session_state.pop('roll_forward_error'))
+if fund_name:
+    st.sidebar.button("💾 Save Inputs", on_click=save_current_inputs)
+if 'save_message' in st.session_state:
+    st.sidebar.success(st.session_state.pop('save_message'))
+if stored_choices:
+    with st.sidebar:
+        fund_complex_export(stored_choices)
+
 # =============================================================================
 # STEP 1: Prior Year Ending Balances
 # =============================================================================
@@ -46,7 +274,7 @@ with col_year1:
         "Prior Year",
         min_value=2000,
         max_value=2100,
-        value=2023,
+        key='prior_year',
         step=1,
         help="The year of the audited financials"
     )
@@ -64,87 +292,20 @@ st.markdown("---")
 st.markdown("Enter the prior year ending shares and NAV per share for each series.")
 st.markdown("*Note: The first series entered is the 'Initial Series' for roll-up purposes.*")
 
-# Add/Remove series buttons
-col_add, col_remove, col_spacer = st.columns([1, 1, 4])
-
-with col_add:
-    if st.button("➕ Add Series"):
-        st.session_state.num_series += 1
-        st.rerun()
-
-with col_remove:
-    if st.button("➖ Remove Series") and st.session_state.num_series > 1:
-        st.session_state.num_series -= 1
-        st.rerun()
-
-# Column headers
-col1, col2, col3, col4 = st.columns([2, 1.5, 1.5, 1.5])
-with col1:
-    st.markdown("**Series Name**")
-with col2:
-    st.markdown("**Ending Shares**")
-with col3:
-    st.markdown("**NAV per Share**")
-with col4:
-    st.markdown("**Total NAV**")
-
-def parse_float(val, default=0.0):
-    if val is None or str(val).strip() == '':
-        return default
-    try:
-        cleaned = str(val).replace(',', '').replace('$', '').strip()
-        return float(cleaned)
-    except:
-        return default
-
-prior_series_inputs = []
-
-for i in range(st.session_state.num_series):
-    col1, col2, col3, col4 = st.columns([2, 1.5, 1.5, 1.5])
-
-    with col1:
-        default_name = "Initial Series" if i == 0 else (f"Series {chr(64 + i)}" if i < 26 else f"Series {i}")
-        name = st.text_input(
-            "Series Name",
-            key=f"prior_series_name_{i}",
-            value=default_name,
-            label_visibility="collapsed",
-            placeholder="Series Name"
-        )
-        if i == 0:
-            st.caption("(Initial Series)")
+st.data_editor(
+    editor_frame('prior'),
+    key=f'prior_editor_{editor_version}',
+    on_change=apply_editor_delta,
+    args=('prior',),
+    num_rows="dynamic",
+    hide_index=True,
+    width='stretch',
+    column_config=prior_column_config()
+)
 
-    with col2:
-        shares_str = st.text_input(
-            "Ending Shares",
-            key=f"prior_series_shares_{i}",
-            value="",
-            label_visibility="collapsed",
-            placeholder="Enter shares"
-        )
-        shares = parse_float(shares_str, 0.0)
-
-    with col3:
-        nav_str = st.text_input(
-            "NAV per Share ($)",
-            key=f"prior_series_nav_{i}",
-            value="",
-            label_visibility="collapsed",
-            placeholder="Enter NAV/share"
-        )
-        nav = parse_float(nav_str, 0.0)
-
-    with col4:
-        total = shares * nav
-        st.markdown(f"**${total:,.2f}**")
-
-    prior_series_inputs.append({
-        'Series': name,
-        'Ending Shares': shares,
-        'NAV per Share': nav,
-        'Total NAV': total,
-        'is_initial': i == 0
-    })
+prior_series_inputs = prior_series_records(fund_inputs['prior'], new_series_mgmt_fee, new_series_incentive_fee)
+for error in fund_inputs['prior']['errors']:
+    st.warning(f"⚠️ {error}")
 
 valid_prior_series = [s for s in prior_series_inputs if s['Series'] and s['Ending Shares'] > 0]
 
@@ -159,423 +320,176 @@ if valid_prior_series:
 
 st.markdown("---")
 
+
 # =============================================================================
 # STEP 2: Monthly Activity
 # =============================================================================
-st.header(f"Step 2: Monthly Activity for {current_year}")
-
-st.markdown("""
+@st.cache_resource(max_entries=64)
+def activity_column_config(series_choices):
+    series_choices = list(series_choices)
+    return {
+        'Month': st.column_config.TextColumn("Month"),
+        'P/L': st.column_config.TextColumn("P/L"),
+        'Contrib': st.column_config.TextColumn("Contrib"),
+        'Contrib Day': st.column_config.TextColumn("Contrib Day", help="Day of the month (blank: the 1st)"),
+        'Into Series': st.column_config.SelectboxColumn("Into Series", options=[NEW_SERIES] + series_choices,
+                                                        help="Blank or 'New Series' creates Series M/YYYY"),
+        'Redemp $': st.column_config.TextColumn("Redemp $"),
+        'Redemp Day': st.column_config.TextColumn("Redemp Day", help="Day of the month (blank: month end)"),
+        'Full?': st.column_config.CheckboxColumn("Full?", help="Check for full redemption of selected series"),
+        'From Series': st.column_config.SelectboxColumn("From Series", options=series_choices + [MULTIPLE_SERIES]),
+    }
+
+
+@st.cache_resource(max_entries=64)
+def multi_column_config(series_choices):
+    return {
+        'Month': st.column_config.SelectboxColumn("Month", options=MONTHS),
+        'Redemp $': st.column_config.TextColumn("Redemp $"),
+        'Day': st.column_config.TextColumn("Day", help="Day of the month (blank: month end)"),
+        'Full?': st.column_config.CheckboxColumn("Full?"),
+        'From Series': st.column_config.SelectboxColumn("From Series", options=list(series_choices)),
+    }
+
+
+@st.fragment
+def monthly_activity_section(prior_series_inputs, valid_prior_series):
+    """Steps 2 and 3. Edits here rerun this section only, not Step 1 or the sidebar."""
+    st.header(f"Step 2: Monthly Activity for {current_year}")
+
+    st.markdown("""
 Enter the P/L, contributions, and redemptions for each month.
 - **P/L**: Used to calculate NAV per share (not shown in final output)
-- **Contributions**: Creates a new series (Series M/YYYY)
+- **Contributions**: Creates a new series (Series M/YYYY), or issues into an existing series at its NAV per share
 - **Redemptions**: Enter amount and select which series
+- **Days**: Optional day of the month for each flow, used when P/L is allocated on average daily capital
 """)
 
-months = ['January', 'February', 'March', 'April', 'May', 'June',
-          'July', 'August', 'September', 'October', 'November', 'December']
-
-def get_available_series_up_to_month(month_idx, prior_series, monthly_data, current_year):
-    available = [s['Series'] for s in prior_series if s['Ending Shares'] > 0]
-    for i in range(month_idx):
-        contrib = monthly_data[i]['contributions']
-        if contrib > 0:
-            month_num = i + 1
-            new_series_name = f"Series {month_num}/{current_year}"
-            available.append(new_series_name)
-    return available
-
-monthly_data = []
-
-st.markdown("---")
-col_month, col_pl, col_contrib, col_redemp, col_full, col_series = st.columns([1.2, 1.2, 1.2, 1.2, 0.8, 1.8])
-with col_month:
-    st.markdown("**Month**")
-with col_pl:
-    st.markdown("**P/L**")
-with col_contrib:
-    st.markdown("**Contrib**")
-with col_redemp:
-    st.markdown("**Redemp $**")
-with col_full:
-    st.markdown("**Full?**")
-with col_series:
-    st.markdown("**From Series**")
-
-for i, month in enumerate(months):
-    col_month, col_pl, col_contrib, col_redemp, col_full, col_series = st.columns([1.2, 1.2, 1.2, 1.2, 0.8, 1.8])
-
-    with col_month:
-        st.markdown(f"**{month}**")
-
-    with col_pl:
-        pl_str = st.text_input("P/L", key=f"pl_{i}", value="", label_visibility="collapsed", placeholder="0")
-        pl = parse_float(pl_str, 0.0)
-
-    with col_contrib:
-        contrib_str = st.text_input("Contributions", key=f"contrib_{i}", value="", label_visibility="collapsed", placeholder="0")
-        contrib = parse_float(contrib_str, 0.0)
+    series_choices = tuple(series_options(prior_series_inputs, current_year))
+
+    st.data_editor(
+        editor_frame('activity'),
+        key=f'activity_editor_{editor_version}',
+        on_change=apply_editor_delta,
+        args=('activity',),
+        num_rows="fixed",
+        hide_index=True,
+        width='stretch',
+        disabled=['Month'],
+        column_config=activity_column_config(series_choices)
+    )
 
-    with col_redemp:
-        redemp_str = st.text_input("Redemptions", key=f"redemp_{i}", value="", label_visibility="collapsed", placeholder="0")
-        redemp = parse_float(redemp_str, 0.0)
+    st.markdown("**Multiple Series Redemptions**")
+    st.caption("Rows apply to months whose From Series is 'Multiple Series'.")
+    st.data_editor(
+        editor_frame('multi'),
+        key=f'multi_editor_{editor_version}',
+        on_change=apply_editor_delta,
+        args=('multi',),
+        num_rows="dynamic",
+        hide_index=True,
+        width='stretch',
+        column_config=multi_column_config(series_choices)
+    )
 
-    with col_full:
-        full_redemption = st.checkbox("Full", key=f"full_redemp_{i}", help="Check for full redemption of selected series")
+    monthly_data, input_errors = monthly_records(
+        fund_inputs['activity'], fund_inputs['multi'], prior_series_inputs, current_year, existing_series_pricing,
+        pl_allocation
+    )
+    for error in input_errors:
+        st.warning(f"⚠️ {error}")
 
-    with col_series:
-        available_series = get_available_series_up_to_month(i, prior_series_inputs, monthly_data, current_year)
-        if (redemp > 0 or full_redemption) and available_series:
-            series_options = available_series + ["Multiple Series"]
-            selected_series = st.selectbox("Series", options=series_options, key=f"redemp_series_{i}", label_visibility="collapsed")
-        elif redemp > 0 or full_redemption:
-            st.markdown("*No series*")
-            selected_series = None
-        else:
-            st.markdown("—")
-            selected_series = None
-
-    # Multi-series redemption sub-rows
-    multi_redemptions = []
-    if selected_series == "Multiple Series" and available_series:
-        num_rows = st.session_state[f'num_multi_redemp_{i}']
-
-        # +/- buttons for sub-rows
-        btn_col1, btn_col2, btn_spacer = st.columns([0.5, 0.5, 5])
-        with btn_col1:
-            if st.button("➕", key=f"add_multi_{i}", help="Add redemption row"):
-                st.session_state[f'num_multi_redemp_{i}'] += 1
-                st.rerun()
-        with btn_col2:
-            if st.button("➖", key=f"rem_multi_{i}", help="Remove redemption row") and num_rows > 1:
-                st.session_state[f'num_multi_redemp_{i}'] -= 1
-                st.rerun()
-
-        # Sub-row header
-        sr_spacer, sr_amt, sr_full, sr_series = st.columns([1.2, 1.2, 0.8, 1.8])
-        with sr_amt:
-            st.caption("Redemp $")
-        with sr_full:
-            st.caption("Full?")
-        with sr_series:
-            st.caption("From Series")
-
-        for j in range(num_rows):
-            sr_spacer, sr_amt, sr_full, sr_series = st.columns([1.2, 1.2, 0.8, 1.8])
-            with sr_spacer:
-                st.markdown(f"&nbsp;&nbsp;&nbsp;↳ Row {j+1}", unsafe_allow_html=True)
-            with sr_amt:
-                mr_amt_str = st.text_input("Amount", key=f"mr_amt_{i}_{j}", value="", label_visibility="collapsed", placeholder="0")
-                mr_amt = parse_float(mr_amt_str, 0.0)
-            with sr_full:
-                mr_full = st.checkbox("Full", key=f"mr_full_{i}_{j}")
-            with sr_series:
-                mr_series = st.selectbox("Series", options=available_series, key=f"mr_series_{i}_{j}", label_visibility="collapsed")
-            if mr_amt > 0 or mr_full:
-                multi_redemptions.append({'amount': mr_amt, 'series': mr_series, 'full': mr_full})
-
-    monthly_data.append({
-        'month': month,
-        'month_num': i + 1,
-        'pl': pl,
-        'contributions': contrib,
-        'redemptions': redemp,
-        'redemption_series': selected_series,
-        'full_redemption': full_redemption,
-        'multi_redemptions': multi_redemptions
-    })
+    st.markdown("---")
+    calculate_section(valid_prior_series, monthly_data, input_errors)
 
-st.markdown("---")
 
 # =============================================================================
 # STEP 3: Calculate
 # =============================================================================
-st.header("Step 3: Calculate Share Roll & NAV")
-
-if st.button("🔄 Calculate Share Roll", type="primary", use_container_width=True):
-
-    if not valid_prior_series:
-        st.error("Please enter at least one prior year series with shares > 0")
-    else:
-        # Initialize series tracking with beginning of year values
-        series_data = {}
-        initial_series_name = valid_prior_series[0]['Series']
-
-        # Track all series that ever existed (for output)
-        all_series_ever = set()
-
-        for s in valid_prior_series:
-            series_data[s['Series']] = {
-                'beginning_shares': s['Ending Shares'],
-                'beginning_nav': s['NAV per Share'],
-                'shares': s['Ending Shares'],
-                'nav_per_share': s['NAV per Share'],
-                'total_nav': s['Total NAV'],
-                'transfers_in': 0.0,
-                'transfers_out': 0.0,
-                'contributed_shares': 0.0,
-                'redeemed_shares': 0.0,
-                'is_initial': s.get('is_initial', False),
-                'created_month': None,
-                'rolled_up': False
-            }
-            all_series_ever.add(s['Series'])
-
-        # Detailed calculation log
-        calc_log = []
+@st.fragment
+def calculate_section(valid_prior_series, monthly_data, input_errors):
+    """
+    Step 3 and the results. The Excel mode and Calculate button rerun this
+    section only; results stay on screen until the inputs they came from change.
+    """
+    st.header("Step 3: Calculate Share Roll & NAV")
+
+    new_series_fees = {
+        'management_fee': new_series_mgmt_fee / 100,
+        'incentive_fee': new_series_incentive_fee / 100,
+    }
+    calc_digest = fund_store.input_hash({
+        'prior_series': valid_prior_series,
+        'monthly_data': monthly_data,
+        'par_value': par_value,
+        'current_year': current_year,
+        'new_series_fees': new_series_fees,
+    })
 
-        # =====================================================================
-        # ROLL-UP LOGIC: At beginning of year
-        # =====================================================================
-        calc_log.append({
-            'Step': 'Roll-up Check',
-            'Month': 'Beginning of Year',
-            'Series': 'All',
-            'Description': f'Checking if any series NAV > par value (${par_value:,.2f})',
-            'Details': ''
-        })
-
-        # Find series that need to roll up (NAV > par value, not the initial series)
-        rollup_series = []
-        for series_name, s in series_data.items():
-            if not s['is_initial'] and s['nav_per_share'] > par_value and s['shares'] > 0:
-                rollup_series.append(series_name)
-
-        initial_series = series_data.get(initial_series_name)
-
-        if rollup_series and initial_series and initial_series['shares'] > 0:
-            for series_name in rollup_series:
-                s = series_data[series_name]
-
-                # Calculate transfer
-                transfer_value = s['shares'] * s['nav_per_share']
-                shares_transferred_out = s['shares']
-                shares_transferred_in = transfer_value / initial_series['nav_per_share'] if initial_series['nav_per_share'] > 0 else 0
-
-                calc_log.append({
-                    'Step': 'Roll-up Transfer',
-                    'Month': 'Beginning of Year',
-                    'Series': series_name,
-                    'Description': f'Rolling up into {initial_series_name}',
-                    'Details': f'Shares out: {shares_transferred_out:,.4f} @ ${s["nav_per_share"]:,.4f} = ${transfer_value:,.2f}'
-                })
-
-                calc_log.append({
-                    'Step': 'Roll-up Transfer',
-                    'Month': 'Beginning of Year',
-                    'Series': initial_series_name,
-                    'Description': f'Receiving roll-up from {series_name}',
-                    'Details': f'Shares in: ${transfer_value:,.2f} / ${initial_series["nav_per_share"]:,.4f} = {shares_transferred_in:,.4f} shares'
-                })
-
-                # Update series data
-                s['transfers_out'] = shares_transferred_out
-                s['shares'] = 0
-                s['total_nav'] = 0
-                s['rolled_up'] = True
-
-                initial_series['transfers_in'] += shares_transferred_in
-                initial_series['shares'] += shares_transferred_in
-                initial_series['total_nav'] += transfer_value
-        else:
-            calc_log.append({
-                'Step': 'Roll-up Check',
-                'Month': 'Beginning of Year',
-                'Series': 'All',
-                'Description': 'No roll-ups required',
-                'Details': 'No series with NAV > par value'
-            })
+    excel_formula_mode = st.radio(
+        "Excel Calculation Details",
+        options=list(FORMULA_MODES),
+        format_func=FORMULA_MODES.get,
+        horizontal=True,
+        help="Live formulas for every cell, for a sample of series, or precomputed values only (smallest, fastest to open)"
+    )
 
-        # =====================================================================
-        # MONTHLY PROCESSING
-        # =====================================================================
-        for month_info in monthly_data:
-            month = month_info['month']
-            month_num = month_info['month_num']
-            pl = month_info['pl']
-            contributions = month_info['contributions']
-            redemptions = month_info['redemptions']
-            redemption_series = month_info['redemption_series']
-
-            # 1. Create new series from contributions
-            full_redemption = month_info['full_redemption']
-
-            if contributions > 0:
-                new_series_name = f"Series {month_num}/{current_year}"
-                counter = 1
-                base_name = new_series_name
-                while new_series_name in series_data:
-                    counter += 1
-                    new_series_name = f"{base_name}-{counter}"
-
-                new_shares = contributions / par_value
-
-                calc_log.append({
-                    'Step': 'New Series',
-                    'Month': month,
-                    'Series': new_series_name,
-                    'Description': f'Contribution of ${contributions:,.2f}',
-                    'Details': f'Shares issued: ${contributions:,.2f} / ${par_value:,.2f} = {new_shares:,.4f}'
-                })
-
-                series_data[new_series_name] = {
-                    'beginning_shares': 0.0,
-                    'beginning_nav': par_value,
-                    'shares': new_shares,
-                    'nav_per_share': par_value,
-                    'total_nav': contributions,
-                    'transfers_in': 0.0,
-                    'transfers_out': 0.0,
-                    'contributed_shares': new_shares,
-                    'redeemed_shares': 0.0,
-                    'is_initial': False,
-                    'created_month': month,
-                    'rolled_up': False
-                }
-                all_series_ever.add(new_series_name)
-
-            # 2. Allocate P/L pro-rata (AFTER contributions, BEFORE redemptions)
-            # Build explicit list of active series to avoid any dict iteration issues
-            active_series_for_pl = [(name, data) for name, data in series_data.items()
-                                    if data['shares'] > 0 and data['total_nav'] > 0]
-            total_nav_for_pl = sum(data['total_nav'] for _, data in active_series_for_pl)
-
-            if total_nav_for_pl > 0 and pl != 0:
-                # Snapshot NAV values before any modifications
-                nav_snapshot = {name: data['total_nav'] for name, data in active_series_for_pl}
-
-                calc_log.append({
-                    'Step': 'P/L Allocation',
-                    'Month': month,
-                    'Series': 'All',
-                    'Description': f'Total P/L: ${pl:,.2f}',
-                    'Details': f'Total NAV for allocation: ${total_nav_for_pl:,.2f}'
-                })
-
-                for series_name, _ in active_series_for_pl:
-                    s = series_data[series_name]
-                    pl_share = pl * (nav_snapshot[series_name] / total_nav_for_pl)
-                    old_nav = s['nav_per_share']
-                    s['total_nav'] += pl_share
-                    if s['shares'] > 0:
-                        s['nav_per_share'] = s['total_nav'] / s['shares']
-
-                    calc_log.append({
-                        'Step': 'P/L Allocation',
-                        'Month': month,
-                        'Series': series_name,
-                        'Description': f'P/L share: ${pl_share:,.2f}',
-                        'Details': f'NAV/share: ${old_nav:,.4f} → ${s["nav_per_share"]:,.4f}'
-                    })
-
-            # 3. Process redemption (AFTER P/L - at post-P/L NAV)
-            multi_redemptions = month_info.get('multi_redemptions', [])
-
-            if multi_redemptions:
-                # Multi-series redemption mode
-                for mr in multi_redemptions:
-                    mr_series = mr['series']
-                    mr_amount = mr['amount']
-                    mr_full = mr['full']
-                    if mr_series and mr_series in series_data:
-                        s = series_data[mr_series]
-                        if s['nav_per_share'] > 0 and s['shares'] > 0:
-                            if mr_full:
-                                shares_redeemed = s['shares']
-                                redemption_amount = shares_redeemed * s['nav_per_share']
-                                calc_log.append({
-                                    'Step': 'Full Redemption (Multi)',
-                                    'Month': month,
-                                    'Series': mr_series,
-                                    'Description': f'FULL redemption of all shares',
-                                    'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: {shares_redeemed:,.4f} | Redemption value: ${redemption_amount:,.2f}'
-                                })
-                            else:
-                                shares_redeemed = mr_amount / s['nav_per_share']
-                                redemption_amount = mr_amount
-                                calc_log.append({
-                                    'Step': 'Redemption (Multi)',
-                                    'Month': month,
-                                    'Series': mr_series,
-                                    'Description': f'Redemption of ${mr_amount:,.2f}',
-                                    'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: ${mr_amount:,.2f} / ${s["nav_per_share"]:,.4f} = {shares_redeemed:,.4f} | Shares before: {s["shares"]:,.4f}'
-                                })
-
-                            s['redeemed_shares'] += shares_redeemed
-                            s['shares'] = s['shares'] - shares_redeemed
-                            s['total_nav'] = s['total_nav'] - redemption_amount
-
-            elif (redemptions > 0 or full_redemption) and redemption_series and redemption_series in series_data:
-                s = series_data[redemption_series]
-                if s['nav_per_share'] > 0 and s['shares'] > 0:
-                    if full_redemption:
-                        shares_redeemed = s['shares']
-                        redemption_amount = shares_redeemed * s['nav_per_share']
-
-                        calc_log.append({
-                            'Step': 'Full Redemption',
-                            'Month': month,
-                            'Series': redemption_series,
-                            'Description': f'FULL redemption of all shares',
-                            'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: {shares_redeemed:,.4f} | Redemption value: ${redemption_amount:,.2f}'
-                        })
-                    else:
-                        shares_redeemed = redemptions / s['nav_per_share']
-                        redemption_amount = redemptions
-
-                        calc_log.append({
-                            'Step': 'Redemption',
-                            'Month': month,
-                            'Series': redemption_series,
-                            'Description': f'Redemption of ${redemptions:,.2f}',
-                            'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: ${redemptions:,.2f} / ${s["nav_per_share"]:,.4f} = {shares_redeemed:,.4f} | Shares before: {s["shares"]:,.4f}'
-                        })
-
-                    s['redeemed_shares'] += shares_redeemed
-                    s['shares'] = s['shares'] - shares_redeemed
-                    s['total_nav'] = s['total_nav'] - redemption_amount
+    calculate_clicked = st.button("🔄 Calculate Share Roll", type="primary", width='stretch')
 
-        # =====================================================================
-        # BUILD OUTPUT
-        # =====================================================================
-        output_rows = []
-
-        for series_name in all_series_ever:
-            s = series_data[series_name]
-            output_rows.append({
-                'Series': series_name,
-                'Beginning Shares': s['beginning_shares'],
-                'Transfers In': s['transfers_in'],
-                'Transfers Out': s['transfers_out'],
-                'Contributed Shares': s['contributed_shares'],
-                'Redeemed Shares': s['redeemed_shares'],
-                'Ending Shares': s['shares'],
-                'Ending NAV per Share': s['nav_per_share'] if s['shares'] > 0 else 0.0
-            })
+    if calculate_clicked or st.session_state.pop('show_stored_results', False):
+        if not valid_prior_series:
+            st.error("Please enter at least one prior year series with shares > 0")
+        elif input_errors:
+            st.error("Please fix the input warnings above before calculating")
+        else:
+            # Changes are reported against the run on screen, else the fund-year's last saved run
+            shown = st.session_state.get('share_roll')
+            previous = None
+            if shown is not None and shown['digest'] == calc_digest:
+                previous = shown['previous']
+            elif shown is not None and (shown['fund'], shown['year']) == (fund_name, current_year):
+                previous = shown['result']
+
+            # Reuse the stored result while the inputs are unchanged
+            result = fund_store.load_result(get_store(), fund_name, current_year, calc_digest) if fund_name else None
+            nav_history = None
+            if fund_name and (result is None or len(result['monthly_flows']) < len(monthly_data)):
+                from nav_history import NavHistory, nav_history_path
+                nav_history = NavHistory(nav_history_path(fund_name))
+            if result is not None and len(result['monthly_flows']) < len(monthly_data):
+                # Closed through an earlier month by feed_ingest: run the later months on
+                # screen only, so the stored result stays the one the next feed advances
+                closed = len(result['monthly_flows'])
+                for month_info in monthly_data[closed:]:
+                    advance_share_roll(result, month_info, par_value, current_year, new_series_fees, nav_history)
+                st.info(f"Loaded saved results for {fund_name} ({current_year}), closed through "
+                        f"{MONTHS[closed - 1]} by the administrator feed; later months calculated from the inputs")
+            elif result is not None:
+                st.info(f"Loaded saved results for {fund_name} ({current_year})")
+            else:
+                if previous is None and fund_name:
+                    previous = fund_store.load_result(get_store(), fund_name, current_year)
+                result = calculate_share_roll(
+                    valid_prior_series, monthly_data, par_value, current_year,
+                    new_series_fees=new_series_fees,
+                    nav_history=nav_history
+                )
+                if fund_name:
+                    fund_store.save_result(get_store(), fund_name, current_year, current_stored_inputs(),
+                                           calc_digest, result)
+            st.session_state.share_roll = {'digest': calc_digest, 'result': result, 'fund': fund_name,
+                                           'year': current_year, 'previous': previous}
+
+    share_roll = st.session_state.get('share_roll')
+    if share_roll is not None and share_roll['digest'] == calc_digest:
+        result = share_roll['result']
+        fees_enabled = new_series_mgmt_fee > 0 or new_series_incentive_fee > 0 or any(
+            s['Management Fee'] > 0 or s['Incentive Fee'] > 0 for s in valid_prior_series
+        )
+        series_data = result['series_data']
+        calc_log = result['calc_log']
 
-        # Sort: Initial series first, then prior year series, then new series by month
-        def sort_key(row):
-            name = row['Series']
-            if name == initial_series_name:
-                return (0, name)
-            elif '/' not in name:  # Prior year series
-                return (1, name)
-            else:  # New series
-                return (2, name)
-
-        output_rows.sort(key=sort_key)
-
-        # Add total row
-        total_row = {
-            'Series': 'TOTAL',
-            'Beginning Shares': sum(r['Beginning Shares'] for r in output_rows),
-            'Transfers In': sum(r['Transfers In'] for r in output_rows),
-            'Transfers Out': sum(r['Transfers Out'] for r in output_rows),
-            'Contributed Shares': sum(r['Contributed Shares'] for r in output_rows),
-            'Redeemed Shares': sum(r['Redeemed Shares'] for r in output_rows),
-            'Ending Shares': sum(r['Ending Shares'] for r in output_rows),
-            'Ending NAV per Share': ''  # N/A for total
-        }
-        output_rows.append(total_row)
+        output_rows = build_output_rows(result, include_fees=fees_enabled)
 
         output_df = pd.DataFrame(output_rows)
         calc_log_df = pd.DataFrame(calc_log)
@@ -592,12 +506,14 @@ if st.button("🔄 Calculate Share Roll", type="primary", use_container_width=Tr
         for col in ['Beginning Shares', 'Transfers In', 'Transfers Out', 'Contributed Shares', 'Redeemed Shares', 'Ending Shares']:
             display_df[col] = display_df[col].apply(lambda x: f"{x:,.4f}" if isinstance(x, (int, float)) else x)
 
-        display_df['Ending NAV per Share'] = display_df['Ending NAV per Share'].apply(
-            lambda x: f"${x:,.4f}" if isinstance(x, (int, float)) and x > 0 else "—" if x == '' else "—"
-        )
+        for col in ['Ending NAV per Share', 'Ending High-Water Mark']:
+            if col in display_df.columns:
+                display_df[col] = display_df[col].apply(
+                    lambda x: f"${x:,.4f}" if isinstance(x, (int, float)) and x > 0 else "—" if x == '' else "—"
+                )
 
         # Style the dataframe
-        st.dataframe(display_df, use_container_width=True, hide_index=True)
+        st.dataframe(display_df, width='stretch', hide_index=True)
 
         # Summary metrics
         st.markdown("---")
@@ -629,6 +545,15 @@ if st.button("🔄 Calculate Share Roll", type="primary", use_container_width=Tr
         with col_check2:
             st.metric("Total P/L for Year (Check Figure)", f"${total_year_pl:,.2f}")
 
+        if fees_enabled:
+            total_mgmt_fees = sum(s['management_fees'] for s in series_data.values())
+            total_incentive_fees = sum(s['incentive_fees'] for s in series_data.values())
+            col_fee1, col_fee2 = st.columns(2)
+            with col_fee1:
+                st.metric("Management Fees for Year", f"${total_mgmt_fees:,.2f}")
+            with col_fee2:
+                st.metric("Incentive Fees for Year", f"${total_incentive_fees:,.2f}")
+
         # Reconciliation check
         calculated_ending = total_beginning + total_transfers_in - total_transfers_out + total_contributions - total_redemptions
         if abs(calculated_ending - total_ending) > 0.0001:
@@ -640,109 +565,7 @@ if st.button("🔄 Calculate Share Roll", type="primary", use_container_width=Tr
         st.subheader("Monthly NAV per Share by Series")
         st.markdown("*Use these values to verify redemption amounts*")
 
-        # Build monthly NAV tracking
-        monthly_nav_data = []
-
-        # Re-run calculation just to capture monthly NAV snapshots
-        temp_series = {}
-        for s in valid_prior_series:
-            temp_series[s['Series']] = {
-                'shares': s['Ending Shares'],
-                'nav_per_share': s['NAV per Share'],
-                'total_nav': s['Total NAV'],
-            }
-
-        # Process roll-ups first
-        temp_initial = temp_series.get(initial_series_name)
-        for series_name, s in list(temp_series.items()):
-            if series_name != initial_series_name and s['nav_per_share'] > par_value and s['shares'] > 0:
-                transfer_value = s['shares'] * s['nav_per_share']
-                shares_in = transfer_value / temp_initial['nav_per_share'] if temp_initial['nav_per_share'] > 0 else 0
-                temp_initial['shares'] += shares_in
-                temp_initial['total_nav'] += transfer_value
-                s['shares'] = 0
-                s['total_nav'] = 0
-
-        # Capture beginning of year NAV
-        boy_row = {'Month': 'Beginning of Year'}
-        for series_name, s in temp_series.items():
-            if s['shares'] > 0:
-                boy_row[series_name] = s['nav_per_share']
-        monthly_nav_data.append(boy_row)
-
-        # Process each month
-        for month_info in monthly_data:
-            month = month_info['month']
-            pl = month_info['pl']
-            contributions = month_info['contributions']
-            redemptions = month_info['redemptions']
-            redemption_series = month_info['redemption_series']
-
-            # 1. Create new series (contributions first)
-            full_redemption = month_info['full_redemption']
-            if contributions > 0:
-                month_num = month_info['month_num']
-                new_name = f"Series {month_num}/{current_year}"
-                temp_series[new_name] = {
-                    'shares': contributions / par_value,
-                    'nav_per_share': par_value,
-                    'total_nav': contributions
-                }
-
-            # 2. Allocate P/L (after contributions, before redemptions)
-            # Build explicit list of active series
-            active_temp = [(name, data) for name, data in temp_series.items()
-                          if data['shares'] > 0 and data['total_nav'] > 0]
-            total_nav = sum(data['total_nav'] for _, data in active_temp)
-            if total_nav > 0 and pl != 0:
-                snapshot = {name: data['total_nav'] for name, data in active_temp}
-                for series_name, _ in active_temp:
-                    s = temp_series[series_name]
-                    if snapshot[series_name] > 0 and s['shares'] > 0:
-                        pl_share = pl * (snapshot[series_name] / total_nav)
-                        s['total_nav'] += pl_share
-                        s['nav_per_share'] = s['total_nav'] / s['shares']
-
-            # 3. Process redemption (after P/L)
-            multi_redemptions = month_info.get('multi_redemptions', [])
-
-            if multi_redemptions:
-                for mr in multi_redemptions:
-                    mr_series = mr['series']
-                    mr_amount = mr['amount']
-                    mr_full = mr['full']
-                    if mr_series and mr_series in temp_series:
-                        s = temp_series[mr_series]
-                        if s['nav_per_share'] > 0 and s['shares'] > 0:
-                            if mr_full:
-                                redemption_amount = s['shares'] * s['nav_per_share']
-                                s['total_nav'] -= redemption_amount
-                                s['shares'] = 0
-                            else:
-                                shares_red = mr_amount / s['nav_per_share']
-                                s['shares'] -= shares_red
-                                s['total_nav'] -= mr_amount
-
-            elif (redemptions > 0 or full_redemption) and redemption_series and redemption_series in temp_series:
-                s = temp_series[redemption_series]
-                if s['nav_per_share'] > 0 and s['shares'] > 0:
-                    if full_redemption:
-                        redemption_amount = s['shares'] * s['nav_per_share']
-                        s['total_nav'] -= redemption_amount
-                        s['shares'] = 0
-                    else:
-                        shares_red = redemptions / s['nav_per_share']
-                        s['shares'] -= shares_red
-                        s['total_nav'] -= redemptions
-
-            # Capture end of month NAV
-            month_row = {'Month': f'End of {month}'}
-            for series_name, s in temp_series.items():
-                if s['shares'] > 0:
-                    month_row[series_name] = s['nav_per_share']
-            monthly_nav_data.append(month_row)
-
-        nav_tracking_df = pd.DataFrame(monthly_nav_data)
+        nav_tracking_df = pd.DataFrame(result['nav_tracking'])
 
         # Format for display
         display_nav_df = nav_tracking_df.copy()
@@ -752,12 +575,34 @@ if st.button("🔄 Calculate Share Roll", type="primary", use_container_width=Tr
                     lambda x: f"${x:,.4f}" if pd.notna(x) and isinstance(x, (int, float)) else "—"
                 )
 
-        st.dataframe(display_nav_df, use_container_width=True, hide_index=True)
+        st.dataframe(display_nav_df, width='stretch', hide_index=True)
+
+        redemption_solver(share_roll, valid_prior_series, monthly_data, new_series_fees)
+
+        if fund_name:
+            from nav_history import NavHistory, nav_history_path
+            nav_history = NavHistory(nav_history_path(fund_name))
+            if len(nav_history.periods) > 12:
+                with st.expander("NAV per Share History (All Years)", expanded=False):
+                    st.line_chart(nav_history.to_frame())
 
         # Calculation details
         st.subheader("Calculation Details")
         with st.expander("View Step-by-Step Calculations", expanded=False):
-            st.dataframe(calc_log_df, use_container_width=True, hide_index=True)
+            st.dataframe(calc_log_df, width='stretch', hide_index=True)
+
+        if share_roll['previous'] is not None:
+            changes = diff_results(share_roll['previous'], result, year=current_year)
+            with st.expander(f"Changes Since Previous Calculation ({len(changes):,})", expanded=False):
+                if changes:
+                    changes_df = pd.DataFrame(changes).drop(columns='Year')
+                    for col in ['Old', 'New', 'Change']:
+                        changes_df[col] = changes_df[col].apply(
+                            lambda x: x if isinstance(x, str) else f"{x:,.4f}" if pd.notna(x) else "—"
+                        )
+                    st.dataframe(changes_df, width='stretch', hide_index=True)
+                else:
+                    st.markdown("*No changes in shares, NAVs or calculation steps*")
 
         # =====================================================================
         # EXCEL EXPORT
@@ -765,271 +610,102 @@ if st.button("🔄 Calculate Share Roll", type="primary", use_container_width=Tr
         st.markdown("---")
         st.subheader("📥 Download Results")
 
-        output_buffer = io.BytesIO()
-        with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
-            # Sheet 1: Summary Output (numbers, not strings)
-            # Keep output_df as numbers for Excel
-            excel_output_df = output_df.copy()
-            # Replace empty string with None for proper Excel handling
-            excel_output_df['Ending NAV per Share'] = excel_output_df['Ending NAV per Share'].replace('', None)
-            excel_output_df.to_excel(writer, index=False, sheet_name='Share Roll Summary')
-
-            # Format the Excel sheet
-            workbook = writer.book
-            worksheet = writer.sheets['Share Roll Summary']
-
-            # Apply number format with commas to numeric columns
-            from openpyxl.styles import numbers
-            for row in range(2, len(excel_output_df) + 2):  # Start from row 2 (after header)
-                for col in range(2, 8):  # Columns B through G (shares columns)
-                    cell = worksheet.cell(row=row, column=col)
-                    if cell.value is not None and isinstance(cell.value, (int, float)):
-                        cell.number_format = '#,##0.0000'
-                # NAV per Share column (column H)
-                cell = worksheet.cell(row=row, column=8)
-                if cell.value is not None and isinstance(cell.value, (int, float)):
-                    cell.number_format = '$#,##0.0000'
-
-            # Auto-fit column widths
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                worksheet.column_dimensions[column_letter].width = max(max_length + 2, 12)
-
-            # Sheet 2: Calculation Details with Excel Formulas
-            # Build a detailed calculation sheet showing month-by-month progression
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-            from openpyxl.utils import get_column_letter
-
-            calc_sheet = workbook.create_sheet('Calculation Details')
-
-            # Styles
-            header_font = Font(bold=True)
-            header_fill = PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid')
-            month_fill = PatternFill(start_color='E2EFDA', end_color='E2EFDA', fill_type='solid')
-            currency_format = '$#,##0.00'
-            shares_format = '#,##0.0000'
-            pct_format = '0.00%'
-            thin_border = Border(
-                left=Side(style='thin'),
-                right=Side(style='thin'),
-                top=Side(style='thin'),
-                bottom=Side(style='thin')
+        # The workbook is only built when the button is clicked (openpyxl loads then too)
+        def share_roll_workbook():
+            from excel_export import build_share_roll_workbook
+            return build_share_roll_workbook(
+                output_df, valid_prior_series, monthly_data, result, fees_enabled,
+                prior_year, current_year, par_value, formula_mode=excel_formula_mode
             )
 
-            row = 1
-
-            # Section 1: Prior Year Series Data
-            calc_sheet.cell(row=row, column=1, value='PRIOR YEAR ENDING BALANCES').font = Font(bold=True, size=12)
-            row += 1
-
-            headers = ['Series', 'Ending Shares', 'NAV per Share', 'Total NAV']
-            for col, header in enumerate(headers, 1):
-                cell = calc_sheet.cell(row=row, column=col, value=header)
-                cell.font = header_font
-                cell.fill = header_fill
-            row += 1
-
-            prior_start_row = row
-            for s in valid_prior_series:
-                calc_sheet.cell(row=row, column=1, value=s['Series'])
-                calc_sheet.cell(row=row, column=2, value=s['Ending Shares']).number_format = shares_format
-                calc_sheet.cell(row=row, column=3, value=s['NAV per Share']).number_format = currency_format
-                # Formula: Shares * NAV per Share
-                calc_sheet.cell(row=row, column=4, value=f'=B{row}*C{row}').number_format = currency_format
-                row += 1
-            prior_end_row = row - 1
-
-            # Total row
-            calc_sheet.cell(row=row, column=1, value='TOTAL').font = header_font
-            calc_sheet.cell(row=row, column=2, value=f'=SUM(B{prior_start_row}:B{prior_end_row})').number_format = shares_format
-            calc_sheet.cell(row=row, column=4, value=f'=SUM(D{prior_start_row}:D{prior_end_row})').number_format = currency_format
-            prior_total_row = row
-            row += 2
-
-            # Section 2: Monthly Calculations
-            calc_sheet.cell(row=row, column=1, value='MONTHLY CALCULATIONS').font = Font(bold=True, size=12)
-            row += 1
-
-            # Track series NAV for formula references
-            series_nav_refs = {}  # Will store the cell reference for each series' current NAV
-
-            # Initialize with prior year data
-            for idx, s in enumerate(valid_prior_series):
-                series_nav_refs[s['Series']] = f'D{prior_start_row + idx}'
-
-            months = ['January', 'February', 'March', 'April', 'May', 'June',
-                      'July', 'August', 'September', 'October', 'November', 'December']
-
-            for month_idx, month_info in enumerate(monthly_data):
-                month = month_info['month']
-                pl = month_info['pl']
-                contributions = month_info['contributions']
-                redemptions = month_info['redemptions']
-                redemption_series = month_info['redemption_series']
-                full_redemption = month_info['full_redemption']
-
-                # Skip months with no activity
-                multi_redemptions = month_info.get('multi_redemptions', [])
-                if pl == 0 and contributions == 0 and redemptions == 0 and not full_redemption and not multi_redemptions:
-                    continue
-
-                # Month header
-                calc_sheet.cell(row=row, column=1, value=f'{month}').font = Font(bold=True, size=11)
-                calc_sheet.cell(row=row, column=1).fill = month_fill
-                for col in range(2, 8):
-                    calc_sheet.cell(row=row, column=col).fill = month_fill
-                row += 1
-
-                # Column headers: Contributions → P/L → Redemptions (matches calculation order)
-                month_headers = ['Series', 'Beginning NAV', 'Contribution', 'NAV pre-P/L', 'P/L %', 'P/L Allocated', 'NAV post-P/L', 'Redemption', 'Ending NAV']
-                for col, header in enumerate(month_headers, 1):
-                    cell = calc_sheet.cell(row=row, column=col, value=header)
-                    cell.font = header_font
-                    cell.fill = header_fill
-                row += 1
-
-                month_start_row = row
-                active_series = list(series_nav_refs.keys())
-
-                new_series_refs = {}
-
-                for series_name in active_series:
-                    calc_sheet.cell(row=row, column=1, value=series_name)
-
-                    # Beginning NAV
-                    beg_nav_ref = series_nav_refs[series_name]
-                    calc_sheet.cell(row=row, column=2, value=f'={beg_nav_ref}').number_format = currency_format
-
-                    # Contribution (existing series don't get contributions)
-                    calc_sheet.cell(row=row, column=3, value=0).number_format = currency_format
-
-                    # NAV pre-P/L = Beginning + Contribution
-                    calc_sheet.cell(row=row, column=4, value=f'=B{row}+C{row}').number_format = currency_format
-
-                    new_series_refs[series_name] = row
-                    row += 1
-
-                # Add new series row from contribution
-                if contributions > 0:
-                    month_num = month_info['month_num']
-                    new_series_name = f"Series {month_num}/{current_year}"
-
-                    calc_sheet.cell(row=row, column=1, value=new_series_name)
-                    calc_sheet.cell(row=row, column=2, value=0).number_format = currency_format
-                    calc_sheet.cell(row=row, column=3, value=contributions).number_format = currency_format
-                    calc_sheet.cell(row=row, column=4, value=f'=B{row}+C{row}').number_format = currency_format
-
-                    new_series_refs[new_series_name] = row
-                    row += 1
-
-                month_end_row = row - 1
-
-                # Build total NAV pre-P/L formula
-                total_nav_pre_pl = f'SUM(D{month_start_row}:D{month_end_row})'
-
-                # Fill in P/L %, P/L Allocated, NAV post-P/L, Redemption, Ending NAV
-                for sname, srow in new_series_refs.items():
-                    if pl != 0:
-                        # P/L % = NAV pre-P/L / Total NAV pre-P/L
-                        calc_sheet.cell(row=srow, column=5, value=f'=IF({total_nav_pre_pl}=0,0,D{srow}/{total_nav_pre_pl})').number_format = pct_format
-                        # P/L Allocated = P/L % * Total P/L
-                        calc_sheet.cell(row=srow, column=6, value=f'=E{srow}*{pl}').number_format = currency_format
-                    else:
-                        calc_sheet.cell(row=srow, column=5, value=0).number_format = pct_format
-                        calc_sheet.cell(row=srow, column=6, value=0).number_format = currency_format
-
-                    # NAV post-P/L = NAV pre-P/L + P/L Allocated
-                    calc_sheet.cell(row=srow, column=7, value=f'=D{srow}+F{srow}').number_format = currency_format
-
-                    # Redemption
-                    multi_redemptions = month_info.get('multi_redemptions', [])
-                    if multi_redemptions:
-                        # Find all multi-redemptions targeting this series
-                        series_mrs = [mr for mr in multi_redemptions if mr['series'] == sname]
-                        if series_mrs:
-                            has_full = any(mr['full'] for mr in series_mrs)
-                            if has_full:
-                                calc_sheet.cell(row=srow, column=8, value=f'=-G{srow}').number_format = currency_format
-                            else:
-                                total_mr_amount = sum(mr['amount'] for mr in series_mrs)
-                                calc_sheet.cell(row=srow, column=8, value=-total_mr_amount).number_format = currency_format
-                        else:
-                            calc_sheet.cell(row=srow, column=8, value=0).number_format = currency_format
-                    elif (redemptions > 0 or full_redemption) and redemption_series == sname:
-                        if full_redemption:
-                            calc_sheet.cell(row=srow, column=8, value=f'=-G{srow}').number_format = currency_format
-                        else:
-                            calc_sheet.cell(row=srow, column=8, value=-redemptions).number_format = currency_format
-                    else:
-                        calc_sheet.cell(row=srow, column=8, value=0).number_format = currency_format
-
-                    # Ending NAV = NAV post-P/L + Redemption
-                    calc_sheet.cell(row=srow, column=9, value=f'=G{srow}+H{srow}').number_format = currency_format
-
-                # Update series_nav_refs to point to Ending NAV column (I)
-                final_refs = {}
-                for sname, srow in new_series_refs.items():
-                    final_refs[sname] = f'I{srow}'
-
-                # Total row for month
-                calc_sheet.cell(row=row, column=1, value='Month Total').font = header_font
-                calc_sheet.cell(row=row, column=2, value=f'=SUM(B{month_start_row}:B{month_end_row})').number_format = currency_format
-                calc_sheet.cell(row=row, column=3, value=f'=SUM(C{month_start_row}:C{month_end_row})').number_format = currency_format
-                calc_sheet.cell(row=row, column=4, value=f'=SUM(D{month_start_row}:D{month_end_row})').number_format = currency_format
-                calc_sheet.cell(row=row, column=6, value=f'=SUM(F{month_start_row}:F{month_end_row})').number_format = currency_format
-                calc_sheet.cell(row=row, column=7, value=f'=SUM(G{month_start_row}:G{month_end_row})').number_format = currency_format
-                calc_sheet.cell(row=row, column=8, value=f'=SUM(H{month_start_row}:H{month_end_row})').number_format = currency_format
-                calc_sheet.cell(row=row, column=9, value=f'=SUM(I{month_start_row}:I{month_end_row})').number_format = currency_format
-
-                # Update series references for next month
-                series_nav_refs = final_refs
-                row += 2
-
-            # Auto-fit columns
-            for col in range(1, 10):
-                calc_sheet.column_dimensions[get_column_letter(col)].width = 16
-
-            # Sheet 3: Inputs Summary
-            inputs_df = pd.DataFrame({
-                'Parameter': ['Prior Year', 'Calculating Year', 'Par Value'],
-                'Value': [prior_year, current_year, par_value]
-            })
-
-            prior_inputs = pd.DataFrame(valid_prior_series)
-            monthly_inputs_data = []
-            for md in monthly_data:
-                md_copy = dict(md)
-                mrs = md_copy.get('multi_redemptions', [])
-                if mrs:
-                    parts = []
-                    for mr in mrs:
-                        amt_str = 'FULL' if mr['full'] else '${:,.2f}'.format(mr['amount'])
-                        parts.append('{}: {}'.format(mr['series'], amt_str))
-                    md_copy['multi_redemptions'] = '; '.join(parts)
-                else:
-                    md_copy['multi_redemptions'] = ''
-                monthly_inputs_data.append(md_copy)
-            monthly_inputs = pd.DataFrame(monthly_inputs_data)
-
-            inputs_df.to_excel(writer, index=False, sheet_name='Inputs', startrow=0)
-            prior_inputs.to_excel(writer, index=False, sheet_name='Inputs', startrow=5)
-            monthly_inputs.to_excel(writer, index=False, sheet_name='Inputs', startrow=5 + len(prior_inputs) + 3)
-
-        output_buffer.seek(0)
-
         st.download_button(
             label="📥 Download Excel (Summary + Calculations)",
-            data=output_buffer,
+            data=share_roll_workbook,
             file_name=f"share_roll_{current_year}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            on_click='ignore'
+        )
+
+
+@st.fragment
+def redemption_solver(share_roll, valid_prior_series, monthly_data, new_series_fees):
+    """
+    Solve a month's redemption for a target instead of guessing amounts. Replays
+    only the chosen month from its opening state, so answers don't rerun the year.
+    """
+    if not st.toggle("🎯 Redemption Solver", key='solver_open',
+                     help="Find the redemption that leaves a series with a target share count or NAV "
+                          "straight after that month's redemptions"):
+        return
+    result = share_roll['result']
+    if 'checkpoints' not in share_roll:
+        # Run the year once to capture each month's opening state; every solve reuses it
+        share_roll['checkpoints'] = {}
+        calculate_share_roll(valid_prior_series, monthly_data, par_value, current_year,
+                             new_series_fees=new_series_fees, checkpoints=share_roll['checkpoints'])
+    checkpoints = share_roll['checkpoints']
+
+    col_month, col_series = st.columns(2)
+    with col_month:
+        month_idx = st.selectbox("Month", options=range(len(monthly_data)),
+                                 format_func=lambda i: monthly_data[i]['month'], key='solver_month')
+    month_info = monthly_data[month_idx]
+    month = month_info['month']
+    series_choices = [name for name, s in checkpoints[month].items() if s['shares'] > 0]
+    series_choices += [name for name, s in result['series_data'].items() if s['created_month'] == month]
+    with col_series:
+        series_name = st.selectbox("Series", options=series_choices, key='solver_series')
+
+    col_kind, col_target = st.columns(2)
+    with col_kind:
+        target_kind = st.radio("Target After Redemption", options=['shares', 'nav'], horizontal=True,
+                               format_func={'shares': "Shares remaining", 'nav': "NAV remaining ($)"}.get,
+                               key='solver_target_kind')
+    with col_target:
+        target = st.number_input("Target", min_value=0.0, value=0.0,
+                                 format="%.4f" if target_kind == 'shares' else "%.2f", key='solver_target')
+    if not series_name:
+        return
+
+    try:
+        solved = solve_redemption(
+            checkpoints, month_info, series_name, par_value, current_year, new_series_fees,
+            **{f'target_{target_kind}': target}
         )
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        return
+
+    col_amount, col_shares, col_nav = st.columns(3)
+    with col_amount:
+        st.metric("Redemption Amount", "Full redemption" if solved['full'] else f"${solved['amount']:,.2f}")
+    with col_shares:
+        st.metric("Shares Redeemed", f"{solved['shares_redeemed']:,.4f}")
+    with col_nav:
+        st.metric("NAV per Share", f"${solved['nav_per_share']:,.4f}")
+    st.caption(f"Before redemptions: {solved['shares_before']:,.4f} shares, ${solved['nav_before']:,.2f} NAV")
+
+    redeeming = None
+    if month_info['redemptions'] > 0 or month_info['full_redemption']:
+        redeeming = month_info['redemption_series']
+    if month_info.get('multi_redemptions'):
+        st.caption(f"{month} uses Multiple Series redemptions; enter the amount in that grid.")
+    elif redeeming not in (None, series_name):
+        st.caption(f"{month} already redeems from {redeeming}; the amount assumes that redemption stays.")
+    elif st.button(f"Use as {month} redemption from {series_name}", key='solver_apply'):
+        # Rewrite the month's Step 2 redemption and reopen the grids on the new rows
+        rows = {name: table_rows(table) for name, table in st.session_state.fund_inputs.items()}
+        row = next(r for r in rows['activity'] if r['Month'] == month)
+        row['Redemp $'] = None if solved['full'] else repr(solved['amount'])
+        row['Full?'] = solved['full']
+        row['From Series'] = series_name
+        st.session_state.fund_inputs = tables_from_rows(rows)
+        st.session_state.editor_version += 1
+        st.rerun()
+
+
+monthly_activity_section(prior_series_inputs, valid_prior_series)
+
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,187 @@
+"""
+Audit trail diff - Series Accounting
+What moved between two share roll runs, or two stored results, of a fund.
+
+A result is flattened into stable keys (see audit_records): per series and
+period values (shares outstanding and NAV per share at each period end), the
+series' year totals, and the calc log events keyed by month, series, step and
+occurrence. Two runs are then compared key by key in a single pass over each,
+so the cost stays linear in the size of the results however many series and
+years they cover.
+
+Usage:
+    python audit_diff.py "Fund A" --db reviewed.db --against-db share_roll.db
+    python audit_diff.py "Fund A" --year 2024 --against "Fund A (restated)" --csv changes.csv
+"""
+
+import argparse
+import csv
+import math
+import sys
+
+import fund_store
+
+# Year totals compared per series, as (label, series_data field)
+SERIES_TOTALS = [
+    ('Beginning Shares', 'beginning_shares'),
+    ('Transfers In', 'transfers_in'),
+    ('Transfers Out', 'transfers_out'),
+    ('Contributed Shares', 'contributed_shares'),
+    ('Redeemed Shares', 'redeemed_shares'),
+    ('Ending Shares', 'shares'),
+    ('Ending NAV per Share', 'nav_per_share'),
+    ('Management Fees', 'management_fees'),
+    ('Incentive Fees', 'incentive_fees'),
+    ('High-Water Mark', 'high_water_mark'),
+]
+
+DIFF_COLUMNS = ['Year', 'Item', 'Period', 'Series', 'Old', 'New', 'Change']
+
+
+# =============================================================================
+# STABLE KEYS
+# =============================================================================
+def audit_records(result):
+    """
+    A share roll result as ({(item, period, series): value}, {(month, series, step, n): text}).
+
+    Values are shares and NAV per share at every period end ('Beginning of Year',
+    'End of January', ...) plus the SERIES_TOTALS for period 'Year'. Events are
+    the calc log, with n counting repeats of the same step for a series in a
+    month so edits elsewhere in the log don't shift their keys.
+    """
+    values = {}
+    for item, rows in (('Shares', result.get('share_tracking', [])), ('NAV per Share', result['nav_tracking'])):
+        for row in rows:
+            period = row['Month']
+            for series_name, value in row.items():
+                if series_name != 'Month':
+                    values[(item, period, series_name)] = value
+
+    for series_name, s in result['series_data'].items():
+        for label, field in SERIES_TOTALS:
+            values[(label, 'Year', series_name)] = s[field]
+
+    events = {}
+    seen = {}
+    for entry in result['calc_log']:
+        key = (entry['Month'], entry['Series'], entry['Step'])
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        events[key + (n,)] = f"{entry['Description']} | {entry['Details']}"
+    return values, events
+
+
+# =============================================================================
+# DIFF
+# =============================================================================
+def _changed(old, new, rel_tol, abs_tol):
+    if old is None or new is None:
+        return old is not new
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return not math.isclose(old, new, rel_tol=rel_tol, abs_tol=abs_tol)
+    return old != new
+
+
+def diff_results(old_result, new_result, year=None, rel_tol=1e-9, abs_tol=1e-6):
+    """
+    Changes from old_result to new_result as rows of DIFF_COLUMNS.
+
+    Values present in only one run show None on the other side; log events
+    report 'added', 'removed' or 'changed' with the old and new text. Numbers
+    within rel_tol / abs_tol of each other count as unchanged.
+    """
+    old_values, old_events = audit_records(old_result)
+    new_values, new_events = audit_records(new_result)
+    rows = []
+
+    for key, new in new_values.items():
+        old = old_values.get(key)
+        if _changed(old, new, rel_tol, abs_tol):
+            item, period, series_name = key
+            change = new - old if old is not None and new is not None else None
+            rows.append({'Year': year, 'Item': item, 'Period': period, 'Series': series_name,
+                         'Old': old, 'New': new, 'Change': change})
+    for key, old in old_values.items():
+        if key not in new_values:
+            item, period, series_name = key
+            rows.append({'Year': year, 'Item': item, 'Period': period, 'Series': series_name,
+                         'Old': old, 'New': None, 'Change': None})
+
+    for key, new in new_events.items():
+        old = old_events.get(key)
+        if old != new:
+            month, series_name, step, _ = key
+            rows.append({'Year': year, 'Item': step, 'Period': month, 'Series': series_name,
+                         'Old': old, 'New': new, 'Change': 'added' if old is None else 'changed'})
+    for key, old in old_events.items():
+        if key not in new_events:
+            month, series_name, step, _ = key
+            rows.append({'Year': year, 'Item': step, 'Period': month, 'Series': series_name,
+                         'Old': old, 'New': None, 'Change': 'removed'})
+    return rows
+
+
+def diff_stored(conn, fund, against_conn, against_fund, years=None):
+    """
+    Changes between two stored funds' results, year by year (every year either
+    side has a result for, unless years is given). Only one year's pair of
+    results is held at a time. Returns (rows, [years missing a result]).
+    """
+    if years is None:
+        stored = fund_store.list_fund_years(conn).get(fund, [])
+        stored_against = fund_store.list_fund_years(against_conn).get(against_fund, [])
+        years = sorted(set(stored) | set(stored_against))
+
+    rows = []
+    missing = []
+    for year in years:
+        old = fund_store.load_result(conn, fund, year)
+        new = fund_store.load_result(against_conn, against_fund, year)
+        if old is None or new is None:
+            missing.append(year)
+            continue
+        rows += diff_results(old, new, year=year)
+    return rows, missing
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('fund', help="Stored fund whose results are the old side")
+    parser.add_argument('--year', type=int, action='append', dest='years',
+                        help="Year to compare (repeatable; default: every stored year)")
+    parser.add_argument('--db', default=fund_store.DEFAULT_DB_PATH, help="Fund store of the old side")
+    parser.add_argument('--against', help="Fund for the new side (default: the same fund)")
+    parser.add_argument('--against-db', help="Fund store of the new side (default: --db)")
+    parser.add_argument('--csv', help="Write every change to this CSV file")
+    parser.add_argument('--limit', type=int, default=50, help="Changes to print")
+    args = parser.parse_args(argv)
+
+    against_fund = args.against or args.fund
+    if against_fund == args.fund and not args.against_db:
+        parser.error("give --against and/or --against-db to pick the results to compare with")
+
+    conn = fund_store.connect(args.db)
+    against_conn = fund_store.connect(args.against_db) if args.against_db else conn
+    rows, missing = diff_stored(conn, args.fund, against_conn, against_fund, args.years)
+
+    for year in missing:
+        print(f"{year}: no stored result on both sides, skipped")
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=DIFF_COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+    for row in rows[:args.limit]:
+        print('  '.join('' if row[col] is None else str(row[col]) for col in DIFF_COLUMNS))
+    if len(rows) > args.limit:
+        print(f"... {len(rows) - args.limit} more")
+    print(f"{len(rows)} changes ({args.fund} -> {against_fund})")
+    return 1 if rows else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
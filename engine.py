@@ -0,0 +1,836 @@
+"""
+Share roll calculation engine - Series Accounting
+Roll-up, monthly P/L allocation, fee and redemption logic, kept free of any
+Streamlit calls so the app, exports and tooling share one implementation.
+"""
+
+import calendar
+
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June',
+          'July', 'August', 'September', 'October', 'November', 'December']
+
+
+def new_series_record(shares, nav_per_share, total_nav, beginning_shares=0.0, is_initial=False,
+                      created_month=None, contributed_shares=0.0, fees=None):
+    """Build the per-series tracking dict used throughout the engine."""
+    fees = fees or {}
+    return {
+        'beginning_shares': beginning_shares,
+        'beginning_nav': nav_per_share,
+        'shares': shares,
+        'nav_per_share': nav_per_share,
+        'total_nav': total_nav,
+        'transfers_in': 0.0,
+        'transfers_out': 0.0,
+        'contributed_shares': contributed_shares,
+        'redeemed_shares': 0.0,
+        'is_initial': is_initial,
+        'created_month': created_month,
+        'rolled_up': False,
+        'management_fee_rate': fees.get('management_fee', 0.0),
+        'incentive_fee_rate': fees.get('incentive_fee', 0.0),
+        'high_water_mark': fees.get('high_water_mark') or nav_per_share,
+        'management_fees': 0.0,
+        'incentive_fees': 0.0,
+    }
+
+
+def nav_snapshot_row(label, series_data, field='nav_per_share'):
+    """NAV per share (or another series field) of every series still holding shares, keyed by series name."""
+    row = {'Month': label}
+    for series_name, s in series_data.items():
+        if s['shares'] > 0:
+            row[series_name] = s[field]
+    return row
+
+
+# =============================================================================
+# ROLL-UP LOGIC
+# =============================================================================
+def apply_rollups(series_data, initial_series_name, par_value, calc_log):
+    """
+    Roll every non-initial series with NAV > par into the initial series, merging
+    their high-water marks into its mark (share-weighted, preserving each holder's
+    dollar mark).
+    """
+    calc_log.append({
+        'Step': 'Roll-up Check',
+        'Month': 'Beginning of Year',
+        'Series': 'All',
+        'Description': f'Checking if any series NAV > par value (${par_value:,.2f})',
+        'Details': ''
+    })
+
+    # Find series that need to roll up (NAV > par value, not the initial series)
+    rollup_series = []
+    for series_name, s in series_data.items():
+        if not s['is_initial'] and s['nav_per_share'] > par_value and s['shares'] > 0:
+            rollup_series.append(series_name)
+
+    initial_series = series_data.get(initial_series_name)
+
+    if rollup_series and initial_series and initial_series['shares'] > 0:
+        for series_name in rollup_series:
+            s = series_data[series_name]
+
+            # Calculate transfer
+            transfer_value = s['shares'] * s['nav_per_share']
+            shares_transferred_out = s['shares']
+            shares_transferred_in = transfer_value / initial_series['nav_per_share'] if initial_series['nav_per_share'] > 0 else 0
+
+            calc_log.append({
+                'Step': 'Roll-up Transfer',
+                'Month': 'Beginning of Year',
+                'Series': series_name,
+                'Description': f'Rolling up into {initial_series_name}',
+                'Details': f'Shares out: {shares_transferred_out:,.4f} @ ${s["nav_per_share"]:,.4f} = ${transfer_value:,.2f}'
+            })
+
+            calc_log.append({
+                'Step': 'Roll-up Transfer',
+                'Month': 'Beginning of Year',
+                'Series': initial_series_name,
+                'Description': f'Receiving roll-up from {series_name}',
+                'Details': f'Shares in: ${transfer_value:,.2f} / ${initial_series["nav_per_share"]:,.4f} = {shares_transferred_in:,.4f} shares'
+            })
+
+            # The initial series' high-water mark becomes share-weighted over its own
+            # shares and those received, each rolled series' mark restated per
+            # initial-series share (mark x initial NAV / rolled NAV); every holder
+            # keeps the dollar mark they had
+            old_hwm = initial_series['high_water_mark']
+            initial_series['high_water_mark'] = (
+                initial_series['shares'] * old_hwm + shares_transferred_out * s['high_water_mark']
+            ) / (initial_series['shares'] + shares_transferred_in)
+            if initial_series['incentive_fee_rate'] or s['incentive_fee_rate']:
+                calc_log.append({
+                    'Step': 'Roll-up Transfer',
+                    'Month': 'Beginning of Year',
+                    'Series': initial_series_name,
+                    'Description': f'High-water mark merged with {series_name} (share-weighted)',
+                    'Details': f'${old_hwm:,.4f} → ${initial_series["high_water_mark"]:,.4f} '
+                               f'({series_name} mark ${s["high_water_mark"]:,.4f} on {shares_transferred_out:,.4f} shares)'
+                })
+
+            # Update series data
+            s['transfers_out'] = shares_transferred_out
+            s['shares'] = 0
+            s['total_nav'] = 0
+            s['rolled_up'] = True
+
+            initial_series['transfers_in'] += shares_transferred_in
+            initial_series['shares'] += shares_transferred_in
+            initial_series['total_nav'] += transfer_value
+    else:
+        calc_log.append({
+            'Step': 'Roll-up Check',
+            'Month': 'Beginning of Year',
+            'Series': 'All',
+            'Description': 'No roll-ups required',
+            'Details': 'No series with NAV > par value'
+        })
+
+
+# =============================================================================
+# MONTHLY STEPS
+# =============================================================================
+def daily_capital_weights(series_data, flows, days_in_month):
+    """
+    Average daily capital of every active series over the month.
+
+    flows are (series, day, amount) tuples for this month's dated cash flows:
+    contributions (amount > 0) count from their day, redemptions (amount < 0)
+    stop counting after theirs. Opening capital is the series' NAV net of the
+    month's contributions. Flows are scattered into a series x day matrix and
+    cumulatively summed onto the opening capital, so the cost is one cumsum per
+    month however many flows there are.
+    Returns {series: average daily capital}.
+    """
+    import numpy as np
+
+    active = [name for name, s in series_data.items() if s['shares'] > 0 and s['total_nav'] > 0]
+    index = {name: i for i, name in enumerate(active)}
+    # One spare column: a redemption on the last day never leaves within the month
+    daily_flows = np.zeros((len(active), days_in_month + 1))
+    contributed = np.zeros(len(active))
+    for series_name, day, amount in flows:
+        i = index.get(series_name)
+        if i is None or amount == 0:
+            continue
+        day = min(max(int(day), 1), days_in_month)
+        if amount > 0:
+            daily_flows[i, day - 1] += amount
+            contributed[i] += amount
+        else:
+            daily_flows[i, day] += amount
+
+    opening = np.array([series_data[name]['total_nav'] for name in active]) - contributed
+    capital = opening[:, None] + np.cumsum(daily_flows[:, :days_in_month], axis=1)
+    np.maximum(capital, 0.0, out=capital)
+    return dict(zip(active, (capital.sum(axis=1) / days_in_month).tolist()))
+
+
+def allocate_pl(series_data, pl, month, calc_log, weights=None):
+    """
+    Allocate P/L pro-rata to NAV (after contributions, before fees and redemptions),
+    or pro-rata to `weights` ({series: weight}, e.g. average daily capital) when given.
+    Returns the P/L allocated (0 when no series holds NAV to allocate against).
+    """
+    # Build explicit list of active series to avoid any dict iteration issues
+    active_series_for_pl = [(name, data) for name, data in series_data.items()
+                            if data['shares'] > 0 and data['total_nav'] > 0]
+    if weights is None:
+        basis_label = 'Total NAV for allocation'
+        # Snapshot NAV values before any modifications
+        nav_snapshot = {name: data['total_nav'] for name, data in active_series_for_pl}
+    else:
+        basis_label = 'Total average daily capital'
+        nav_snapshot = {name: weights.get(name, 0.0) for name, _ in active_series_for_pl}
+    total_nav_for_pl = sum(nav_snapshot[name] for name, _ in active_series_for_pl)
+
+    if total_nav_for_pl > 0 and pl != 0:
+        calc_log.append({
+            'Step': 'P/L Allocation',
+            'Month': month,
+            'Series': 'All',
+            'Description': f'Total P/L: ${pl:,.2f}',
+            'Details': f'{basis_label}: ${total_nav_for_pl:,.2f}'
+        })
+
+        for series_name, _ in active_series_for_pl:
+            s = series_data[series_name]
+            pl_share = pl * (nav_snapshot[series_name] / total_nav_for_pl)
+            old_nav = s['nav_per_share']
+            s['total_nav'] += pl_share
+            if s['shares'] > 0:
+                s['nav_per_share'] = s['total_nav'] / s['shares']
+
+            calc_log.append({
+                'Step': 'P/L Allocation',
+                'Month': month,
+                'Series': series_name,
+                'Description': f'P/L share: ${pl_share:,.2f}',
+                'Details': f'NAV/share: ${old_nav:,.4f} → ${s["nav_per_share"]:,.4f}'
+            })
+        return pl
+    return 0.0
+
+
+def apply_fees(series_data, month, crystallize, calc_log):
+    """
+    Accrue management fees and, when crystallizing, incentive fees for every active series.
+
+    Both fees are evaluated in the same pass over the active series. The management
+    fee accrues monthly at 1/12 of the annual rate on post-P/L NAV. The incentive fee
+    is charged on the gain per share above the series' high-water mark, which then
+    resets to the post-fee NAV per share. The ending mark is reported per series and
+    becomes next year's opening mark when the year is rolled forward
+    (fund_inputs.next_year_inputs); see apply_rollups for marks merged on roll-up.
+    Returns {series: total fee charged this month}.
+    """
+    fees_charged = {}
+    for series_name, s in series_data.items():
+        if s['shares'] <= 0 or s['total_nav'] <= 0:
+            continue
+        mgmt_rate = s['management_fee_rate']
+        incentive_rate = s['incentive_fee_rate']
+        if not mgmt_rate and not (crystallize and incentive_rate):
+            continue
+
+        mgmt_fee = s['total_nav'] * mgmt_rate / 12 if mgmt_rate else 0.0
+        nav_after_mgmt = (s['total_nav'] - mgmt_fee) / s['shares']
+
+        incentive_fee = 0.0
+        if crystallize:
+            gain_per_share = nav_after_mgmt - s['high_water_mark']
+            if incentive_rate and gain_per_share > 0:
+                incentive_fee = gain_per_share * incentive_rate * s['shares']
+            if gain_per_share > 0:
+                s['high_water_mark'] = nav_after_mgmt - incentive_fee / s['shares']
+
+        total_fee = mgmt_fee + incentive_fee
+        if total_fee == 0:
+            continue
+
+        old_nav = s['nav_per_share']
+        s['total_nav'] -= total_fee
+        s['nav_per_share'] = s['total_nav'] / s['shares']
+        s['management_fees'] += mgmt_fee
+        s['incentive_fees'] += incentive_fee
+        fees_charged[series_name] = total_fee
+
+        calc_log.append({
+            'Step': 'Fees',
+            'Month': month,
+            'Series': series_name,
+            'Description': f'Management fee: ${mgmt_fee:,.2f} | Incentive fee: ${incentive_fee:,.2f}',
+            'Details': f'NAV/share: ${old_nav:,.4f} → ${s["nav_per_share"]:,.4f} | High-water mark: ${s["high_water_mark"]:,.4f}'
+        })
+    return fees_charged
+
+
+def month_subscriptions(month_info):
+    """
+    Every contribution in a month as {'amount', 'series', 'pricing', 'day'} dicts.
+
+    Contributions come from the single Step 2 amount ('contributions', targeted by
+    'contribution_series' / 'contribution_pricing', dated by 'contribution_day')
+    plus any 'subscriptions' list of the same dicts. A series of None means a new
+    series at par; pricing is 'pre_pl' or 'post_pl' NAV for existing series; a day
+    of None means the first of the month.
+    """
+    subscriptions = list(month_info.get('subscriptions', []))
+    if month_info['contributions'] > 0:
+        subscriptions.append({
+            'amount': month_info['contributions'],
+            'series': month_info.get('contribution_series'),
+            'pricing': month_info.get('contribution_pricing', 'post_pl'),
+            'day': month_info.get('contribution_day'),
+        })
+    return subscriptions
+
+
+def group_subscriptions(month_info):
+    """
+    Batch a month's contributions (see month_subscriptions) by target.
+    Returns (new series amount, {series: pre-P/L amount}, {series: post-P/L amount}).
+    """
+    new_series_amount = 0.0
+    pre_pl = {}
+    post_pl = {}
+    for sub in month_subscriptions(month_info):
+        if sub['amount'] <= 0:
+            continue
+        if not sub['series']:
+            new_series_amount += sub['amount']
+        elif sub.get('pricing') == 'pre_pl':
+            pre_pl[sub['series']] = pre_pl.get(sub['series'], 0.0) + sub['amount']
+        else:
+            post_pl[sub['series']] = post_pl.get(sub['series'], 0.0) + sub['amount']
+    return new_series_amount, pre_pl, post_pl
+
+
+def issue_into_existing(series_data, amounts, month, pricing_label, calc_log):
+    """
+    Issue shares into existing series at their current NAV per share, one entry per series.
+    Returns {series: (amount, shares)} for the contributions issued (skipped ones are only logged).
+    """
+    issued = {}
+    for series_name, amount in amounts.items():
+        s = series_data.get(series_name)
+        if not s or s['shares'] <= 0 or s['nav_per_share'] <= 0:
+            calc_log.append({
+                'Step': 'Contribution Skipped',
+                'Month': month,
+                'Series': series_name,
+                'Description': f'Contribution of ${amount:,.2f}',
+                'Details': 'Series has no outstanding shares to price the contribution against'
+            })
+            continue
+
+        new_shares = amount / s['nav_per_share']
+        calc_log.append({
+            'Step': 'Contribution (Existing Series)',
+            'Month': month,
+            'Series': series_name,
+            'Description': f'Contribution of ${amount:,.2f} at {pricing_label} NAV',
+            'Details': f'Shares issued: ${amount:,.2f} / ${s["nav_per_share"]:,.4f} = {new_shares:,.4f}'
+        })
+
+        s['contributed_shares'] += new_shares
+        s['shares'] += new_shares
+        s['total_nav'] += amount
+        issued[series_name] = (amount, new_shares)
+    return issued
+
+
+def redeem(series_data, series_name, amount, full, month, calc_log, multi=False):
+    """Redeem a dollar amount (or all shares) from one series at its current NAV; returns the value paid."""
+    if not series_name or series_name not in series_data:
+        return 0.0
+    s = series_data[series_name]
+    if s['nav_per_share'] <= 0 or s['shares'] <= 0:
+        return 0.0
+
+    suffix = ' (Multi)' if multi else ''
+    if full:
+        shares_redeemed = s['shares']
+        redemption_amount = shares_redeemed * s['nav_per_share']
+        calc_log.append({
+            'Step': f'Full Redemption{suffix}',
+            'Month': month,
+            'Series': series_name,
+            'Description': f'FULL redemption of all shares',
+            'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: {shares_redeemed:,.4f} | Redemption value: ${redemption_amount:,.2f}'
+        })
+    else:
+        shares_redeemed = amount / s['nav_per_share']
+        redemption_amount = amount
+        calc_log.append({
+            'Step': f'Redemption{suffix}',
+            'Month': month,
+            'Series': series_name,
+            'Description': f'Redemption of ${amount:,.2f}',
+            'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: ${amount:,.2f} / ${s["nav_per_share"]:,.4f} = {shares_redeemed:,.4f} | Shares before: {s["shares"]:,.4f}'
+        })
+
+    s['redeemed_shares'] += shares_redeemed
+    s['shares'] = s['shares'] - shares_redeemed
+    s['total_nav'] = s['total_nav'] - redemption_amount
+    return redemption_amount
+
+
+def month_redemptions(month_info):
+    """
+    Every redemption in a month as {'series', 'amount', 'full', 'day'} dicts: the
+    'multi_redemptions' list when given, else the single Step 2 redemption.
+    """
+    multi_redemptions = month_info.get('multi_redemptions', [])
+    if multi_redemptions:
+        return [{'series': mr['series'], 'amount': mr['amount'], 'full': mr['full'], 'day': mr.get('day')}
+                for mr in multi_redemptions]
+    if month_info['redemptions'] > 0 or month_info['full_redemption']:
+        return [{'series': month_info['redemption_series'], 'amount': month_info['redemptions'],
+                 'full': month_info['full_redemption'], 'day': month_info.get('redemption_day')}]
+    return []
+
+
+def dated_flows(month_info, new_series_name, series_data, days_in_month):
+    """
+    (series, day, amount) cash flows that share in the month's P/L: contributions
+    into new series and at pre-P/L NAV, and redemptions as negative amounts (a
+    full redemption at the series' NAV before P/L).
+    """
+    flows = []
+    for sub in month_subscriptions(month_info):
+        if sub['amount'] <= 0:
+            continue
+        day = sub.get('day') or 1
+        if not sub['series']:
+            flows.append((new_series_name, day, sub['amount']))
+        elif sub.get('pricing') == 'pre_pl':
+            flows.append((sub['series'], day, sub['amount']))
+
+    for r in month_redemptions(month_info):
+        s = series_data.get(r['series'])
+        if s is None:
+            continue
+        flows.append((r['series'], r['day'] or days_in_month, -(s['total_nav'] if r['full'] else r['amount'])))
+    return flows
+
+
+def month_has_activity(month_info):
+    """Whether a month has P/L, contributions or redemptions to process."""
+    return bool(month_info['pl'] != 0 or month_info['contributions'] > 0 or month_info.get('subscriptions')
+                or month_info['redemptions'] > 0 or month_info['full_redemption']
+                or month_info.get('multi_redemptions'))
+
+
+def fees_due(active, crystallize):
+    """Whether apply_fees would charge (or reset a high-water mark for) any of the active series."""
+    return any(s['total_nav'] > 0 and (s['management_fee_rate'] or (crystallize and s['incentive_fee_rate']))
+               for s in active.values())
+
+
+def run_to_redemptions(series_data, active, month_info, par_value, current_year, new_series_fees, calc_log):
+    """
+    Steps 1-3 of a month plus post-P/L contributions: everything before its redemptions.
+
+    New series are added to both series_data and active. Returns a dict with the
+    'new_series_name' (None if no series was created), 'contributions' issued,
+    'subscriptions' ({'series', 'amount', 'shares', 'pricing'} per contribution
+    issued, pricing 'new_series', 'pre_pl' or 'post_pl'),
+    'pl_allocated', 'fees' ({series: fee}) and the daily capital 'weights' (None
+    when the month's P/L was allocated on NAV).
+    """
+    month = month_info['month']
+    month_num = month_info['month_num']
+    pl = month_info['pl']
+
+    new_series_amount, pre_pl_contribs, post_pl_contribs = group_subscriptions(month_info)
+
+    # 1. Create new series from contributions
+    new_series_name = None
+    if new_series_amount > 0:
+        new_series_name = f"Series {month_num}/{current_year}"
+        counter = 1
+        base_name = new_series_name
+        while new_series_name in series_data:
+            counter += 1
+            new_series_name = f"{base_name}-{counter}"
+
+        new_shares = new_series_amount / par_value
+
+        calc_log.append({
+            'Step': 'New Series',
+            'Month': month,
+            'Series': new_series_name,
+            'Description': f'Contribution of ${new_series_amount:,.2f}',
+            'Details': f'Shares issued: ${new_series_amount:,.2f} / ${par_value:,.2f} = {new_shares:,.4f}'
+        })
+
+        series_data[new_series_name] = new_series_record(
+            shares=new_shares,
+            nav_per_share=par_value,
+            total_nav=new_series_amount,
+            created_month=month,
+            contributed_shares=new_shares,
+            fees={
+                'management_fee': new_series_fees.get('management_fee', 0.0),
+                'incentive_fee': new_series_fees.get('incentive_fee', 0.0),
+                'high_water_mark': par_value,
+            }
+        )
+        active[new_series_name] = series_data[new_series_name]
+
+    # Contributions into existing series priced at pre-P/L NAV share in this month's P/L
+    subscriptions = []
+    if new_series_name:
+        subscriptions.append({'series': new_series_name, 'amount': new_series_amount, 'shares': new_shares,
+                              'pricing': 'new_series'})
+    issued = issue_into_existing(series_data, pre_pl_contribs, month, 'pre-P/L', calc_log)
+    subscriptions += [{'series': name, 'amount': amount, 'shares': shares, 'pricing': 'pre_pl'}
+                      for name, (amount, shares) in issued.items()]
+
+    # 2. Allocate P/L pro-rata (AFTER contributions, BEFORE redemptions)
+    weights = None
+    if pl != 0 and month_info.get('pl_allocation') == 'daily_capital':
+        days_in_month = calendar.monthrange(current_year, month_num)[1]
+        weights = daily_capital_weights(
+            active, dated_flows(month_info, new_series_name, active, days_in_month), days_in_month
+        )
+    pl_allocated = allocate_pl(active, pl, month, calc_log, weights)
+
+    # 3. Fees on post-P/L NAV; incentive fees crystallize at year end
+    fees_charged = apply_fees(active, month, month_num == 12, calc_log)
+
+    # Contributions into existing series priced at post-P/L (net) NAV
+    issued = issue_into_existing(series_data, post_pl_contribs, month, 'post-P/L', calc_log)
+    subscriptions += [{'series': name, 'amount': amount, 'shares': shares, 'pricing': 'post_pl'}
+                      for name, (amount, shares) in issued.items()]
+
+    return {
+        'new_series_name': new_series_name,
+        'contributions': sum(sub['amount'] for sub in subscriptions),
+        'subscriptions': subscriptions,
+        'pl_allocated': pl_allocated,
+        'fees': fees_charged,
+        'weights': weights,
+    }
+
+
+# =============================================================================
+# FULL-YEAR CALCULATION
+# =============================================================================
+def calculate_share_roll(valid_prior_series, monthly_data, par_value, current_year, new_series_fees=None,
+                         nav_history=None, checkpoints=None, spill=None):
+    """
+    Run the full-year share roll.
+
+    valid_prior_series: list of prior year series dicts ('Series', 'Ending Shares',
+        'NAV per Share', 'Total NAV', 'is_initial' and optional 'Management Fee',
+        'Incentive Fee', 'High-Water Mark').
+    monthly_data: list of month dicts as built by the Step 2 form (see
+        month_subscriptions for how contributions are targeted and dated).
+        A month's 'pl_allocation' of 'daily_capital' allocates its P/L on each
+        series' average daily capital (see daily_capital_weights) instead of
+        month-end NAV; contributions then count from their day and redemptions
+        ('redemption_day', or 'day' on multi redemptions; default month end)
+        until theirs. Shares are still issued and redeemed at the month's NAV.
+    new_series_fees: fee schedule applied to series created from contributions
+        ({'management_fee': rate, 'incentive_fee': rate}); their high-water mark
+        starts at par value.
+    nav_history: optional NavHistory the month-end NAVs are appended to (as
+        'YYYY-MM' periods, replacing any earlier run of the same year).
+    checkpoints: optional dict filled with {month name: copy of series_data as the
+        month opens}, for solve_redemption.
+    spill: optional factory called with 'calc_log', 'nav_tracking' and
+        'share_tracking' for the list-like each is appended to instead of a list
+        (e.g. low_memory.SpillFolder.rows, which writes them to disk as they grow).
+
+    Returns a dict with 'series_data', 'all_series_ever', 'initial_series_name',
+    'calc_log', 'nav_tracking' and 'share_tracking' (one row of NAV per share, and
+    of shares outstanding, per period), 'monthly_fees' ({month name: {series: fee}}),
+    'monthly_flows' (per month dollar totals of P/L allocated, contributions issued,
+    redemptions paid and fees charged), 'subscription_events' (one {'month', 'series',
+    'amount', 'shares', 'pricing'} dict per contribution issued, under the series'
+    actual name), 'redemption_events' (one {'month', 'series', 'amount', 'shares',
+    'full'} dict per redemption paid) and 'pl_weights' ({month
+    name: {series: average daily capital}} for months with P/L allocated on daily
+    capital).
+    """
+    new_series_fees = new_series_fees or {}
+
+    # Initialize series tracking with beginning of year values
+    series_data = {}
+    initial_series_name = valid_prior_series[0]['Series']
+
+    # Track all series that ever existed (for output)
+    all_series_ever = set()
+
+    for s in valid_prior_series:
+        series_data[s['Series']] = new_series_record(
+            shares=s['Ending Shares'],
+            nav_per_share=s['NAV per Share'],
+            total_nav=s['Total NAV'],
+            beginning_shares=s['Ending Shares'],
+            is_initial=s.get('is_initial', False),
+            fees={
+                'management_fee': s.get('Management Fee', 0.0),
+                'incentive_fee': s.get('Incentive Fee', 0.0),
+                'high_water_mark': s.get('High-Water Mark'),
+            }
+        )
+        all_series_ever.add(s['Series'])
+
+    # Detailed calculation log
+    calc_log = spill('calc_log') if spill else []
+
+    apply_rollups(series_data, initial_series_name, par_value, calc_log)
+
+    # Series still holding shares, in creation order. Kept current on roll-up,
+    # creation and redemption so the monthly steps never walk dormant series.
+    active = {name: s for name, s in series_data.items() if s['shares'] > 0}
+    management_fees_due = fees_due(active, False)
+
+    result = {
+        'series_data': series_data,
+        'all_series_ever': all_series_ever,
+        'initial_series_name': initial_series_name,
+        'calc_log': calc_log,
+        'nav_tracking': spill('nav_tracking') if spill else [],
+        'share_tracking': spill('share_tracking') if spill else [],
+        'monthly_fees': {},
+        'monthly_flows': [],
+        'subscription_events': [],
+        'redemption_events': [],
+        'pl_weights': {},
+    }
+    result['nav_tracking'].append(nav_snapshot_row('Beginning of Year', active))
+    result['share_tracking'].append(nav_snapshot_row('Beginning of Year', active, 'shares'))
+    if nav_history is not None:
+        nav_history.clear_periods(f"{current_year}-01", f"{current_year}-12")
+
+    for month_info in monthly_data:
+        if checkpoints is not None:
+            checkpoints[month_info['month']] = {name: dict(s) for name, s in series_data.items()}
+
+        # Idle month (no activity, no fees due): every NAV carries over unchanged
+        if not month_has_activity(month_info) and not (
+                management_fees_due or (month_info['month_num'] == 12 and fees_due(active, True))):
+            carry_month_forward(result, month_info, current_year, nav_history)
+            continue
+
+        close_month(result, active, month_info, par_value, current_year, new_series_fees, nav_history)
+        management_fees_due = fees_due(active, False)
+
+    return result
+
+
+def carry_month_forward(result, month_info, current_year, nav_history=None):
+    """
+    Record an idle month: no flows or fees, every NAV and share count as the month before.
+
+    No series is visited, but the month still gets its own NAV and shares rows
+    (dict copies of the month before, O(series) at C speed) so every consumer of
+    the tracking tables sees one row per period; the NAV history copies the
+    previous month's stored row.
+    """
+    month = month_info['month']
+    month_num = month_info['month_num']
+    result['monthly_fees'][month] = {}
+    result['monthly_flows'].append({'month': month, 'pl_allocated': 0.0, 'contributions': 0.0,
+                                    'redemptions': 0.0, 'fees': 0})
+    result['nav_tracking'].append(dict(result['nav_tracking'][-1], Month=f'End of {month}'))
+    result['share_tracking'].append(dict(result['share_tracking'][-1], Month=f'End of {month}'))
+    if nav_history is not None:
+        label = f"{current_year}-{month_num:02d}"
+        previous = f"{current_year}-{month_num - 1:02d}"
+        if month_num > 1 and previous in nav_history.periods:
+            nav_history.repeat(label, previous)
+        else:
+            nav_history.append(label, {name: nav for name, nav in result['nav_tracking'][-1].items()
+                                       if name != 'Month'})
+
+
+def close_month(result, active, month_info, par_value, current_year, new_series_fees, nav_history=None):
+    """Run one month on a result (see calculate_share_roll), extending its log, tracking and flows."""
+    series_data = result['series_data']
+    calc_log = result['calc_log']
+    month = month_info['month']
+
+    steps = run_to_redemptions(series_data, active, month_info, par_value, current_year,
+                               new_series_fees, calc_log)
+    if steps['new_series_name']:
+        result['all_series_ever'].add(steps['new_series_name'])
+    if steps['weights'] is not None:
+        result['pl_weights'][month] = steps['weights']
+    result['monthly_fees'][month] = steps['fees']
+    result['subscription_events'] += [{'month': month, **sub} for sub in steps['subscriptions']]
+
+    # 4. Process redemptions (AFTER P/L and fees - at net NAV)
+    multi = bool(month_info.get('multi_redemptions'))
+    redemptions_paid = 0.0
+    for r in month_redemptions(month_info):
+        s = series_data.get(r['series'])
+        shares_before = s['shares'] if s else 0.0
+        paid = redeem(series_data, r['series'], r['amount'], r['full'], month, calc_log, multi=multi)
+        if paid:
+            result['redemption_events'].append({'month': month, 'series': r['series'], 'amount': paid,
+                                                'shares': shares_before - s['shares'], 'full': r['full']})
+        redemptions_paid += paid
+        if r['series'] in active and active[r['series']]['shares'] <= 0:
+            del active[r['series']]
+
+    result['monthly_flows'].append({
+        'month': month,
+        'pl_allocated': steps['pl_allocated'],
+        'contributions': steps['contributions'],
+        'redemptions': redemptions_paid,
+        'fees': sum(steps['fees'].values()),
+    })
+
+    month_row = nav_snapshot_row(f'End of {month}', active)
+    result['nav_tracking'].append(month_row)
+    result['share_tracking'].append(nav_snapshot_row(f'End of {month}', active, 'shares'))
+    if nav_history is not None:
+        nav_history.append(f"{current_year}-{month_info['month_num']:02d}",
+                           {name: nav for name, nav in month_row.items() if name != 'Month'})
+
+
+def advance_share_roll(result, month_info, par_value, current_year, new_series_fees=None, nav_history=None):
+    """
+    Extend a share roll result (calculated or stored) by the month after the last
+    one it covers, in place, without rerunning the earlier months. Gives the same
+    result as calculate_share_roll over the longer monthly_data.
+    """
+    expected = len(result['monthly_flows']) + 1
+    if month_info['month_num'] != expected:
+        raise ValueError(f"Result covers months 1-{expected - 1}; can't advance to month {month_info['month_num']}")
+    active = {name: s for name, s in result['series_data'].items() if s['shares'] > 0}
+    if nav_history is not None:
+        nav_history.clear_periods(f"{current_year}-{month_info['month_num']:02d}", f"{current_year}-12")
+    if not month_has_activity(month_info) and not fees_due(active, month_info['month_num'] == 12):
+        carry_month_forward(result, month_info, current_year, nav_history)
+    else:
+        close_month(result, active, month_info, par_value, current_year, new_series_fees or {}, nav_history)
+    return result
+
+
+# =============================================================================
+# REDEMPTION SOLVER
+# =============================================================================
+def solve_redemption(checkpoints, month_info, series_name, par_value, current_year, new_series_fees=None,
+                     target_shares=None, target_nav=None, tolerance=1e-9, max_iterations=50):
+    """
+    The dollar redemption from one series in one month that leaves it holding
+    target_shares shares, or target_nav of NAV, straight after the redemption.
+
+    Replays only that month from its opening state in checkpoints (filled by
+    calculate_share_roll) rather than the whole year; the month's other
+    redemptions are kept, and any redemptions it already has from series_name
+    are replaced by the solved amount. Redemptions are paid at the post-P/L,
+    post-fee NAV per share, so the amount is exact in one replay, except where
+    the month's P/L is allocated on daily capital: the redemption then shifts
+    the series' share of the P/L, and the amount is iterated to a fixed point.
+
+    Returns a dict with the 'amount', 'shares_redeemed', 'nav_per_share' it is
+    paid at, the 'shares_before' and 'nav_before' the redemption, and 'full'
+    (True when the target leaves nothing, i.e. a full redemption).
+    Raises ValueError for a target the series can't reach that month.
+    """
+    if (target_shares is None) == (target_nav is None):
+        raise ValueError("Give exactly one of target_shares or target_nav")
+    month = month_info['month']
+    if month not in checkpoints:
+        raise ValueError(f"No checkpoint for {month}; run calculate_share_roll with checkpoints first")
+    new_series_fees = new_series_fees or {}
+    others = [r for r in month_redemptions(month_info) if r['series'] != series_name]
+    day = next((r['day'] for r in month_redemptions(month_info) if r['series'] == series_name), None)
+
+    amount = 0.0
+    for _ in range(max_iterations):
+        trial = dict(month_info, redemptions=0.0, full_redemption=False, multi_redemptions=others + [
+            {'series': series_name, 'amount': amount, 'full': False, 'day': day}
+        ])
+        series_data = {name: dict(s) for name, s in checkpoints[month].items()}
+        active = {name: s for name, s in series_data.items() if s['shares'] > 0}
+        run_to_redemptions(series_data, active, trial, par_value, current_year, new_series_fees, [])
+
+        s = series_data.get(series_name)
+        if s is None or s['shares'] <= 0 or s['nav_per_share'] <= 0:
+            raise ValueError(f"{series_name} has no shares at a positive NAV to redeem in {month}")
+        if target_shares is not None:
+            if not 0 <= target_shares <= s['shares']:
+                raise ValueError(f"{series_name} holds {s['shares']:,.4f} shares before redemptions in {month}")
+            solved = (s['shares'] - target_shares) * s['nav_per_share']
+        else:
+            if not 0 <= target_nav <= s['total_nav']:
+                raise ValueError(f"{series_name} holds ${s['total_nav']:,.2f} of NAV before redemptions in {month}")
+            solved = s['total_nav'] - target_nav
+
+        # The redemption only moves the P/L split when it is dated against daily capital
+        if trial['pl'] == 0 or trial.get('pl_allocation') != 'daily_capital' or \
+                abs(solved - amount) <= tolerance * max(1.0, abs(solved)):
+            return {
+                'amount': solved,
+                'shares_redeemed': solved / s['nav_per_share'],
+                'nav_per_share': s['nav_per_share'],
+                'shares_before': s['shares'],
+                'nav_before': s['total_nav'],
+                'full': (target_shares if target_nav is None else target_nav) == 0,
+            }
+        amount = solved
+    raise ValueError(f"Redemption from {series_name} in {month} did not converge")
+
+
+# =============================================================================
+# OUTPUT
+# =============================================================================
+def iter_output_rows(result, include_fees=False):
+    """
+    Share roll summary rows one at a time (sorted, then a TOTAL row), so large
+    funds can be written out without building the whole table.
+    """
+    series_data = result['series_data']
+    initial_series_name = result['initial_series_name']
+
+    # Sort: Initial series first, then prior year series, then new series by month
+    def sort_key(name):
+        if name == initial_series_name:
+            return (0, name)
+        elif '/' not in name:  # Prior year series
+            return (1, name)
+        else:  # New series
+            return (2, name)
+
+    totals = dict.fromkeys(['Beginning Shares', 'Transfers In', 'Transfers Out', 'Contributed Shares',
+                            'Redeemed Shares', 'Ending Shares'], 0)
+    for series_name in sorted(result['all_series_ever'], key=sort_key):
+        s = series_data[series_name]
+        row = {
+            'Series': series_name,
+            'Beginning Shares': s['beginning_shares'],
+            'Transfers In': s['transfers_in'],
+            'Transfers Out': s['transfers_out'],
+            'Contributed Shares': s['contributed_shares'],
+            'Redeemed Shares': s['redeemed_shares'],
+            'Ending Shares': s['shares'],
+            'Ending NAV per Share': s['nav_per_share'] if s['shares'] > 0 else 0.0
+        }
+        if include_fees:
+            row['Ending High-Water Mark'] = s['high_water_mark'] if s['shares'] > 0 else 0.0
+        for column in totals:
+            totals[column] += row[column]
+        yield row
+
+    # Add total row
+    total_row = {'Series': 'TOTAL', **totals, 'Ending NAV per Share': ''}  # NAV per share N/A for total
+    if include_fees:
+        total_row['Ending High-Water Mark'] = ''
+    yield total_row
+
+
+def build_output_rows(result, include_fees=False):
+    """Share roll summary rows (sorted, with a TOTAL row appended)."""
+    return list(iter_output_rows(result, include_fees))
@@ -0,0 +1,562 @@
+"""
+Excel export - Series Accounting
+Builds the downloadable share roll workbook: Share Roll Summary, Calculation
+Details and Inputs sheets.
+
+The Calculation Details sheet can be written in three modes:
+- 'formulas': every derived cell is a live formula (full audit trail)
+- 'sampled':  live formulas for an evenly spaced sample of series and the month
+              totals; every other cell holds its precomputed value
+- 'values':   precomputed values only, for lightweight files
+Cell values are evaluated in Python with the same arithmetic the formulas use,
+so every mode shows the same numbers.
+
+build_fund_complex_workbook writes several stored funds into one workbook: a
+consolidated roll-up sheet plus one summary sheet per fund.
+"""
+
+import io
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill
+from openpyxl.utils import get_column_letter
+
+from engine import build_output_rows, calculate_share_roll
+
+# Series per workbook that keep live formulas in 'sampled' mode
+AUDIT_SAMPLE_SIZE = 10
+
+# Styles shared by every sheet of every export
+TITLE_FONT = Font(bold=True, size=12)
+MONTH_FONT = Font(bold=True, size=11)
+HEADER_FONT = Font(bold=True)
+HEADER_FILL = PatternFill(start_color='D9E1F2', end_color='D9E1F2', fill_type='solid')
+MONTH_FILL = PatternFill(start_color='E2EFDA', end_color='E2EFDA', fill_type='solid')
+CURRENCY_FORMAT = '$#,##0.00'
+SHARES_FORMAT = '#,##0.0000'
+NAV_FORMAT = '$#,##0.0000'
+PCT_FORMAT = '0.00%'
+
+
+def audit_sample(series_names, size=AUDIT_SAMPLE_SIZE):
+    """Evenly spaced subset of series names (first and last always included)."""
+    if len(series_names) <= size:
+        return set(series_names)
+    step = (len(series_names) - 1) / (size - 1)
+    return {series_names[round(i * step)] for i in range(size)}
+
+
+def inputs_frames(valid_prior_series, monthly_data, prior_year, current_year, par_value):
+    """Parameter, prior series and monthly activity tables for the Inputs sheet."""
+    inputs_df = pd.DataFrame({
+        'Parameter': ['Prior Year', 'Calculating Year', 'Par Value'],
+        'Value': [prior_year, current_year, par_value]
+    })
+
+    prior_inputs = pd.DataFrame(valid_prior_series)
+    monthly_inputs_data = []
+    for md in monthly_data:
+        md_copy = dict(md)
+        mrs = md_copy.get('multi_redemptions', [])
+        if mrs:
+            parts = []
+            for mr in mrs:
+                amt_str = 'FULL' if mr['full'] else '${:,.2f}'.format(mr['amount'])
+                parts.append('{}: {}'.format(mr['series'], amt_str))
+            md_copy['multi_redemptions'] = '; '.join(parts)
+        else:
+            md_copy['multi_redemptions'] = ''
+        if 'subscriptions' in md_copy:
+            md_copy['subscriptions'] = '; '.join(
+                '{}: ${:,.2f}'.format(sub['series'] or 'New Series', sub['amount']) for sub in md_copy['subscriptions']
+            )
+        monthly_inputs_data.append(md_copy)
+    monthly_inputs = pd.DataFrame(monthly_inputs_data)
+    return inputs_df, prior_inputs, monthly_inputs
+
+
+# =============================================================================
+# SHEET WRITERS
+# =============================================================================
+def write_summary_sheet(writer, output_df, fees_enabled, sheet_name='Share Roll Summary'):
+    """Sheet 1: Summary Output (numbers, not strings)."""
+    # Keep output_df as numbers for Excel
+    excel_output_df = output_df.copy()
+    # Replace empty string with None for proper Excel handling
+    excel_output_df['Ending NAV per Share'] = excel_output_df['Ending NAV per Share'].replace('', None)
+    if fees_enabled:
+        excel_output_df['Ending High-Water Mark'] = excel_output_df['Ending High-Water Mark'].replace('', None)
+    excel_output_df.to_excel(writer, index=False, sheet_name=sheet_name)
+
+    # Format the Excel sheet
+    worksheet = writer.sheets[sheet_name]
+
+    # Apply number format with commas to numeric columns
+    for row in range(2, len(excel_output_df) + 2):  # Start from row 2 (after header)
+        for col in range(2, 8):  # Columns B through G (shares columns)
+            cell = worksheet.cell(row=row, column=col)
+            if cell.value is not None and isinstance(cell.value, (int, float)):
+                cell.number_format = SHARES_FORMAT
+        # NAV per Share column (column H) and High-Water Mark (column I, fees only)
+        for col in range(8, len(excel_output_df.columns) + 1):
+            cell = worksheet.cell(row=row, column=col)
+            if cell.value is not None and isinstance(cell.value, (int, float)):
+                cell.number_format = NAV_FORMAT
+
+    # Auto-fit column widths
+    for column in worksheet.columns:
+        max_length = 0
+        column_letter = column[0].column_letter
+        for cell in column:
+            if cell.value is not None and len(str(cell.value)) > max_length:
+                max_length = len(str(cell.value))
+        worksheet.column_dimensions[column_letter].width = max(max_length + 2, 12)
+    return worksheet
+
+
+def applied_flows(result, monthly_data):
+    """
+    {month: {'new_series': (name, amount) or None, 'pre_pl': {series: amount},
+    'post_pl': {series: amount}, 'redemptions': {series: (paid, full)}}} from the
+    engine's subscription and redemption events: new series under the names the
+    engine gave them, and only the flows it applied.
+    """
+    flows = {md['month']: {'new_series': None, 'pre_pl': {}, 'post_pl': {}, 'redemptions': {}}
+             for md in monthly_data}
+    for sub in result['subscription_events']:
+        if sub['pricing'] == 'new_series':
+            flows[sub['month']]['new_series'] = (sub['series'], sub['amount'])
+        else:
+            amounts = flows[sub['month']][sub['pricing']]
+            amounts[sub['series']] = amounts.get(sub['series'], 0.0) + sub['amount']
+    for event in result['redemption_events']:
+        redemptions = flows[event['month']]['redemptions']
+        paid, full = redemptions.get(event['series'], (0.0, False))
+        redemptions[event['series']] = (paid + event['amount'], full or event['full'])
+    return flows
+
+
+def write_calculation_sheet(workbook, valid_prior_series, monthly_data, result, fees_enabled, current_year,
+                            formula_mode='formulas', sheet_name='Calculation Details'):
+    """Sheet 2: month-by-month progression of every series' NAV."""
+    calc_sheet = workbook.create_sheet(sheet_name)
+
+    flows = applied_flows(result, monthly_data)
+
+    # Which series rows keep live formulas
+    all_series = [s['Series'] for s in valid_prior_series]
+    all_series += [month_flows['new_series'][0] for month_flows in flows.values() if month_flows['new_series']]
+    if formula_mode == 'formulas':
+        audited = set(all_series)
+    elif formula_mode == 'sampled':
+        audited = audit_sample(all_series)
+    else:
+        audited = set()
+    total_formulas = formula_mode != 'values'
+
+    def put(row, col, formula, value, number_format, audit):
+        """Write a formula when auditing this cell, otherwise its precomputed value."""
+        cell = calc_sheet.cell(row=row, column=col, value=formula if audit else value)
+        cell.number_format = number_format
+        return cell
+
+    row = 1
+
+    # Section 1: Prior Year Series Data
+    calc_sheet.cell(row=row, column=1, value='PRIOR YEAR ENDING BALANCES').font = TITLE_FONT
+    row += 1
+
+    headers = ['Series', 'Ending Shares', 'NAV per Share', 'Total NAV']
+    for col, header in enumerate(headers, 1):
+        cell = calc_sheet.cell(row=row, column=col, value=header)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+    row += 1
+
+    prior_start_row = row
+    for s in valid_prior_series:
+        calc_sheet.cell(row=row, column=1, value=s['Series'])
+        calc_sheet.cell(row=row, column=2, value=s['Ending Shares']).number_format = SHARES_FORMAT
+        calc_sheet.cell(row=row, column=3, value=s['NAV per Share']).number_format = CURRENCY_FORMAT
+        # Formula: Shares * NAV per Share
+        put(row, 4, f'=B{row}*C{row}', s['Ending Shares'] * s['NAV per Share'], CURRENCY_FORMAT, s['Series'] in audited)
+        row += 1
+    prior_end_row = row - 1
+
+    # Total row
+    calc_sheet.cell(row=row, column=1, value='TOTAL').font = HEADER_FONT
+    put(row, 2, f'=SUM(B{prior_start_row}:B{prior_end_row})',
+        sum(s['Ending Shares'] for s in valid_prior_series), SHARES_FORMAT, total_formulas)
+    put(row, 4, f'=SUM(D{prior_start_row}:D{prior_end_row})',
+        sum(s['Ending Shares'] * s['NAV per Share'] for s in valid_prior_series), CURRENCY_FORMAT, total_formulas)
+    row += 2
+
+    # Section 2: Monthly Calculations
+    calc_sheet.cell(row=row, column=1, value='MONTHLY CALCULATIONS').font = TITLE_FONT
+    row += 1
+
+    # Track series NAV for formula references, and the same NAVs as values
+    series_nav_refs = {}
+    series_nav_values = {}
+
+    # Initialize with prior year data
+    for idx, s in enumerate(valid_prior_series):
+        series_nav_refs[s['Series']] = f'D{prior_start_row + idx}'
+        series_nav_values[s['Series']] = s['Ending Shares'] * s['NAV per Share']
+
+    # Optional columns between NAV post-P/L and Redemption: fees, and contributions
+    # issued into existing series at post-P/L NAV
+    extra_headers = []
+    if fees_enabled:
+        extra_headers.append('Fees')
+    if any(month_flows['post_pl'] for month_flows in flows.values()):
+        extra_headers.append('Contribution post-P/L')
+    fee_col = 8 + extra_headers.index('Fees') if 'Fees' in extra_headers else None
+    post_contrib_col = 8 + extra_headers.index('Contribution post-P/L') if 'Contribution post-P/L' in extra_headers else None
+    redemp_col = 8 + len(extra_headers)
+    end_col = redemp_col + 1
+    redemp_letter = get_column_letter(redemp_col)
+    end_letter = get_column_letter(end_col)
+
+    def net_nav(r):
+        # NAV a full redemption takes out: post-P/L plus fees and post-P/L contributions
+        if redemp_col == 8:
+            return f'G{r}'
+        return '(' + '+'.join(f'{get_column_letter(c)}{r}' for c in range(7, redemp_col)) + ')'
+
+    for month_info in monthly_data:
+        month = month_info['month']
+        pl = month_info['pl']
+        month_flows = flows[month]
+        new_series_name, new_series_amount = month_flows['new_series'] or (None, 0)
+        pre_pl_contribs = month_flows['pre_pl']
+        post_pl_contribs = month_flows['post_pl']
+        redemptions = month_flows['redemptions']
+        contributions = new_series_amount + sum(pre_pl_contribs.values()) + sum(post_pl_contribs.values())
+
+        # Skip months with no activity
+        if pl == 0 and contributions == 0 and not redemptions and not result['monthly_fees'].get(month):
+            continue
+
+        # Month header
+        calc_sheet.cell(row=row, column=1, value=f'{month}').font = MONTH_FONT
+        calc_sheet.cell(row=row, column=1).fill = MONTH_FILL
+        for col in range(2, 8):
+            calc_sheet.cell(row=row, column=col).fill = MONTH_FILL
+        row += 1
+
+        # Column headers: Contributions → P/L → Redemptions (matches calculation order)
+        month_headers = ['Series', 'Beginning NAV', 'Contribution', 'NAV pre-P/L', 'P/L %', 'P/L Allocated', 'NAV post-P/L'] \
+            + extra_headers + ['Redemption', 'Ending NAV']
+        for col, header in enumerate(month_headers, 1):
+            cell = calc_sheet.cell(row=row, column=col, value=header)
+            cell.font = HEADER_FONT
+            cell.fill = HEADER_FILL
+        row += 1
+
+        month_start_row = row
+        active_series = list(series_nav_refs.keys())
+
+        new_series_refs = {}
+        contribution_values = {}
+        pre_pl_values = {}
+
+        for series_name in active_series:
+            calc_sheet.cell(row=row, column=1, value=series_name)
+            audit = series_name in audited
+
+            # Beginning NAV
+            beg_nav_ref = series_nav_refs[series_name]
+            beg_nav = series_nav_values[series_name]
+            put(row, 2, f'={beg_nav_ref}', beg_nav, CURRENCY_FORMAT, audit)
+
+            # Contribution into an existing series at pre-P/L NAV
+            contribution = pre_pl_contribs.get(series_name, 0)
+            contribution_values[series_name] = contribution
+            calc_sheet.cell(row=row, column=3, value=contribution).number_format = CURRENCY_FORMAT
+
+            # NAV pre-P/L = Beginning + Contribution
+            pre_pl_values[series_name] = beg_nav + contribution
+            put(row, 4, f'=B{row}+C{row}', pre_pl_values[series_name], CURRENCY_FORMAT, audit)
+
+            new_series_refs[series_name] = row
+            row += 1
+
+        # Add new series row from contribution
+        if new_series_name:
+            calc_sheet.cell(row=row, column=1, value=new_series_name)
+            calc_sheet.cell(row=row, column=2, value=0).number_format = CURRENCY_FORMAT
+            calc_sheet.cell(row=row, column=3, value=new_series_amount).number_format = CURRENCY_FORMAT
+            contribution_values[new_series_name] = new_series_amount
+            pre_pl_values[new_series_name] = 0 + new_series_amount
+            put(row, 4, f'=B{row}+C{row}', pre_pl_values[new_series_name], CURRENCY_FORMAT, new_series_name in audited)
+
+            new_series_refs[new_series_name] = row
+            row += 1
+
+        month_end_row = row - 1
+
+        # Build total NAV pre-P/L formula
+        total_nav_pre_pl = f'SUM(D{month_start_row}:D{month_end_row})'
+        total_nav_pre_pl_value = sum(pre_pl_values.values())
+
+        month_fees = result['monthly_fees'].get(month, {})
+        # Months allocated on average daily capital carry the engine's weights as values
+        month_weights = result.get('pl_weights', {}).get(month)
+        total_weight = sum(month_weights.values()) if month_weights else 0
+        ending_values = {}
+        month_totals = {}
+
+        # Fill in P/L %, P/L Allocated, NAV post-P/L, Fees, Redemption, Ending NAV
+        for sname, srow in new_series_refs.items():
+            audit = sname in audited
+            values = {col: 0 for col in range(2, end_col + 1)}
+            values[4] = pre_pl_values[sname]
+
+            if pl != 0:
+                # P/L % = NAV pre-P/L / Total NAV pre-P/L
+                if month_weights is not None:
+                    pl_pct = 0 if total_weight == 0 else month_weights.get(sname, 0.0) / total_weight
+                    calc_sheet.cell(row=srow, column=5, value=pl_pct).number_format = PCT_FORMAT
+                else:
+                    pl_pct = 0 if total_nav_pre_pl_value == 0 else values[4] / total_nav_pre_pl_value
+                    put(srow, 5, f'=IF({total_nav_pre_pl}=0,0,D{srow}/{total_nav_pre_pl})', pl_pct, PCT_FORMAT, audit)
+                # P/L Allocated = P/L % * Total P/L
+                values[6] = pl_pct * pl
+                put(srow, 6, f'=E{srow}*{pl}', values[6], CURRENCY_FORMAT, audit)
+            else:
+                calc_sheet.cell(row=srow, column=5, value=0).number_format = PCT_FORMAT
+                calc_sheet.cell(row=srow, column=6, value=0).number_format = CURRENCY_FORMAT
+
+            # NAV post-P/L = NAV pre-P/L + P/L Allocated
+            values[7] = values[4] + values[6]
+            put(srow, 7, f'=D{srow}+F{srow}', values[7], CURRENCY_FORMAT, audit)
+
+            # Fees (precomputed by the engine)
+            if fee_col:
+                values[fee_col] = -month_fees.get(sname, 0.0)
+                calc_sheet.cell(row=srow, column=fee_col, value=values[fee_col]).number_format = CURRENCY_FORMAT
+
+            # Contribution into an existing series at post-P/L NAV
+            if post_contrib_col:
+                values[post_contrib_col] = post_pl_contribs.get(sname, 0)
+                calc_sheet.cell(row=srow, column=post_contrib_col, value=values[post_contrib_col]).number_format = CURRENCY_FORMAT
+
+            net_nav_value = sum(values[col] for col in range(7, redemp_col))
+
+            # Redemption (a full one, alone or after partials, takes the whole net NAV)
+            paid, full = redemptions.get(sname, (0, False))
+            if full:
+                values[redemp_col] = -net_nav_value
+                put(srow, redemp_col, f'=-{net_nav(srow)}', values[redemp_col], CURRENCY_FORMAT, audit)
+            else:
+                values[redemp_col] = -paid
+                calc_sheet.cell(row=srow, column=redemp_col, value=values[redemp_col]).number_format = CURRENCY_FORMAT
+
+            # Ending NAV = NAV post-P/L (+ Fees + post-P/L Contribution) + Redemption
+            values[end_col] = net_nav_value + values[redemp_col]
+            put(srow, end_col, f'={net_nav(srow)}+{redemp_letter}{srow}', values[end_col], CURRENCY_FORMAT, audit)
+            ending_values[sname] = values[end_col]
+
+            values[2] = series_nav_values.get(sname, 0)
+            values[3] = contribution_values[sname]
+            for col, value in values.items():
+                month_totals[col] = month_totals.get(col, 0) + value
+
+        # Update series_nav_refs to point to Ending NAV column
+        final_refs = {}
+        for sname, srow in new_series_refs.items():
+            final_refs[sname] = f'{end_letter}{srow}'
+
+        # Total row for month
+        calc_sheet.cell(row=row, column=1, value='Month Total').font = HEADER_FONT
+        for col in [2, 3, 4, 6, 7] + list(range(8, end_col + 1)):
+            col_letter = get_column_letter(col)
+            put(row, col, f'=SUM({col_letter}{month_start_row}:{col_letter}{month_end_row})',
+                month_totals.get(col, 0), CURRENCY_FORMAT, total_formulas)
+
+        # Update series references for next month
+        series_nav_refs = final_refs
+        series_nav_values = ending_values
+        row += 2
+
+    # Auto-fit columns
+    for col in range(1, end_col + 1):
+        calc_sheet.column_dimensions[get_column_letter(col)].width = 16
+    return calc_sheet
+
+
+def write_inputs_sheet(writer, valid_prior_series, monthly_data, prior_year, current_year, par_value,
+                       sheet_name='Inputs'):
+    """Sheet 3: Inputs Summary."""
+    inputs_df, prior_inputs, monthly_inputs = inputs_frames(
+        valid_prior_series, monthly_data, prior_year, current_year, par_value
+    )
+    inputs_df.to_excel(writer, index=False, sheet_name=sheet_name, startrow=0)
+    prior_inputs.to_excel(writer, index=False, sheet_name=sheet_name, startrow=5)
+    monthly_inputs.to_excel(writer, index=False, sheet_name=sheet_name, startrow=5 + len(prior_inputs) + 3)
+
+
+def build_share_roll_workbook(output_df, valid_prior_series, monthly_data, result, fees_enabled,
+                              prior_year, current_year, par_value, formula_mode='formulas'):
+    """The full share roll workbook as an in-memory .xlsx file."""
+    output_buffer = io.BytesIO()
+    with pd.ExcelWriter(output_buffer, engine='openpyxl') as writer:
+        write_summary_sheet(writer, output_df, fees_enabled)
+        write_calculation_sheet(writer.book, valid_prior_series, monthly_data, result, fees_enabled,
+                                current_year, formula_mode)
+        write_inputs_sheet(writer, valid_prior_series, monthly_data, prior_year, current_year, par_value)
+    output_buffer.seek(0)
+    return output_buffer
+
+
+# =============================================================================
+# FUND COMPLEX WORKBOOK
+# =============================================================================
+ROLLUP_SHEET = 'Fund Complex Roll-up'
+ROLLUP_COLUMNS = ['Fund', 'Year', 'Open Series', 'Beginning NAV', 'Contributions', 'Redemptions', 'P/L',
+                  'Management Fees', 'Incentive Fees', 'Ending NAV', 'Beginning Shares', 'Ending Shares']
+ROLLUP_FORMATS = {'Beginning Shares': SHARES_FORMAT, 'Ending Shares': SHARES_FORMAT}
+
+# Series-months of share rolls left to calculate before worker processes pay off: below
+# this (~1s of calculation) process start-up and pickling cost more than they save
+POOL_MIN_SERIES_MONTHS = 20000
+
+
+def _column_widths(columns, rows):
+    return [max([len(str(col))] + [len(f"{row[i]:,.4f}" if isinstance(row[i], float) else str(row[i]))
+                                   for row in rows if row[i] is not None]) + 2
+            for i, col in enumerate(columns)]
+
+
+def prepare_fund_sheet(job):
+    """
+    Worker: one fund-year's summary sheet contents and roll-up row as plain values.
+
+    job is {'fund', 'year', 'calc_inputs'} (the dict from fund_inputs.stored_calc_inputs)
+    with an optional stored 'result'; the share roll is calculated when it is missing.
+    """
+    calc = job['calc_inputs']
+    result = job.get('result')
+    if result is None:
+        result = calculate_share_roll(calc['prior_series'], calc['monthly_data'], calc['par_value'],
+                                      calc['current_year'], new_series_fees=calc['new_series_fees'])
+    fees = calc['new_series_fees']
+    fees_enabled = fees['management_fee'] > 0 or fees['incentive_fee'] > 0 or any(
+        s['Management Fee'] > 0 or s['Incentive Fee'] > 0 for s in calc['prior_series']
+    )
+    output_rows = build_output_rows(result, include_fees=fees_enabled)
+    columns = list(output_rows[0])
+    rows = [[None if row[col] == '' else row[col] for col in columns] for row in output_rows]
+    formats = [None] + [SHARES_FORMAT] * 6 + [NAV_FORMAT] * (len(columns) - 7)
+
+    series_data = result['series_data']
+    flows = result['monthly_flows']
+    total = output_rows[-1]
+    rollup_row = [
+        job['fund'],
+        job['year'],
+        sum(1 for s in series_data.values() if s['shares'] > 0),
+        sum(s['Total NAV'] for s in calc['prior_series']),
+        sum(f['contributions'] for f in flows),
+        sum(f['redemptions'] for f in flows),
+        sum(f['pl_allocated'] for f in flows),
+        sum(s['management_fees'] for s in series_data.values()),
+        sum(s['incentive_fees'] for s in series_data.values()),
+        sum(s['total_nav'] for s in series_data.values() if s['shares'] > 0),
+        total['Beginning Shares'],
+        total['Ending Shares'],
+    ]
+    return {
+        'fund': job['fund'],
+        'year': job['year'],
+        'columns': columns,
+        'rows': rows,
+        'formats': formats,
+        'widths': _column_widths(columns, rows),
+        'rollup_row': rollup_row,
+    }
+
+
+def _sheet_title(name, taken):
+    """Excel-safe sheet name (31 chars, no []:*?/\\), unique within the workbook."""
+    base = re.sub(r'[\[\]:*?/\\]', '_', str(name)).strip("' ")[:31] or 'Fund'
+    title, n = base, 2
+    while title.lower() in taken:
+        suffix = f" ({n})"
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    taken.add(title.lower())
+    return title
+
+
+def _append_table(sheet, columns, rows, formats, widths, total_row=True):
+    """Write a header and data rows through the write-only sheet using the shared styles."""
+    for i, width in enumerate(widths, start=1):
+        sheet.column_dimensions[get_column_letter(i)].width = max(width, 12)
+    header = []
+    for col in columns:
+        cell = WriteOnlyCell(sheet, value=col)
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        header.append(cell)
+    sheet.append(header)
+    for r, row in enumerate(rows):
+        bold = total_row and r == len(rows) - 1
+        cells = []
+        for value, number_format in zip(row, formats):
+            cell = WriteOnlyCell(sheet, value=value)
+            if number_format and isinstance(value, (int, float)):
+                cell.number_format = number_format
+            if bold:
+                cell.font = HEADER_FONT
+            cells.append(cell)
+        sheet.append(cells)
+
+
+def build_fund_complex_workbook(jobs, workers=None):
+    """
+    One workbook for a fund complex: a roll-up sheet (one row per fund-year plus
+    a total) followed by each fund's share roll summary.
+
+    Sheet contents are prepared by prepare_fund_sheet: in worker processes for the
+    fund-years whose share rolls still have to be calculated, when there are at
+    least POOL_MIN_SERIES_MONTHS of them, and in this process otherwise (stored
+    results only need summarizing, which is cheaper than pickling them). This
+    process alone writes the file, streaming rows through a write-only workbook
+    with the module's shared styles.
+    """
+    to_calculate = [job for job in jobs if job.get('result') is None]
+    series_months = sum(len(job['calc_inputs']['prior_series']) * len(job['calc_inputs']['monthly_data'])
+                        for job in to_calculate)
+    if workers is None:
+        workers = min(len(to_calculate), os.cpu_count() or 1)
+    calculated = {}
+    if workers > 1 and len(to_calculate) > 1 and series_months >= POOL_MIN_SERIES_MONTHS:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            calculated = dict(zip(map(id, to_calculate), pool.map(prepare_fund_sheet, to_calculate)))
+    prepared = [calculated.get(id(job)) or prepare_fund_sheet(job) for job in jobs]
+
+    multi_year = len({p['year'] for p in prepared}) > 1
+    taken = {ROLLUP_SHEET.lower()}
+    titles = [_sheet_title(f"{p['fund']} {p['year']}" if multi_year else p['fund'], taken) for p in prepared]
+
+    rollup_rows = [p['rollup_row'] for p in prepared]
+    rollup_rows.append(['TOTAL', None] + [sum(row[i] for row in rollup_rows)
+                                          for i in range(2, len(ROLLUP_COLUMNS))])
+    rollup_formats = [None, None, None] + [ROLLUP_FORMATS.get(col, CURRENCY_FORMAT) for col in ROLLUP_COLUMNS[3:]]
+
+    workbook = Workbook(write_only=True)
+    _append_table(workbook.create_sheet(ROLLUP_SHEET), ROLLUP_COLUMNS, rollup_rows, rollup_formats,
+                  _column_widths(ROLLUP_COLUMNS, rollup_rows))
+    for title, p in zip(titles, prepared):
+        _append_table(workbook.create_sheet(title), p['columns'], p['rows'], p['formats'], p['widths'])
+
+    output_buffer = io.BytesIO()
+    workbook.save(output_buffer)
+    output_buffer.seek(0)
+    return output_buffer
@@ -0,0 +1,328 @@
+"""
+Administrator feed ingestion - Series Accounting
+Month-end close from the fund administrator's monthly activity files.
+
+Feeds are CSV files dropped into a folder, one per fund and month:
+
+    <feed dir>/<fund>/<YYYY-MM>.csv
+
+with a header row and one row per item (Day and Full are optional):
+
+    Type,Series,Amount,Day,Full
+    P/L,,125000.00,,
+    Subscription,,250000,15,             <- blank Series: a new series at par
+    Subscription,Series A,50000,1,
+    Redemption,Series 2/2024,40000,30,
+    Redemption,Initial Series,,,yes      <- full redemption
+
+Each feed is validated and written into the fund-year's Step 2 activity (the
+rows the app's grids show). The stored share roll is then advanced by just that
+month when it covers exactly the earlier months with unchanged inputs, and
+recalculated from January otherwise (e.g. after earlier months were edited in
+the app). The result is saved to the fund store, its NAV history and query
+tables, and the share roll and NAV per share tables are written as CSV. A
+January feed opens the fund's next year from the previous December's series.
+
+Results are stored under the digest of the full 12-month inputs, as the app
+stores them; the months a result covers (len(result['monthly_flows'])) are the
+months closed, so the app opens a fund-year closed through May as such.
+
+Processed feeds move to <feed dir>/processed/<fund>/ and rejected ones to
+<feed dir>/rejected/<fund>/ with a .errors.txt beside them. A feed that arrives
+before the month it follows is closed is left in place until it can be.
+
+Usage:
+    python feed_ingest.py feeds/
+    python feed_ingest.py feeds/ --watch 30 --excel
+"""
+
+import argparse
+import csv
+import hashlib
+import math
+import os
+import re
+import shutil
+import sys
+import time
+
+import fund_store
+from engine import MONTHS, advance_share_roll, build_output_rows, calculate_share_roll
+from fund_inputs import (
+    MULTIPLE_SERIES, NEW_SERIES, day_of_month, next_year_inputs, parse_float, stored_calc_inputs,
+)
+
+FEED_COLUMNS = ['Type', 'Series', 'Amount', 'Day', 'Full']
+FEED_TYPES = {'p/l': 'pl', 'pl': 'pl', 'subscription': 'subscription', 'contribution': 'subscription',
+              'redemption': 'redemption'}
+FEED_NAME = re.compile(r'(\d{4})-(\d{2})\.csv$')
+TRUE_TEXT = {'y', 'yes', 'true', '1', 'x'}
+
+
+# =============================================================================
+# FEED PARSING
+# =============================================================================
+def read_feed(path, year, month_num):
+    """Feed rows as {'type', 'series', 'amount', 'day', 'full'} dicts, plus validation messages."""
+    errors = []
+    items = []
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        missing = [col for col in ('Type', 'Amount') if col not in (reader.fieldnames or [])]
+        if missing:
+            return [], [f"missing column(s) {', '.join(missing)}; expected {', '.join(FEED_COLUMNS)}"]
+        for line, row in enumerate(reader, start=2):
+            kind = FEED_TYPES.get((row.get('Type') or '').strip().lower())
+            if kind is None:
+                errors.append(f"line {line}: unknown type '{row.get('Type')}'")
+                continue
+            full = (row.get('Full') or '').strip().lower() in TRUE_TEXT
+            amount = parse_float(row.get('Amount'), None)
+            if amount is None and not (kind == 'redemption' and full):
+                errors.append(f"line {line}: amount '{row.get('Amount')}' is not a number")
+                continue
+            if amount is not None and not math.isfinite(amount):
+                errors.append(f"line {line}: amount '{row.get('Amount')}' is not a finite number")
+                continue
+            if kind != 'pl' and (amount or 0.0) < 0:
+                errors.append(f"line {line}: {kind} amount must not be negative")
+                continue
+            day = parse_float(row.get('Day'), None)
+            day_errors = []
+            day = day_of_month(day, month_num, year, f"line {line} day", day_errors)
+            errors += day_errors
+            items.append({'type': kind, 'series': (row.get('Series') or '').strip() or None,
+                          'amount': amount or 0.0, 'day': day, 'full': full})
+    return items, errors
+
+
+def apply_feed(inputs, items, month_num):
+    """
+    Write a month's feed items into the stored inputs' Step 2 rows (replacing that
+    month's activity and Multiple Series rows). Returns validation messages for
+    what the grids can't hold.
+    """
+    month = MONTHS[month_num - 1]
+    errors = []
+    subscriptions = [item for item in items if item['type'] == 'subscription' and item['amount'] > 0]
+    redemptions = [item for item in items if item['type'] == 'redemption' and (item['amount'] > 0 or item['full'])]
+
+    targets = {item['series'] for item in subscriptions}
+    days = {item['day'] for item in subscriptions}
+    if len(targets) > 1:
+        errors.append(f"{month}: subscriptions go to {len(targets)} targets; the grid holds one per month")
+    if len(days) > 1:
+        errors.append(f"{month}: subscriptions have {len(days)} different days; the grid holds one per month")
+
+    tables = inputs['tables']
+    activity = next((row for row in tables['activity'] if row['Month'] == month), None)
+    if activity is None:
+        activity = {'Month': month}
+        tables['activity'].append(activity)
+    pl = sum(item['amount'] for item in items if item['type'] == 'pl')
+    contribution = sum(item['amount'] for item in subscriptions)
+    activity.update({
+        'P/L': repr(pl) if pl else None,
+        'Contrib': repr(contribution) if contribution else None,
+        'Contrib Day': repr(float(days.pop())) if contribution and len(days) == 1 and None not in days else None,
+        'Into Series': (targets.pop() or NEW_SERIES) if contribution and len(targets) == 1 else None,
+        'Redemp $': None, 'Redemp Day': None, 'Full?': False, 'From Series': None,
+    })
+
+    tables['multi'] = [row for row in tables.get('multi', []) if row['Month'] != month]
+    if len(redemptions) == 1:
+        r = redemptions[0]
+        activity.update({
+            'Redemp $': repr(r['amount']) if r['amount'] else None,
+            'Redemp Day': repr(float(r['day'])) if r['day'] else None,
+            'Full?': r['full'],
+            'From Series': r['series'],
+        })
+    elif redemptions:
+        activity['From Series'] = MULTIPLE_SERIES
+        tables['multi'] += [{'Month': month, 'Redemp $': repr(r['amount']) if r['amount'] else None,
+                             'Day': repr(float(r['day'])) if r['day'] else None, 'Full?': r['full'],
+                             'From Series': r['series']} for r in redemptions]
+    for r in redemptions:
+        if not r['series']:
+            errors.append(f"{month}: redemption of ${r['amount']:,.2f} has no series")
+    return errors
+
+
+# =============================================================================
+# MONTH-END CLOSE
+# =============================================================================
+def write_outputs(out_dir, result, include_fees):
+    """Share roll summary and NAV per share tables as CSV files in out_dir."""
+    os.makedirs(out_dir, exist_ok=True)
+    output_rows = build_output_rows(result, include_fees=include_fees)
+    with open(os.path.join(out_dir, 'share_roll.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(output_rows[0]))
+        writer.writeheader()
+        writer.writerows(output_rows)
+
+    series_names = []
+    for row in result['nav_tracking']:
+        series_names += [name for name in row if name != 'Month' and name not in series_names]
+    with open(os.path.join(out_dir, 'nav_per_share.csv'), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=['Month'] + series_names)
+        writer.writeheader()
+        writer.writerows(result['nav_tracking'])
+    return output_rows
+
+
+def close_month_from_feed(conn, fund, year, month_num, path, out_dir, nav_dir=None, excel=False):
+    """
+    Ingest one fund-month feed. Returns (status, messages): status is 'closed',
+    'duplicate' (the same file was already ingested), 'pending' (an earlier month
+    isn't closed yet) or 'rejected' (messages say why).
+    """
+    with open(path, 'rb') as f:
+        file_hash = hashlib.sha256(f.read()).hexdigest()
+    closed = fund_store.feed_months(conn, fund, year)
+    if month_num in closed:
+        if closed[month_num] == file_hash:
+            return 'duplicate', [f"{fund} {year}-{month_num:02d} was already ingested from this file"]
+        return 'rejected', [f"{fund} {year}-{month_num:02d} is already closed; correct it in the app"]
+    if closed and month_num != max(closed) + 1:
+        if month_num > max(closed):
+            return 'pending', [f"waiting for {fund} {year}-{max(closed) + 1:02d}"]
+        return 'rejected', [f"{fund} is closed through {year}-{max(closed):02d}"]
+
+    inputs = fund_store.load_inputs(conn, fund, year)
+    previous_digest = None
+    if inputs is not None:
+        previous_calc_inputs, previous_errors = stored_calc_inputs(inputs)
+        if not previous_errors:
+            previous_digest = fund_store.input_hash(previous_calc_inputs)
+    else:
+        prior_inputs = fund_store.load_inputs(conn, fund, year - 1)
+        prior_result = None
+        if prior_inputs is not None:
+            prior_calc_inputs, _ = stored_calc_inputs(prior_inputs)
+            prior_result = fund_store.load_result(conn, fund, year - 1, fund_store.input_hash(prior_calc_inputs))
+        if month_num != 1 or prior_result is None or len(prior_result['monthly_flows']) != 12:
+            return 'rejected', [f"{fund} has no saved inputs for {year}; save the fund-year in the app first"
+                                if month_num != 1 else
+                                f"{fund} {year - 1} has no up-to-date December result to open {year} from"]
+        inputs = next_year_inputs(prior_inputs, prior_result)
+
+    items, errors = read_feed(path, year, month_num)
+    if not errors:
+        errors = apply_feed(inputs, items, month_num)
+    if not errors:
+        calc_inputs, errors = stored_calc_inputs(inputs)
+    if errors:
+        return 'rejected', errors
+    if not calc_inputs['prior_series']:
+        return 'rejected', [f"{fund} {year} has no prior year series with shares"]
+
+    nav_history = None
+    if nav_dir is not None:
+        from nav_history import NavHistory, nav_history_path
+        nav_history = NavHistory(nav_history_path(fund, nav_dir))
+
+    # Advance the stored result by this month when it is current for the inputs
+    # before this feed and covers exactly the months before it
+    monthly_data = calc_inputs['monthly_data']
+    args = (calc_inputs['par_value'], calc_inputs['current_year'], calc_inputs['new_series_fees'])
+    result = fund_store.load_result(conn, fund, year, previous_digest) if previous_digest else None
+    if result is not None and len(result['monthly_flows']) == month_num - 1:
+        advance_share_roll(result, monthly_data[month_num - 1], *args, nav_history=nav_history)
+        mode = 'advanced'
+    else:
+        result = calculate_share_roll(calc_inputs['prior_series'], monthly_data[:month_num], *args,
+                                      nav_history=nav_history)
+        mode = 'recalculated'
+
+    fund_store.save_result(conn, fund, year, inputs, fund_store.input_hash(calc_inputs), result)
+    fund_store.record_feed_month(conn, fund, year, month_num, os.path.basename(path), file_hash)
+
+    settings = inputs['settings']
+    fees_enabled = settings['new_series_mgmt_fee'] > 0 or settings['new_series_incentive_fee'] > 0 or any(
+        s['Management Fee'] > 0 or s['Incentive Fee'] > 0 for s in calc_inputs['prior_series']
+    )
+    output_rows = write_outputs(out_dir, result, fees_enabled)
+    if excel:
+        import pandas as pd
+        from excel_export import build_share_roll_workbook
+        workbook = build_share_roll_workbook(
+            pd.DataFrame(output_rows), calc_inputs['prior_series'], monthly_data[:month_num], result,
+            fees_enabled, year - 1, year, calc_inputs['par_value'], formula_mode='values'
+        )
+        with open(os.path.join(out_dir, f"share_roll_{year}.xlsx"), 'wb') as f:
+            f.write(workbook.getvalue())
+    return 'closed', [f"{fund} {year}-{month_num:02d} closed ({mode})"]
+
+
+# =============================================================================
+# FOLDER PROCESSING
+# =============================================================================
+def pending_feeds(feed_dir):
+    """(fund, year, month, path) of every feed file waiting in feed_dir, in month order per fund."""
+    feeds = []
+    for fund in sorted(os.listdir(feed_dir)):
+        fund_dir = os.path.join(feed_dir, fund)
+        if fund in ('processed', 'rejected', 'output') or not os.path.isdir(fund_dir):
+            continue
+        for name in os.listdir(fund_dir):
+            match = FEED_NAME.fullmatch(name)
+            if match and 1 <= int(match.group(2)) <= 12:
+                feeds.append((fund, int(match.group(1)), int(match.group(2)), os.path.join(fund_dir, name)))
+    return sorted(feeds)
+
+
+def process_folder(conn, feed_dir, out_dir, nav_dir=None, excel=False, log=print):
+    """Ingest every feed waiting in feed_dir; returns {status: count}."""
+    counts = {}
+    for fund, year, month_num, path in pending_feeds(feed_dir):
+        started = time.perf_counter()
+        try:
+            status, messages = close_month_from_feed(conn, fund, year, month_num, path,
+                                                     os.path.join(out_dir, fund, str(year)), nav_dir, excel)
+        except Exception as e:
+            # Any failure rejects just this feed; the watch loop keeps polling
+            status, messages = 'rejected', [f"{type(e).__name__}: {e}"]
+        counts[status] = counts.get(status, 0) + 1
+        if status == 'pending':
+            continue
+
+        target_dir = os.path.join(feed_dir, 'rejected' if status == 'rejected' else 'processed', fund)
+        os.makedirs(target_dir, exist_ok=True)
+        target = os.path.join(target_dir, os.path.basename(path))
+        shutil.move(path, target)
+        if status == 'rejected':
+            with open(target + '.errors.txt', 'w', encoding='utf-8') as f:
+                f.writelines(f"{message}\n" for message in messages)
+        for message in messages:
+            log(f"[{status}] {message} ({(time.perf_counter() - started) * 1000:.0f} ms)"
+                if status == 'closed' else f"[{status}] {fund} {os.path.basename(path)}: {message}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('feed_dir', help="Folder holding one sub-folder of YYYY-MM.csv feeds per fund")
+    parser.add_argument('--db', default=fund_store.DEFAULT_DB_PATH)
+    parser.add_argument('--output', help="Output folder (default: <feed dir>/output)")
+    parser.add_argument('--nav-dir', help="NAV history folder (default: next to the fund store)")
+    parser.add_argument('--excel', action='store_true', help="Also write a values-only workbook per fund-year")
+    parser.add_argument('--watch', type=float, metavar='SECONDS', help="Keep polling the folder at this interval")
+    args = parser.parse_args(argv)
+
+    if args.nav_dir is None:
+        from nav_history import DEFAULT_NAV_DIR
+        args.nav_dir = DEFAULT_NAV_DIR
+    conn = fund_store.connect(args.db)
+    out_dir = args.output or os.path.join(args.feed_dir, 'output')
+    while True:
+        counts = process_folder(conn, args.feed_dir, out_dir, args.nav_dir, args.excel)
+        if counts:
+            print(', '.join(f"{count} {status}" for status, count in sorted(counts.items())))
+        if not args.watch:
+            return 1 if counts.get('rejected') else 0
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
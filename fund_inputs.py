@@ -0,0 +1,369 @@
+"""
+Fund input tables - Series Accounting
+Typed, columnar storage behind the Step 1 / Step 2 data-editor grids.
+
+Each table keeps the rows the editor was opened with (parsed once) plus a cache
+of parsed edited cells. Applying an editor delta only parses cells whose raw
+text changed since the last delta; everything else is reused, so reruns just
+reassemble the typed columns.
+"""
+
+import calendar
+import math
+
+from engine import MONTHS
+
+PRIOR_COLUMNS = ['Series', 'Ending Shares', 'NAV per Share', 'Mgmt Fee %', 'Incentive %', 'High-Water Mark']
+ACTIVITY_COLUMNS = ['Month', 'P/L', 'Contrib', 'Contrib Day', 'Into Series', 'Redemp $', 'Redemp Day',
+                    'Full?', 'From Series']
+MULTI_COLUMNS = ['Month', 'Redemp $', 'Day', 'Full?', 'From Series']
+
+NUMERIC_COLUMNS = {'Ending Shares', 'NAV per Share', 'Mgmt Fee %', 'Incentive %', 'High-Water Mark',
+                   'P/L', 'Contrib', 'Contrib Day', 'Redemp $', 'Redemp Day', 'Day'}
+BOOL_COLUMNS = {'Full?'}
+SELECT_COLUMNS = {'Month', 'Into Series', 'From Series'}
+
+NEW_SERIES = 'New Series'
+MULTIPLE_SERIES = 'Multiple Series'
+
+
+def parse_float(val, default=0.0):
+    """A grid or feed cell as a float ($ and thousands separators allowed), or default if blank or invalid."""
+    if val is None or str(val).strip() == '':
+        return default
+    try:
+        cleaned = str(val).replace(',', '').replace('$', '').strip()
+        return float(cleaned)
+    except (TypeError, ValueError):
+        return default
+
+
+def parse_cell(column, raw):
+    """Typed value and error message (None if valid) for one grid cell."""
+    if column in BOOL_COLUMNS:
+        return bool(raw), None
+    if column in NUMERIC_COLUMNS:
+        if raw is None or str(raw).strip() == '':
+            return None, None
+        value = parse_float(raw, None)
+        if value is None:
+            return None, f"'{raw}' is not a number"
+        if not math.isfinite(value):
+            return None, f"'{raw}' is not a finite number"
+        return value, None
+    if column in SELECT_COLUMNS:
+        return (raw or None), None
+    return ('' if raw is None else str(raw).strip()), None
+
+
+# =============================================================================
+# EDITOR TABLE STATE
+# =============================================================================
+def new_table(columns, rows):
+    """Table state for a grid opened with `rows` (list of {column: raw value})."""
+    base = {col: [row.get(col) for row in rows] for col in columns}
+    base_typed = {col: [] for col in columns}
+    base_errors = {}
+    for col in columns:
+        for i, raw in enumerate(base[col]):
+            value, error = parse_cell(col, raw)
+            base_typed[col].append(value)
+            if error:
+                base_errors[(i, col)] = error
+    table = {
+        'columns': columns,
+        'base': base,
+        'base_typed': base_typed,
+        'base_errors': base_errors,
+        'cache': {},
+        'typed': None,
+        'errors': [],
+    }
+    apply_delta(table, {})
+    return table
+
+
+def apply_delta(table, delta):
+    """
+    Rebuild the typed columns from the editor delta.
+
+    delta is the data editor's session value: {'edited_rows': {row: {col: raw}},
+    'added_rows': [{col: raw}], 'deleted_rows': [row]}, with row indices into the
+    rows the table was opened with.
+    """
+    columns = table['columns']
+    base_typed = table['base_typed']
+    base_errors = table['base_errors']
+    cache = table['cache']
+    new_cache = {}
+
+    def cell(key, col, raw):
+        hit = cache.get((key, col))
+        if hit is not None and hit[0] == raw:
+            new_cache[(key, col)] = hit
+            return hit[1], hit[2]
+        value, error = parse_cell(col, raw)
+        new_cache[(key, col)] = (raw, value, error)
+        return value, error
+
+    edited_rows = delta.get('edited_rows', {})
+    deleted = {int(i) for i in delta.get('deleted_rows', [])}
+    typed = {col: [] for col in columns}
+    errors = []
+    n_base = len(base_typed[columns[0]]) if columns else 0
+
+    for i in range(n_base):
+        if i in deleted:
+            continue
+        edits = edited_rows.get(i) or edited_rows.get(str(i)) or {}
+        row_num = len(typed[columns[0]]) + 1
+        for col in columns:
+            if col in edits:
+                value, error = cell(i, col, edits[col])
+            else:
+                value, error = base_typed[col][i], base_errors.get((i, col))
+            typed[col].append(value)
+            if error:
+                errors.append(f"Row {row_num}, {col}: {error}")
+
+    for j, added in enumerate(delta.get('added_rows', [])):
+        row_num = len(typed[columns[0]]) + 1
+        for col in columns:
+            value, error = cell(('added', j), col, added.get(col))
+            typed[col].append(value)
+            if error:
+                errors.append(f"Row {row_num}, {col}: {error}")
+
+    table['cache'] = new_cache
+    table['typed'] = typed
+    table['errors'] = errors
+    return table
+
+
+def table_rows(table):
+    """Current rows of a table as raw cell values, for storing or re-opening an editor."""
+    typed = table['typed']
+    columns = table['columns']
+    rows = []
+    for i in range(len(typed[columns[0]])):
+        row = {}
+        for col in columns:
+            value = typed[col][i]
+            row[col] = repr(value) if col in NUMERIC_COLUMNS and value is not None else value
+        rows.append(row)
+    return rows
+
+
+# =============================================================================
+# DEFAULT TABLES
+# =============================================================================
+def default_prior_table():
+    return new_table(PRIOR_COLUMNS, [{'Series': 'Initial Series'}])
+
+
+def default_activity_table():
+    return new_table(ACTIVITY_COLUMNS, [{'Month': month, 'Full?': False} for month in MONTHS])
+
+
+def default_multi_table():
+    return new_table(MULTI_COLUMNS, [])
+
+
+TABLE_COLUMNS = {'prior': PRIOR_COLUMNS, 'activity': ACTIVITY_COLUMNS, 'multi': MULTI_COLUMNS}
+
+
+def default_tables():
+    return {'prior': default_prior_table(), 'activity': default_activity_table(), 'multi': default_multi_table()}
+
+
+def tables_from_rows(rows_by_table):
+    """Tables re-opened on stored rows (see table_rows)."""
+    return {name: new_table(columns, rows_by_table.get(name, [])) for name, columns in TABLE_COLUMNS.items()}
+
+
+# =============================================================================
+# RECORDS FOR THE ENGINE
+# =============================================================================
+def new_series_name(month_num, current_year):
+    return f"Series {month_num}/{current_year}"
+
+
+def prior_series_records(prior_table, default_mgmt_fee, default_incentive_fee):
+    """Step 1 rows as prior series dicts (fee rates as fractions, HWM defaulting to NAV)."""
+    typed = prior_table['typed']
+    records = []
+    for i, name in enumerate(typed['Series']):
+        shares = typed['Ending Shares'][i] or 0.0
+        nav = typed['NAV per Share'][i] or 0.0
+        mgmt_fee = typed['Mgmt Fee %'][i]
+        incentive_fee = typed['Incentive %'][i]
+        hwm = typed['High-Water Mark'][i]
+        records.append({
+            'Series': name,
+            'Ending Shares': shares,
+            'NAV per Share': nav,
+            'Total NAV': shares * nav,
+            'is_initial': i == 0,
+            'Management Fee': (default_mgmt_fee if mgmt_fee is None else mgmt_fee) / 100,
+            'Incentive Fee': (default_incentive_fee if incentive_fee is None else incentive_fee) / 100,
+            'High-Water Mark': nav if hwm is None else hwm
+        })
+    return records
+
+
+def series_options(prior_records, current_year):
+    """Every series name a Step 2 selectbox may offer for the year."""
+    names = [s['Series'] for s in prior_records if s['Series']]
+    return names + [new_series_name(m, current_year) for m in range(1, 13)]
+
+
+def get_available_series_up_to_month(month_idx, prior_series, monthly_data, current_year):
+    available = [s['Series'] for s in prior_series if s['Ending Shares'] > 0]
+    for i in range(month_idx):
+        contrib = monthly_data[i]['contributions']
+        if contrib > 0 and not monthly_data[i]['contribution_series']:
+            month_num = i + 1
+            available.append(new_series_name(month_num, current_year))
+    return available
+
+
+def day_of_month(value, month_num, current_year, label, errors):
+    """A flow's day (None if blank), recording an error unless it is a day of that month."""
+    if value is None:
+        return None
+    days = calendar.monthrange(current_year, month_num)[1]
+    if not math.isfinite(value) or value != int(value) or not 1 <= value <= days:
+        errors.append(f"{MONTHS[month_num - 1]}: {label} must be a day from 1 to {days}")
+        return None
+    return int(value)
+
+
+def monthly_records(activity_table, multi_table, prior_records, current_year, pricing, allocation='month_end'):
+    """
+    Step 2 rows as the engine's month dicts, plus validation messages.
+
+    Series picked in a month must exist by then: a prior series with shares or a
+    series created by an earlier month's new-series contribution. Multiple Series
+    rows are only used for months whose From Series is Multiple Series. Flow days are
+    only used when P/L is allocated on daily capital (allocation 'daily_capital').
+    """
+    activity = activity_table['typed']
+    multi = multi_table['typed']
+    errors = list(activity_table['errors']) + list(multi_table['errors'])
+
+    multi_by_month = {}
+    for j, month in enumerate(multi['Month']):
+        amount = multi['Redemp $'][j] or 0.0
+        full = multi['Full?'][j]
+        if month and (amount > 0 or full):
+            multi_by_month.setdefault(month, []).append({
+                'amount': amount,
+                'series': multi['From Series'][j],
+                'full': full,
+                'day': day_of_month(multi['Day'][j], MONTHS.index(month) + 1, current_year,
+                                    'redemption day', errors)
+            })
+
+    monthly_data = []
+    for i, month in enumerate(MONTHS):
+        available = get_available_series_up_to_month(i, prior_records, monthly_data, current_year)
+        contrib = activity['Contrib'][i] or 0.0
+        redemp = activity['Redemp $'][i] or 0.0
+        full_redemption = activity['Full?'][i]
+
+        contribution_series = activity['Into Series'][i]
+        if contribution_series == NEW_SERIES:
+            contribution_series = None
+        if contrib > 0 and contribution_series and contribution_series not in available:
+            errors.append(f"{month}: contribution target '{contribution_series}' does not exist yet")
+
+        selected_series = activity['From Series'][i]
+        multi_redemptions = []
+        if selected_series == MULTIPLE_SERIES:
+            multi_redemptions = multi_by_month.get(month, [])
+            for mr in multi_redemptions:
+                if mr['series'] not in available:
+                    errors.append(f"{month}: redemption series '{mr['series']}' does not exist yet")
+        elif redemp > 0 or full_redemption:
+            if not selected_series:
+                errors.append(f"{month}: select the series to redeem from")
+            elif selected_series not in available:
+                errors.append(f"{month}: redemption series '{selected_series}' does not exist yet")
+        else:
+            selected_series = None
+
+        monthly_data.append({
+            'month': month,
+            'month_num': i + 1,
+            'pl': activity['P/L'][i] or 0.0,
+            'contributions': contrib,
+            'contribution_series': contribution_series,
+            'contribution_pricing': pricing,
+            'contribution_day': day_of_month(activity['Contrib Day'][i], i + 1, current_year,
+                                             'contribution day', errors),
+            'redemptions': redemp,
+            'redemption_series': selected_series,
+            'redemption_day': day_of_month(activity['Redemp Day'][i], i + 1, current_year,
+                                           'redemption day', errors),
+            'full_redemption': full_redemption,
+            'multi_redemptions': multi_redemptions,
+            'pl_allocation': allocation
+        })
+    for month in multi_by_month:
+        if activity['From Series'][MONTHS.index(month)] != MULTIPLE_SERIES:
+            errors.append(f"{month}: Multiple Series redemptions are entered but From Series "
+                          f"is not '{MULTIPLE_SERIES}'")
+    return monthly_data, errors
+
+
+def stored_calc_inputs(inputs):
+    """
+    Engine arguments for a stored fund-year (see fund_store.save_inputs), plus
+    validation messages. The dict matches what the app hashes into calc_digest.
+    """
+    settings = inputs['settings']
+    tables = tables_from_rows(inputs['tables'])
+    prior_records = prior_series_records(
+        tables['prior'], settings['new_series_mgmt_fee'], settings['new_series_incentive_fee']
+    )
+    current_year = settings['prior_year'] + 1
+    monthly_data, errors = monthly_records(
+        tables['activity'], tables['multi'], prior_records, current_year, settings['existing_series_pricing'],
+        settings.get('pl_allocation', 'month_end')
+    )
+    calc_inputs = {
+        'prior_series': [s for s in prior_records if s['Series'] and s['Ending Shares'] > 0],
+        'monthly_data': monthly_data,
+        'par_value': settings['par_value'],
+        'current_year': current_year,
+        'new_series_fees': {
+            'management_fee': settings['new_series_mgmt_fee'] / 100,
+            'incentive_fee': settings['new_series_incentive_fee'] / 100,
+        },
+    }
+    return calc_inputs, list(tables['prior']['errors']) + errors
+
+
+def next_year_inputs(inputs, result):
+    """
+    Stored inputs for the year after a closed one (result covering all 12 months):
+    its year-end series become the prior series, initial series first, with their
+    fee rates and ending high-water marks carried over.
+    """
+    series_data = result['series_data']
+    names = [name for name, s in series_data.items() if s['shares'] > 0]
+    initial = result['initial_series_name']
+    if initial in names:
+        names.remove(initial)
+        names.insert(0, initial)
+    prior = [{
+        'Series': name,
+        'Ending Shares': repr(series_data[name]['shares']),
+        'NAV per Share': repr(series_data[name]['nav_per_share']),
+        'Mgmt Fee %': repr(round(series_data[name]['management_fee_rate'] * 100, 10)),
+        'Incentive %': repr(round(series_data[name]['incentive_fee_rate'] * 100, 10)),
+        'High-Water Mark': repr(series_data[name]['high_water_mark']),
+    } for name in names]
+    settings = dict(inputs['settings'], prior_year=inputs['settings']['prior_year'] + 1)
+    activity = [{'Month': month, 'Full?': False} for month in MONTHS]
+    return {'tables': {'prior': prior, 'activity': activity, 'multi': []}, 'settings': settings}
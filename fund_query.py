@@ -0,0 +1,229 @@
+"""
+Fund query - Series Accounting
+Firm-wide queries over the share roll results saved in the fund store.
+
+Reads the query tables fund_store fills whenever a result is saved:
+
+    series       year-end share roll and NAV, per fund, year and series
+    navs         NAV per share and shares, per fund, year, period and series
+                 (period 0 = beginning of year, 1-12 = month ends)
+    flows        P/L allocated, contributions, redemptions and fees, per fund,
+                 year and month
+    redemptions  every redemption paid, per fund, year, month and series
+
+Predicates and projections are pushed down into SQL: the WHERE clause uses the
+tables' (fund, year, period, series) keys and indexes, so a query visits only
+the matching rows however many fund-years are stored, and only the requested
+columns are returned. The tables are ordinary SQLite row tables, not columnar
+storage, so each matching row is still read whole from disk.
+
+Usage:
+    python fund_query.py flows --by year --by period --agg sum:contributions --where year=2024
+    python fund_query.py flows --by fund --agg sum:redemptions --order=-sum_redemptions --limit 10
+    python fund_query.py series --where year=2024 --where "ending_shares>0" --where "ending_nav_per_share>@par_value"
+    python fund_query.py redemptions --where "fund=Fund A,Fund B" --columns fund,year,period,series,amount
+"""
+
+import argparse
+import csv
+import re
+import sys
+
+import fund_store
+
+TABLES = {
+    'series': ('series_results', ['fund', 'year', 'series', 'par_value', 'beginning_shares', 'transfers_in',
+                                  'transfers_out', 'contributed_shares', 'redeemed_shares', 'ending_shares',
+                                  'ending_nav_per_share', 'ending_nav', 'management_fees', 'incentive_fees']),
+    'navs': ('monthly_navs', ['fund', 'year', 'period', 'series', 'nav_per_share', 'shares']),
+    'flows': ('monthly_flows', ['fund', 'year', 'period', 'pl_allocated', 'contributions', 'redemptions', 'fees']),
+    'redemptions': ('redemption_events', ['fund', 'year', 'period', 'seq', 'series', 'amount', 'shares', 'full']),
+}
+
+OPERATORS = {'=', '!=', '<', '<=', '>', '>=', 'in'}
+AGGREGATES = {'sum', 'count', 'min', 'max', 'avg'}
+
+
+class Column:
+    """Another column of the queried table, as the value of a where predicate."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f"Column({self.name!r})"
+
+
+# =============================================================================
+# QUERIES
+# =============================================================================
+def query(conn, table, columns=None, where=None, group_by=None, aggregates=None, order_by=None, limit=None):
+    """
+    Rows of a query table as dicts.
+
+    where: (column, op, value) predicates, all of which must hold. op is one of
+        OPERATORS; 'in' takes a list of values, and a Column('name') value
+        compares against another column of the table.
+    group_by / aggregates: group on these columns and return
+        {alias: (function, column)} aggregates (functions in AGGREGATES) beside them.
+    columns: columns to return when not grouping (default: all).
+    Raises ValueError for unknown tables, columns, operators or functions.
+    """
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {', '.join(TABLES)}")
+    table_name, table_columns = TABLES[table]
+
+    def column(name):
+        if name not in table_columns:
+            raise ValueError(f"Unknown column {name!r} for {table}")
+        return name
+
+    params = []
+    clauses = []
+    for name, op, value in where or []:
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown operator {op!r}")
+        if op == 'in':
+            values = list(value)
+            clauses.append(f"{column(name)} IN ({', '.join('?' * len(values))})" if values else "0")
+            params += values
+        elif isinstance(value, Column):
+            clauses.append(f"{column(name)} {op} {column(value.name)}")
+        else:
+            clauses.append(f"{column(name)} {op} ?")
+            params.append(value)
+
+    if group_by or aggregates:
+        selected = [column(name) for name in group_by or []]
+        for alias, (function, name) in (aggregates or {}).items():
+            if function not in AGGREGATES:
+                raise ValueError(f"Unknown aggregate {function!r}")
+            if not re.fullmatch(r'\w+', alias):
+                raise ValueError(f"Invalid alias {alias!r}")
+            if name == '*' and function != 'count':
+                raise ValueError(f"{function} needs a column; only count takes '*'")
+            selected.append(f"{function.upper()}({'*' if name == '*' else column(name)}) AS {alias}")
+    else:
+        selected = [column(name) for name in columns or table_columns]
+
+    sql = f"SELECT {', '.join(selected)} FROM {table_name}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if group_by:
+        sql += " GROUP BY " + ", ".join(group_by)
+    if order_by:
+        order = []
+        for name in order_by:
+            key = name.lstrip('-')
+            if key not in (aggregates or {}):
+                column(key)
+            order.append(f"{key} {'DESC' if name.startswith('-') else 'ASC'}")
+        sql += " ORDER BY " + ", ".join(order)
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+
+    cursor = conn.execute(sql, params)
+    names = [d[0] for d in cursor.description]
+    return [dict(zip(names, row)) for row in cursor]
+
+
+def contributions_by_month(conn, years=None, funds=None):
+    """Total contributions per year and month across funds (optionally only some years or funds)."""
+    where = []
+    if years:
+        where.append(('year', 'in', years))
+    if funds:
+        where.append(('fund', 'in', funds))
+    return query(conn, 'flows', where=where, group_by=['year', 'period'],
+                 aggregates={'contributions': ('sum', 'contributions'), 'funds': ('count', '*')},
+                 order_by=['year', 'period'])
+
+
+def series_above_par(conn, year, funds=None):
+    """Every series still holding shares at year end with a NAV per share above its fund's par value."""
+    where = [('year', '=', year), ('ending_shares', '>', 0), ('ending_nav_per_share', '>', Column('par_value'))]
+    if funds:
+        where.append(('fund', 'in', funds))
+    return query(conn, 'series', columns=['fund', 'year', 'series', 'par_value', 'ending_shares',
+                                          'ending_nav_per_share', 'ending_nav'],
+                 where=where, order_by=['fund', 'series'])
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+def parse_value(text):
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def parse_predicate(text):
+    """
+    'column<op>value' as a where predicate; '=' with a comma-separated value means
+    'in', and a value of '@column' compares against that column.
+    """
+    match = re.fullmatch(r'\s*(\w+)\s*(<=|>=|!=|=|<|>)\s*(.*?)\s*', text)
+    if not match:
+        raise ValueError(f"Can't parse predicate {text!r}; expected e.g. year=2024 or amount>1000")
+    name, op, value = match.groups()
+    if value.startswith('@'):
+        return name, op, Column(value[1:])
+    if op == '=' and ',' in value:
+        return name, 'in', [parse_value(v.strip()) for v in value.split(',')]
+    return name, op, parse_value(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('table', choices=list(TABLES))
+    parser.add_argument('--db', default=fund_store.DEFAULT_DB_PATH)
+    parser.add_argument('--columns', help="Comma-separated columns to return (default: all)")
+    parser.add_argument('--where', action='append', default=[],
+                        help="Predicate such as year=2024, or amount>@column to compare columns (repeatable)")
+    parser.add_argument('--by', action='append', dest='group_by', help="Group on this column (repeatable)")
+    parser.add_argument('--agg', action='append', default=[],
+                        help="Aggregate as function:column, e.g. sum:contributions; count alone counts rows (repeatable)")
+    parser.add_argument('--order', action='append', dest='order_by', help="Sort column; prefix '-' for descending (--order=-column)")
+    parser.add_argument('--limit', type=int)
+    parser.add_argument('--csv', help="Write the rows to this CSV file instead of printing them")
+    args = parser.parse_args(argv)
+
+    aggregates = {}
+    for spec in args.agg:
+        function, _, name = spec.partition(':')
+        name = name or '*'
+        aggregates[f"{function}_{name}" if name != '*' else function] = (function, name)
+
+    try:
+        rows = query(
+            fund_store.connect(args.db), args.table,
+            columns=args.columns.split(',') if args.columns else None,
+            where=[parse_predicate(text) for text in args.where],
+            group_by=args.group_by, aggregates=aggregates, order_by=args.order_by, limit=args.limit,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if rows:
+                writer.writerow(rows[0])
+            writer.writerows(row.values() for row in rows)
+    else:
+        if rows:
+            print('\t'.join(rows[0]))
+        for row in rows:
+            print('\t'.join('' if value is None else str(value) for value in row.values()))
+    print(f"{len(rows)} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
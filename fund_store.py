@@ -0,0 +1,304 @@
+"""
+Fund store - Series Accounting
+Local SQLite store of fund definitions, per-year inputs and calculated results.
+
+Each fund-year row keeps the editable inputs (grid tables and sidebar settings)
+and the last share roll calculated from them. Results are stamped with a content
+hash of the calculation inputs, so a result is only reloaded while the inputs it
+was calculated from are unchanged.
+
+Saved results are also unpacked into indexed query tables (per series year-end
+rows, monthly NAV snapshots, monthly flows and redemption events) keyed by fund,
+year, period and series, which fund_query reads across funds. A fund-year's rows
+are dropped as soon as its inputs change, until a result is saved for them.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from engine import MONTHS
+
+# Bump when the engine's output changes for the same inputs, invalidating stored results
+ENGINE_VERSION = 6
+
+# Bump when the query tables change; connect() rebuilds them from the stored results
+QUERY_TABLES_VERSION = 2
+
+DEFAULT_DB_PATH = os.environ.get(
+    'SHARE_ROLL_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'share_roll.db')
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS funds (
+    fund TEXT PRIMARY KEY,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fund_years (
+    fund TEXT NOT NULL REFERENCES funds(fund),
+    year INTEGER NOT NULL,
+    inputs TEXT NOT NULL,
+    input_hash TEXT NOT NULL,
+    result TEXT,
+    result_hash TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (fund, year)
+);
+
+-- Query tables, rebuilt from fund_years.result (period 0 = beginning of year, 1-12 = month ends)
+CREATE TABLE IF NOT EXISTS series_results (
+    fund TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    series TEXT NOT NULL,
+    par_value REAL,
+    beginning_shares REAL,
+    transfers_in REAL,
+    transfers_out REAL,
+    contributed_shares REAL,
+    redeemed_shares REAL,
+    ending_shares REAL,
+    ending_nav_per_share REAL,
+    ending_nav REAL,
+    management_fees REAL,
+    incentive_fees REAL,
+    PRIMARY KEY (fund, year, series)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS series_results_year ON series_results (year, series);
+
+CREATE TABLE IF NOT EXISTS monthly_navs (
+    fund TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    series TEXT NOT NULL,
+    nav_per_share REAL,
+    shares REAL,
+    PRIMARY KEY (fund, year, period, series)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS monthly_navs_period ON monthly_navs (year, period, series);
+
+CREATE TABLE IF NOT EXISTS monthly_flows (
+    fund TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    pl_allocated REAL,
+    contributions REAL,
+    redemptions REAL,
+    fees REAL,
+    PRIMARY KEY (fund, year, period)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS monthly_flows_period ON monthly_flows (year, period);
+
+CREATE TABLE IF NOT EXISTS redemption_events (
+    fund TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    series TEXT NOT NULL,
+    amount REAL,
+    shares REAL,
+    full INTEGER,
+    PRIMARY KEY (fund, year, period, seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS redemption_events_series ON redemption_events (series, year, period);
+
+-- Administrator feed months closed by feed_ingest
+CREATE TABLE IF NOT EXISTS feed_months (
+    fund TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    file_name TEXT NOT NULL,
+    file_hash TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    PRIMARY KEY (fund, year, month)
+);
+"""
+
+QUERY_TABLES = ['series_results', 'monthly_navs', 'monthly_flows', 'redemption_events']
+
+
+def connect(path=DEFAULT_DB_PATH):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.executescript(SCHEMA)
+    if conn.execute("PRAGMA user_version").fetchone()[0] != QUERY_TABLES_VERSION:
+        rebuild_query_tables(conn)
+    return conn
+
+
+def input_hash(calc_inputs):
+    """Content hash of everything the engine reads (plus the engine version)."""
+    payload = json.dumps({'engine': ENGINE_VERSION, 'inputs': calc_inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def result_to_json(result):
+    stored = dict(result)
+    stored['all_series_ever'] = sorted(result['all_series_ever'])
+    return json.dumps(stored)
+
+
+def result_from_json(text):
+    result = json.loads(text)
+    result['all_series_ever'] = set(result['all_series_ever'])
+    return result
+
+
+# =============================================================================
+# READ / WRITE
+# =============================================================================
+def save_inputs(conn, fund, year, inputs, digest):
+    """
+    Insert or update a fund-year's inputs. Its stored result is only reloaded while
+    the hash matches; while it doesn't, the result's query table rows are dropped
+    so fund_query never reports figures from superseded inputs (and restored if
+    the inputs change back).
+    """
+    with conn:
+        _save_inputs(conn, fund, year, inputs, digest)
+
+
+def _save_inputs(conn, fund, year, inputs, digest):
+    """save_inputs inside the caller's transaction."""
+    now = time.time()
+    row = conn.execute(
+        "SELECT result_hash, input_hash FROM fund_years WHERE fund = ? AND year = ?", (fund, year)
+    ).fetchone()
+    if row and row[0] != digest:
+        for table in QUERY_TABLES:
+            conn.execute(f"DELETE FROM {table} WHERE fund = ? AND year = ?", (fund, year))
+    elif row and row[1] != digest:
+        result = load_result(conn, fund, year, digest)
+        index_result(conn, fund, year, result, inputs.get('settings', {}).get('par_value'))
+    conn.execute("INSERT OR IGNORE INTO funds (fund, created_at) VALUES (?, ?)", (fund, now))
+    conn.execute(
+        """
+        INSERT INTO fund_years (fund, year, inputs, input_hash, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (fund, year) DO UPDATE SET
+            inputs = excluded.inputs,
+            input_hash = excluded.input_hash,
+            updated_at = excluded.updated_at
+        """,
+        (fund, year, json.dumps(inputs), digest, now)
+    )
+
+
+def save_result(conn, fund, year, inputs, digest, result):
+    """
+    Store a calculated share roll alongside the inputs it was calculated from, in
+    one transaction (a failure leaves the previous inputs, result and query rows).
+    """
+    with conn:
+        _save_inputs(conn, fund, year, inputs, digest)
+        conn.execute(
+            "UPDATE fund_years SET result = ?, result_hash = ? WHERE fund = ? AND year = ?",
+            (result_to_json(result), digest, fund, year)
+        )
+        index_result(conn, fund, year, result, inputs.get('settings', {}).get('par_value'))
+
+
+def load_inputs(conn, fund, year):
+    row = conn.execute(
+        "SELECT inputs FROM fund_years WHERE fund = ? AND year = ?", (fund, year)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def load_result(conn, fund, year, digest=None):
+    """
+    Stored share roll for the fund-year, or None if missing or (when digest is
+    given) calculated from other inputs.
+    """
+    if digest is None:
+        row = conn.execute(
+            "SELECT result FROM fund_years WHERE fund = ? AND year = ?", (fund, year)
+        ).fetchone()
+    else:
+        row = conn.execute(
+            "SELECT result FROM fund_years WHERE fund = ? AND year = ? AND result_hash = ?",
+            (fund, year, digest)
+        ).fetchone()
+    return result_from_json(row[0]) if row and row[0] else None
+
+
+def record_feed_month(conn, fund, year, month, file_name, file_hash):
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO feed_months VALUES (?, ?, ?, ?, ?, ?)",
+            (fund, year, month, file_name, file_hash, time.time())
+        )
+
+
+def feed_months(conn, fund, year):
+    """{month number: file hash} of the fund-year's ingested administrator feeds."""
+    return dict(conn.execute(
+        "SELECT month, file_hash FROM feed_months WHERE fund = ? AND year = ?", (fund, year)
+    ))
+
+
+def list_fund_years(conn):
+    """{fund: [years]} for every stored fund, newest year first."""
+    funds = {}
+    for fund, year in conn.execute("SELECT fund, year FROM fund_years ORDER BY fund, year DESC"):
+        funds.setdefault(fund, []).append(year)
+    return funds
+
+
+# =============================================================================
+# QUERY TABLES
+# =============================================================================
+def period_number(label):
+    """Period of a NAV tracking label: 0 for 'Beginning of Year', 1-12 for 'End of <month>'."""
+    return 0 if label == 'Beginning of Year' else MONTHS.index(label[len('End of '):]) + 1
+
+
+def index_result(conn, fund, year, result, par_value=None):
+    """Replace the fund-year's query table rows with those of `result` (inside the caller's transaction)."""
+    for table in QUERY_TABLES:
+        conn.execute(f"DELETE FROM {table} WHERE fund = ? AND year = ?", (fund, year))
+
+    conn.executemany(
+        "INSERT INTO series_results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        ((fund, year, name, par_value, s['beginning_shares'], s['transfers_in'], s['transfers_out'],
+          s['contributed_shares'], s['redeemed_shares'], s['shares'],
+          s['nav_per_share'] if s['shares'] > 0 else 0.0, s['total_nav'] if s['shares'] > 0 else 0.0,
+          s['management_fees'], s['incentive_fees'])
+         for name, s in result['series_data'].items())
+    )
+
+    share_tracking = result.get('share_tracking') or [{}] * len(result['nav_tracking'])
+    conn.executemany(
+        "INSERT INTO monthly_navs VALUES (?, ?, ?, ?, ?, ?)",
+        ((fund, year, period_number(nav_row['Month']), name, nav, shares_row.get(name))
+         for nav_row, shares_row in zip(result['nav_tracking'], share_tracking)
+         for name, nav in nav_row.items() if name != 'Month')
+    )
+
+    conn.executemany(
+        "INSERT INTO monthly_flows VALUES (?, ?, ?, ?, ?, ?, ?)",
+        ((fund, year, MONTHS.index(flow['month']) + 1, flow['pl_allocated'], flow['contributions'],
+          flow['redemptions'], flow['fees'])
+         for flow in result['monthly_flows'])
+    )
+
+    conn.executemany(
+        "INSERT INTO redemption_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        ((fund, year, MONTHS.index(event['month']) + 1, seq, event['series'], event['amount'],
+          event['shares'], int(event['full']))
+         for seq, event in enumerate(result.get('redemption_events', [])))
+    )
+
+
+def rebuild_query_tables(conn):
+    """Re-index every stored result that is current for its inputs (e.g. after QUERY_TABLES_VERSION changes)."""
+    with conn:
+        for table in QUERY_TABLES:
+            conn.execute(f"DELETE FROM {table}")
+        for fund, year, inputs, result in conn.execute(
+                "SELECT fund, year, inputs, result FROM fund_years "
+                "WHERE result IS NOT NULL AND result_hash = input_hash").fetchall():
+            par_value = json.loads(inputs).get('settings', {}).get('par_value')
+            index_result(conn, fund, year, result_from_json(result), par_value)
+        conn.execute(f"PRAGMA user_version = {QUERY_TABLES_VERSION}")
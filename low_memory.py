@@ -0,0 +1,168 @@
+"""
+Low-memory share roll - Series Accounting
+Runs very large funds with the calc log and tracking tables spilled to disk.
+
+calculate_share_roll normally keeps the whole calc log and a NAV per share and a
+shares row per period in the result, and the app then builds DataFrames and a
+workbook over them. With a SpillFolder, each of those is written to a JSON-lines
+file as it is produced and only its latest row is held; month-end NAVs go to
+the fund's NavHistory, and the share roll table is written from
+iter_output_rows one row at a time. Peak memory then follows the number of
+live series rather than the number of periods and log entries.
+
+Each fund-year is written to <out>/<fund>/<year>/: share_roll.csv, calc_log.csv
+and the spilled calc_log / nav_tracking / share_tracking .jsonl files. Results
+run this way are not saved to the fund store (see memory_benchmark.py for how
+peak RSS compares with the standard run).
+
+Usage:
+    python low_memory.py "Fund A" --out large_funds/
+    python low_memory.py "Fund A" --year 2024 --out large_funds/ --nav-dir nav_history/
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+import fund_store
+from engine import calculate_share_roll, iter_output_rows
+from fund_inputs import stored_calc_inputs
+
+CALC_LOG_COLUMNS = ['Step', 'Month', 'Series', 'Description', 'Details']
+
+
+# =============================================================================
+# SPILLED ROWS
+# =============================================================================
+class SpillRows:
+    """Append-only rows in a JSON-lines file; only the last row stays in memory."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'w', encoding='utf-8')
+        self._count = 0
+        self._last = None
+
+    def append(self, row):
+        self._file.write(json.dumps(row) + '\n')
+        self._count += 1
+        self._last = row
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if self._count and index in (-1, self._count - 1):
+            return self._last
+        raise IndexError("spilled rows are read back by iterating over them")
+
+    def __iter__(self):
+        if not self._file.closed:
+            self._file.flush()
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def close(self):
+        self._file.close()
+
+
+class SpillFolder:
+    """SpillRows files in one folder, created by name (pass .rows as calculate_share_roll's spill)."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.spilled = {}
+
+    def rows(self, name):
+        self.spilled[name] = SpillRows(os.path.join(self.path, f"{name}.jsonl"))
+        return self.spilled[name]
+
+    def close(self):
+        for rows in self.spilled.values():
+            rows.close()
+
+
+# =============================================================================
+# RUN
+# =============================================================================
+def write_csv(path, rows, columns=None):
+    """Stream rows (any iterable of dicts) to a CSV file; columns default to the first row's keys."""
+    rows = iter(rows)
+    first = next(rows, None)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if first is None:
+            if columns:
+                csv.writer(f).writerow(columns)
+            return
+        writer = csv.DictWriter(f, fieldnames=columns or list(first))
+        writer.writeheader()
+        writer.writerow(first)
+        for row in rows:
+            writer.writerow(row)
+
+
+def run_low_memory(calc_inputs, out_dir, include_fees=False, nav_history=None):
+    """
+    Run a share roll (calc_inputs as from stored_calc_inputs) spilled to out_dir
+    and write its share_roll.csv and calc_log.csv there. Returns the result, whose
+    'calc_log', 'nav_tracking' and 'share_tracking' are SpillRows over the files.
+    """
+    folder = SpillFolder(out_dir)
+    try:
+        result = calculate_share_roll(
+            calc_inputs['prior_series'], calc_inputs['monthly_data'], calc_inputs['par_value'],
+            calc_inputs['current_year'], calc_inputs['new_series_fees'], nav_history=nav_history,
+            spill=folder.rows
+        )
+    finally:
+        folder.close()
+    write_csv(os.path.join(out_dir, 'share_roll.csv'), iter_output_rows(result, include_fees))
+    write_csv(os.path.join(out_dir, 'calc_log.csv'), result['calc_log'], CALC_LOG_COLUMNS)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('fund', help="Stored fund to run")
+    parser.add_argument('--year', type=int, action='append', dest='years',
+                        help="Year to run (repeatable; default: every stored year, oldest first)")
+    parser.add_argument('--db', default=fund_store.DEFAULT_DB_PATH)
+    parser.add_argument('--out', required=True, help="Output folder")
+    parser.add_argument('--nav-dir', help="Also append month-end NAVs to the fund's NAV history here")
+    args = parser.parse_args(argv)
+
+    conn = fund_store.connect(args.db)
+    years = args.years or sorted(fund_store.list_fund_years(conn).get(args.fund, []))
+    if not years:
+        parser.error(f"no stored years for {args.fund!r}")
+    nav_history = None
+    if args.nav_dir:
+        from nav_history import NavHistory, nav_history_path
+        nav_history = NavHistory(nav_history_path(args.fund, args.nav_dir))
+
+    failed = 0
+    for year in years:
+        inputs = fund_store.load_inputs(conn, args.fund, year)
+        calc_inputs, errors = stored_calc_inputs(inputs) if inputs else (None, ["no stored inputs"])
+        if not errors and not calc_inputs['prior_series']:
+            errors = ["no prior year series with shares"]
+        if errors:
+            failed += 1
+            print(f"{year}: skipped - {'; '.join(errors)}")
+            continue
+        settings = inputs['settings']
+        include_fees = settings['new_series_mgmt_fee'] > 0 or settings['new_series_incentive_fee'] > 0 or any(
+            s['Management Fee'] > 0 or s['Incentive Fee'] > 0 for s in calc_inputs['prior_series']
+        )
+        out_dir = os.path.join(args.out, args.fund, str(year))
+        result = run_low_memory(calc_inputs, out_dir, include_fees, nav_history)
+        print(f"{year}: {len(result['all_series_ever'])} series, {len(result['calc_log'])} log entries -> {out_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
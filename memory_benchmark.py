@@ -0,0 +1,147 @@
+"""
+Memory benchmark - Series Accounting
+Peak RSS of the standard and low-memory share roll runs against fund size.
+
+Every sample runs in a fresh interpreter on a synthetic fund of N prior series
+(all below par, so none roll up) and M months, each month with P/L, a
+contribution into a new series, management and incentive fees and partial
+redemptions from 1% of the series:
+
+- standard:    calculate_share_roll, then the app's output, calc log and NAV
+               tracking DataFrames (and, with --workbook, the values-only
+               Excel workbook), all held at once
+- low-memory:  low_memory.run_low_memory, spilling the calc log and tracking
+               tables to a temporary folder and streaming share_roll.csv
+
+Both append month-end NAVs to a NavHistory. 'peak' is the process's maximum RSS;
+'run' is the peak less the RSS after imports, i.e. what the run itself added.
+Uses the resource module, so it runs on Linux and macOS.
+
+Usage:
+    python memory_benchmark.py
+    python memory_benchmark.py --series 1000 --series 8000 --months 1 --months 12 --workbook
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from engine import MONTHS
+
+MODES = ['standard', 'low-memory']
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def synthetic_fund(n_series, months):
+    """calc_inputs (as stored_calc_inputs returns them) for a fund of n_series prior series over months months."""
+    prior_series = [{
+        'Series': 'Initial Series' if i == 0 else f'Series {i}',
+        'Ending Shares': 100.0 + i % 50,
+        'NAV per Share': 900.0 + (i % 97),
+        'Total NAV': (100.0 + i % 50) * (900.0 + (i % 97)),
+        'is_initial': i == 0,
+        'Management Fee': 0.01,
+        'Incentive Fee': 0.2,
+        'High-Water Mark': 950.0,
+    } for i in range(n_series)]
+    monthly_data = []
+    for month_num in range(1, months + 1):
+        monthly_data.append({
+            'month': MONTHS[month_num - 1],
+            'month_num': month_num,
+            'pl': 0.004 * sum(s['Total NAV'] for s in prior_series) * (1 if month_num % 3 else -1),
+            'contributions': 1000000.0,
+            'contribution_series': None,
+            'redemptions': 0.0,
+            'redemption_series': None,
+            'full_redemption': False,
+            'multi_redemptions': [{'series': f'Series {i}', 'amount': 1000.0, 'full': False}
+                                  for i in range(month_num, n_series, 100)],
+        })
+    return {
+        'prior_series': prior_series,
+        'monthly_data': monthly_data,
+        'par_value': 1000.0,
+        'current_year': 2024,
+        'new_series_fees': {'management_fee': 0.01, 'incentive_fee': 0.2},
+    }
+
+
+def sample(mode, n_series, months, workbook=False):
+    """Peak RSS (MB) of one run in this process."""
+    from nav_history import NavHistory
+    if mode == 'standard':
+        import pandas as pd
+        from engine import build_output_rows, calculate_share_roll
+        if workbook:
+            from excel_export import build_share_roll_workbook
+    else:
+        from low_memory import run_low_memory
+
+    calc_inputs = synthetic_fund(n_series, months)
+    with tempfile.TemporaryDirectory() as tmp:
+        nav_history = NavHistory(os.path.join(tmp, 'nav_history'))
+        baseline = peak_rss_mb()
+        start = time.perf_counter()
+        if mode == 'standard':
+            result = calculate_share_roll(
+                calc_inputs['prior_series'], calc_inputs['monthly_data'], calc_inputs['par_value'],
+                calc_inputs['current_year'], calc_inputs['new_series_fees'], nav_history=nav_history
+            )
+            output_df = pd.DataFrame(build_output_rows(result, include_fees=True))
+            frames = [output_df, pd.DataFrame(result['calc_log']), pd.DataFrame(result['nav_tracking'])]
+            if workbook:
+                frames.append(build_share_roll_workbook(
+                    output_df, calc_inputs['prior_series'], calc_inputs['monthly_data'], result, True,
+                    calc_inputs['current_year'] - 1, calc_inputs['current_year'], calc_inputs['par_value'],
+                    formula_mode='values'
+                ))
+        else:
+            result = run_low_memory(calc_inputs, os.path.join(tmp, 'out'), True, nav_history)
+        seconds = time.perf_counter() - start
+        log_entries = len(result['calc_log'])
+    peak = peak_rss_mb()
+    return {'peak': peak, 'run': peak - baseline, 'seconds': seconds, 'log_entries': log_entries}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--series', type=int, action='append', help="Prior series (repeatable)")
+    parser.add_argument('--months', type=int, action='append', help="Months run, 1-12 (repeatable)")
+    parser.add_argument('--workbook', action='store_true', help="Include the Excel workbook in the standard run")
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--sample', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    sizes = [(n, m) for n in args.series or [500, 2000, 8000] for m in args.months or [1, 3, 12]]
+
+    if args.sample:
+        print(json.dumps(sample(args.mode, sizes[0][0], sizes[0][1], args.workbook)))
+        return 0
+
+    print(f"{'series':>7} {'months':>6} {'log entries':>11}  "
+          + '  '.join(f"{mode + ' peak/run MB':>24} {'s':>6}" for mode in MODES))
+    for n_series, months in sizes:
+        samples = {}
+        for mode in MODES:
+            command = [sys.executable, os.path.abspath(__file__), '--sample', '--mode', mode,
+                       '--series', str(n_series), '--months', str(months)]
+            proc = subprocess.run(command + (['--workbook'] if args.workbook else []),
+                                  capture_output=True, text=True, check=True)
+            samples[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{n_series:>7} {months:>6} {samples[MODES[0]]['log_entries']:>11}  " + '  '.join(
+            f"{samples[mode]['peak']:>15.1f} / {samples[mode]['run']:>6.1f} {samples[mode]['seconds']:>6.2f}"
+            for mode in MODES))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
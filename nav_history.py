@@ -0,0 +1,213 @@
+"""
+NAV history - Series Accounting
+Period-ordered, memory-mapped NAV per share history for one fund.
+
+The history is a period x series matrix of float64 NAV per share (NaN where a
+series has no shares) stored in a directory:
+
+    nav.f8        matrix rows, one per period, `capacity` columns wide
+    series.txt    series names, one per line; line number = column index
+    periods.txt   period labels ('YYYY-MM'), one per line; line number = row index
+    meta.json     {'capacity': columns per row}
+
+Rows are kept in period order. Appending the next period (the usual case) just
+extends the files; recalculating an earlier year rewrites only the rows after
+it, and leaves other years' periods in place. Series names are only ever
+appended. When new series outgrow the row width the matrix is rewritten once at
+double the capacity, so growth is amortized. Reads
+return numpy views over a read-only memory map; nothing is copied until a caller
+converts the slice.
+"""
+
+import bisect
+import json
+import os
+import re
+
+import numpy as np
+
+from fund_store import DEFAULT_DB_PATH
+
+DEFAULT_NAV_DIR = os.environ.get(
+    'SHARE_ROLL_NAV_DIR',
+    os.path.join(os.path.dirname(DEFAULT_DB_PATH), 'nav_history')
+)
+
+INITIAL_CAPACITY = 16
+
+
+def period_label(year, month_num):
+    return f"{year}-{month_num:02d}"
+
+
+def nav_history_path(fund, base_dir=DEFAULT_NAV_DIR):
+    """Directory holding one fund's history (fund name made filesystem-safe)."""
+    slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', fund).strip('_') or 'fund'
+    return os.path.join(base_dir, slug)
+
+
+def _read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+
+class NavHistory:
+    """Period-ordered NAV per share matrix for one fund, read through a memory map."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._matrix_path = os.path.join(path, 'nav.f8')
+        self._series_path = os.path.join(path, 'series.txt')
+        self._periods_path = os.path.join(path, 'periods.txt')
+        self._meta_path = os.path.join(path, 'meta.json')
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                self.capacity = json.load(f)['capacity']
+        else:
+            self.capacity = INITIAL_CAPACITY
+            self._write_meta()
+
+        self.series = _read_lines(self._series_path)
+        self.series_index = {name: i for i, name in enumerate(self.series)}
+        self.periods = _read_lines(self._periods_path)
+
+        # Trust only complete rows: a crash mid-append leaves a partial tail behind
+        row_bytes = self.capacity * 8
+        complete_rows = os.path.getsize(self._matrix_path) // row_bytes if os.path.exists(self._matrix_path) else 0
+        if complete_rows != len(self.periods):
+            self._truncate_rows(min(complete_rows, len(self.periods)))
+        self._map = None
+
+    def _write_meta(self):
+        with open(self._meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'capacity': self.capacity}, f)
+
+    def _truncate_rows(self, n_rows):
+        self.periods = self.periods[:n_rows]
+        with open(self._periods_path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{label}\n" for label in self.periods)
+        with open(self._matrix_path, 'ab') as f:
+            f.truncate(n_rows * self.capacity * 8)
+        self._map = None
+
+    def _append_rows(self, labels, rows):
+        if not labels:
+            return
+        with open(self._matrix_path, 'ab') as f:
+            rows.tofile(f)
+        with open(self._periods_path, 'a', encoding='utf-8') as f:
+            f.writelines(f"{label}\n" for label in labels)
+        self.periods += labels
+        self._map = None
+
+    def _grow(self, needed):
+        """Rewrite the matrix at a width of at least `needed` columns."""
+        new_capacity = self.capacity
+        while new_capacity < needed:
+            new_capacity *= 2
+        old = self.matrix()
+        grown = np.full((len(self.periods), new_capacity), np.nan)
+        grown[:, :self.capacity] = old
+        tmp_path = self._matrix_path + '.tmp'
+        grown.tofile(tmp_path)
+        self._map = None
+        os.replace(tmp_path, self._matrix_path)
+        self.capacity = new_capacity
+        self._write_meta()
+
+    # =========================================================================
+    # WRITE
+    # =========================================================================
+    def append(self, label, nav_by_series):
+        """
+        Add one period row ({series: NAV per share}), replacing any row with the
+        same label; new series get a new column. Rows stay in period order: a
+        period earlier than the last one is inserted and the rows after it are
+        rewritten.
+        """
+        if label in self.periods:
+            self.clear_periods(label, label)
+        new_names = [name for name in nav_by_series if name not in self.series_index]
+        if new_names:
+            if len(self.series) + len(new_names) > self.capacity:
+                self._grow(len(self.series) + len(new_names))
+            with open(self._series_path, 'a', encoding='utf-8') as f:
+                for name in new_names:
+                    self.series_index[name] = len(self.series)
+                    self.series.append(name)
+                    f.write(f"{name}\n")
+
+        row = np.full((1, self.capacity), np.nan)
+        for name, nav in nav_by_series.items():
+            row[0, self.series_index[name]] = nav
+        self._insert_row(label, row)
+
+    def repeat(self, label, previous):
+        """
+        Add `label` as a copy of the `previous` period's row (a month where no NAV
+        moved), copying the stored row rather than rebuilding it series by series.
+        """
+        if label in self.periods:
+            self.clear_periods(label, label)
+        i = self.periods.index(previous)
+        self._insert_row(label, np.array(self.matrix()[i:i + 1]))
+
+    def _insert_row(self, label, row):
+        position = bisect.bisect_right(self.periods, label)
+        later_labels = self.periods[position:]
+        later_rows = np.array(self.matrix()[position:])
+        if later_labels:
+            self._truncate_rows(position)
+        self._append_rows([label] + later_labels, np.concatenate([row, later_rows]))
+
+    def clear_periods(self, start, stop):
+        """
+        Drop the periods from `start` through `stop` (inclusive labels), keeping
+        the ones either side; used before recalculating (part of) one year.
+        """
+        first = bisect.bisect_left(self.periods, start)
+        last = bisect.bisect_right(self.periods, stop)
+        if first == last:
+            return
+        later_labels = self.periods[last:]
+        later_rows = np.array(self.matrix()[last:])
+        self._truncate_rows(first)
+        self._append_rows(later_labels, later_rows)
+
+    # =========================================================================
+    # READ (zero-copy views)
+    # =========================================================================
+    def matrix(self):
+        """Read-only memory map of the full period x capacity matrix."""
+        if not self.periods:
+            return np.empty((0, self.capacity))
+        if self._map is None:
+            self._map = np.memmap(self._matrix_path, dtype='<f8', mode='r',
+                                  shape=(len(self.periods), self.capacity))
+        return self._map
+
+    def period_slice(self, start=None, stop=None):
+        """Row slice from the start label through the stop label (whole history by default)."""
+        first = self.periods.index(start) if start in self.periods else 0
+        last = self.periods.index(stop) + 1 if stop in self.periods else len(self.periods)
+        return slice(first, last)
+
+    def series_column(self, name, start=None, stop=None):
+        """NAV per share of one series over a period range, as a strided view."""
+        return self.matrix()[self.period_slice(start, stop), self.series_index[name]]
+
+    def to_frame(self, start=None, stop=None, series=None):
+        """DataFrame (periods x series) over a period range, built on the mapped slice."""
+        import pandas as pd
+
+        rows = self.period_slice(start, stop)
+        block = self.matrix()[rows, :len(self.series)]
+        names = self.series
+        if series is not None:
+            names = list(series)
+            block = block[:, [self.series_index[name] for name in names]]
+        return pd.DataFrame(block, index=self.periods[rows], columns=names, copy=False)
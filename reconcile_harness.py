@@ -0,0 +1,737 @@
+"""
+Share roll reconciliation harness - Series Accounting
+Property-based equivalence and identity checks at scale.
+
+Generates random funds (many series, roll-ups, negative P/L, full, partial and
+multi-series redemptions), runs the frozen reference logic from the original
+single-file app next to one or more engines, and asserts that:
+
+- every engine matches the reference series by series (shares, NAVs, roll
+  transfers, calc log and monthly NAV snapshots) on funds the reference models;
+- the share roll identity holds per series and in total:
+      Beginning + Transfers In - Transfers Out + Contributed - Redeemed = Ending
+- the NAV identities hold: each live series' total NAV equals shares x NAV per
+  share, and the fund's ending NAV equals beginning NAV plus the P/L allocated,
+  contributions issued, redemptions paid and fees charged each month;
+- fees follow their schedule: high-water marks (the initial series' merged on
+  roll-up so each holder keeps their dollar mark) carry unchanged until December,
+  incentive fees crystallize only in December, a series whose year-end NAV per
+  share is at or below its mark pays none (and keeps the mark), and one above it
+  pays rate / (1 - rate) of its post-fee gain over the mark and resets the mark
+  to its year-end NAV per share;
+- on a sample of cases, the NAV history keeps every year's periods, in order,
+  after years are recalculated out of order (a middle year again, then an
+  earlier year than any it holds).
+
+Funds using engine-only features (fees, contributions into existing series) are
+checked against the identities only. Keyword arguments (new_series_fees,
+checkpoints, nav_history) are passed only to engines whose signature takes them;
+an engine without them skips the engine-only funds and the checks that need them,
+so the harness also runs with reconcile_harness:reference_share_roll as --engine.
+
+Usage:
+    python reconcile_harness.py --cases 20000
+    python reconcile_harness.py --cases 5000 --engine engine:calculate_share_roll --seed 7
+"""
+
+import argparse
+import importlib
+import inspect
+import math
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+
+from engine import MONTHS
+
+REL_TOL = 1e-9
+ABS_TOL = 1e-6
+
+# Share of cases that also run the NAV history check (it writes to disk)
+NAV_HISTORY_SHARE = 0.02
+
+SERIES_FIELDS = ['beginning_shares', 'shares', 'nav_per_share', 'total_nav', 'transfers_in',
+                 'transfers_out', 'contributed_shares', 'redeemed_shares']
+
+
+# =============================================================================
+# REFERENCE: the calculation exactly as the original app.py ran it
+# =============================================================================
+def reference_share_roll(valid_prior_series, monthly_data, par_value, current_year):
+    # Initialize series tracking with beginning of year values
+    series_data = {}
+    initial_series_name = valid_prior_series[0]['Series']
+
+    # Track all series that ever existed (for output)
+    all_series_ever = set()
+
+    for s in valid_prior_series:
+        series_data[s['Series']] = {
+            'beginning_shares': s['Ending Shares'],
+            'beginning_nav': s['NAV per Share'],
+            'shares': s['Ending Shares'],
+            'nav_per_share': s['NAV per Share'],
+            'total_nav': s['Total NAV'],
+            'transfers_in': 0.0,
+            'transfers_out': 0.0,
+            'contributed_shares': 0.0,
+            'redeemed_shares': 0.0,
+            'is_initial': s.get('is_initial', False),
+            'created_month': None,
+            'rolled_up': False
+        }
+        all_series_ever.add(s['Series'])
+
+    # Detailed calculation log
+    calc_log = []
+
+    # =====================================================================
+    # ROLL-UP LOGIC: At beginning of year
+    # =====================================================================
+    calc_log.append({
+        'Step': 'Roll-up Check',
+        'Month': 'Beginning of Year',
+        'Series': 'All',
+        'Description': f'Checking if any series NAV > par value (${par_value:,.2f})',
+        'Details': ''
+    })
+
+    # Find series that need to roll up (NAV > par value, not the initial series)
+    rollup_series = []
+    for series_name, s in series_data.items():
+        if not s['is_initial'] and s['nav_per_share'] > par_value and s['shares'] > 0:
+            rollup_series.append(series_name)
+
+    initial_series = series_data.get(initial_series_name)
+
+    if rollup_series and initial_series and initial_series['shares'] > 0:
+        for series_name in rollup_series:
+            s = series_data[series_name]
+
+            # Calculate transfer
+            transfer_value = s['shares'] * s['nav_per_share']
+            shares_transferred_out = s['shares']
+            shares_transferred_in = transfer_value / initial_series['nav_per_share'] if initial_series['nav_per_share'] > 0 else 0
+
+            calc_log.append({
+                'Step': 'Roll-up Transfer',
+                'Month': 'Beginning of Year',
+                'Series': series_name,
+                'Description': f'Rolling up into {initial_series_name}',
+                'Details': f'Shares out: {shares_transferred_out:,.4f} @ ${s["nav_per_share"]:,.4f} = ${transfer_value:,.2f}'
+            })
+
+            calc_log.append({
+                'Step': 'Roll-up Transfer',
+                'Month': 'Beginning of Year',
+                'Series': initial_series_name,
+                'Description': f'Receiving roll-up from {series_name}',
+                'Details': f'Shares in: ${transfer_value:,.2f} / ${initial_series["nav_per_share"]:,.4f} = {shares_transferred_in:,.4f} shares'
+            })
+
+            # Update series data
+            s['transfers_out'] = shares_transferred_out
+            s['shares'] = 0
+            s['total_nav'] = 0
+            s['rolled_up'] = True
+
+            initial_series['transfers_in'] += shares_transferred_in
+            initial_series['shares'] += shares_transferred_in
+            initial_series['total_nav'] += transfer_value
+    else:
+        calc_log.append({
+            'Step': 'Roll-up Check',
+            'Month': 'Beginning of Year',
+            'Series': 'All',
+            'Description': 'No roll-ups required',
+            'Details': 'No series with NAV > par value'
+        })
+
+    # =====================================================================
+    # MONTHLY PROCESSING
+    # =====================================================================
+    for month_info in monthly_data:
+        month = month_info['month']
+        month_num = month_info['month_num']
+        pl = month_info['pl']
+        contributions = month_info['contributions']
+        redemptions = month_info['redemptions']
+        redemption_series = month_info['redemption_series']
+
+        # 1. Create new series from contributions
+        full_redemption = month_info['full_redemption']
+
+        if contributions > 0:
+            new_series_name = f"Series {month_num}/{current_year}"
+            counter = 1
+            base_name = new_series_name
+            while new_series_name in series_data:
+                counter += 1
+                new_series_name = f"{base_name}-{counter}"
+
+            new_shares = contributions / par_value
+
+            calc_log.append({
+                'Step': 'New Series',
+                'Month': month,
+                'Series': new_series_name,
+                'Description': f'Contribution of ${contributions:,.2f}',
+                'Details': f'Shares issued: ${contributions:,.2f} / ${par_value:,.2f} = {new_shares:,.4f}'
+            })
+
+            series_data[new_series_name] = {
+                'beginning_shares': 0.0,
+                'beginning_nav': par_value,
+                'shares': new_shares,
+                'nav_per_share': par_value,
+                'total_nav': contributions,
+                'transfers_in': 0.0,
+                'transfers_out': 0.0,
+                'contributed_shares': new_shares,
+                'redeemed_shares': 0.0,
+                'is_initial': False,
+                'created_month': month,
+                'rolled_up': False
+            }
+            all_series_ever.add(new_series_name)
+
+        # 2. Allocate P/L pro-rata (AFTER contributions, BEFORE redemptions)
+        # Build explicit list of active series to avoid any dict iteration issues
+        active_series_for_pl = [(name, data) for name, data in series_data.items()
+                                if data['shares'] > 0 and data['total_nav'] > 0]
+        total_nav_for_pl = sum(data['total_nav'] for _, data in active_series_for_pl)
+
+        if total_nav_for_pl > 0 and pl != 0:
+            # Snapshot NAV values before any modifications
+            nav_snapshot = {name: data['total_nav'] for name, data in active_series_for_pl}
+
+            calc_log.append({
+                'Step': 'P/L Allocation',
+                'Month': month,
+                'Series': 'All',
+                'Description': f'Total P/L: ${pl:,.2f}',
+                'Details': f'Total NAV for allocation: ${total_nav_for_pl:,.2f}'
+            })
+
+            for series_name, _ in active_series_for_pl:
+                s = series_data[series_name]
+                pl_share = pl * (nav_snapshot[series_name] / total_nav_for_pl)
+                old_nav = s['nav_per_share']
+                s['total_nav'] += pl_share
+                if s['shares'] > 0:
+                    s['nav_per_share'] = s['total_nav'] / s['shares']
+
+                calc_log.append({
+                    'Step': 'P/L Allocation',
+                    'Month': month,
+                    'Series': series_name,
+                    'Description': f'P/L share: ${pl_share:,.2f}',
+                    'Details': f'NAV/share: ${old_nav:,.4f} → ${s["nav_per_share"]:,.4f}'
+                })
+
+        # 3. Process redemption (AFTER P/L - at post-P/L NAV)
+        multi_redemptions = month_info.get('multi_redemptions', [])
+
+        if multi_redemptions:
+            # Multi-series redemption mode
+            for mr in multi_redemptions:
+                mr_series = mr['series']
+                mr_amount = mr['amount']
+                mr_full = mr['full']
+                if mr_series and mr_series in series_data:
+                    s = series_data[mr_series]
+                    if s['nav_per_share'] > 0 and s['shares'] > 0:
+                        if mr_full:
+                            shares_redeemed = s['shares']
+                            redemption_amount = shares_redeemed * s['nav_per_share']
+                            calc_log.append({
+                                'Step': 'Full Redemption (Multi)',
+                                'Month': month,
+                                'Series': mr_series,
+                                'Description': f'FULL redemption of all shares',
+                                'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: {shares_redeemed:,.4f} | Redemption value: ${redemption_amount:,.2f}'
+                            })
+                        else:
+                            shares_redeemed = mr_amount / s['nav_per_share']
+                            redemption_amount = mr_amount
+                            calc_log.append({
+                                'Step': 'Redemption (Multi)',
+                                'Month': month,
+                                'Series': mr_series,
+                                'Description': f'Redemption of ${mr_amount:,.2f}',
+                                'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: ${mr_amount:,.2f} / ${s["nav_per_share"]:,.4f} = {shares_redeemed:,.4f} | Shares before: {s["shares"]:,.4f}'
+                            })
+
+                        s['redeemed_shares'] += shares_redeemed
+                        s['shares'] = s['shares'] - shares_redeemed
+                        s['total_nav'] = s['total_nav'] - redemption_amount
+
+        elif (redemptions > 0 or full_redemption) and redemption_series and redemption_series in series_data:
+            s = series_data[redemption_series]
+            if s['nav_per_share'] > 0 and s['shares'] > 0:
+                if full_redemption:
+                    shares_redeemed = s['shares']
+                    redemption_amount = shares_redeemed * s['nav_per_share']
+
+                    calc_log.append({
+                        'Step': 'Full Redemption',
+                        'Month': month,
+                        'Series': redemption_series,
+                        'Description': f'FULL redemption of all shares',
+                        'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: {shares_redeemed:,.4f} | Redemption value: ${redemption_amount:,.2f}'
+                    })
+                else:
+                    shares_redeemed = redemptions / s['nav_per_share']
+                    redemption_amount = redemptions
+
+                    calc_log.append({
+                        'Step': 'Redemption',
+                        'Month': month,
+                        'Series': redemption_series,
+                        'Description': f'Redemption of ${redemptions:,.2f}',
+                        'Details': f'NAV/share: ${s["nav_per_share"]:,.4f} | Shares redeemed: ${redemptions:,.2f} / ${s["nav_per_share"]:,.4f} = {shares_redeemed:,.4f} | Shares before: {s["shares"]:,.4f}'
+                    })
+
+                s['redeemed_shares'] += shares_redeemed
+                s['shares'] = s['shares'] - shares_redeemed
+                s['total_nav'] = s['total_nav'] - redemption_amount
+
+    # Build monthly NAV tracking
+    monthly_nav_data = []
+
+    # Re-run calculation just to capture monthly NAV snapshots
+    temp_series = {}
+    for s in valid_prior_series:
+        temp_series[s['Series']] = {
+            'shares': s['Ending Shares'],
+            'nav_per_share': s['NAV per Share'],
+            'total_nav': s['Total NAV'],
+        }
+
+    # Process roll-ups first
+    temp_initial = temp_series.get(initial_series_name)
+    for series_name, s in list(temp_series.items()):
+        if series_name != initial_series_name and s['nav_per_share'] > par_value and s['shares'] > 0:
+            transfer_value = s['shares'] * s['nav_per_share']
+            shares_in = transfer_value / temp_initial['nav_per_share'] if temp_initial['nav_per_share'] > 0 else 0
+            temp_initial['shares'] += shares_in
+            temp_initial['total_nav'] += transfer_value
+            s['shares'] = 0
+            s['total_nav'] = 0
+
+    # Capture beginning of year NAV
+    boy_row = {'Month': 'Beginning of Year'}
+    for series_name, s in temp_series.items():
+        if s['shares'] > 0:
+            boy_row[series_name] = s['nav_per_share']
+    monthly_nav_data.append(boy_row)
+
+    # Process each month
+    for month_info in monthly_data:
+        month = month_info['month']
+        pl = month_info['pl']
+        contributions = month_info['contributions']
+        redemptions = month_info['redemptions']
+        redemption_series = month_info['redemption_series']
+
+        # 1. Create new series (contributions first)
+        full_redemption = month_info['full_redemption']
+        if contributions > 0:
+            month_num = month_info['month_num']
+            new_name = f"Series {month_num}/{current_year}"
+            temp_series[new_name] = {
+                'shares': contributions / par_value,
+                'nav_per_share': par_value,
+                'total_nav': contributions
+            }
+
+        # 2. Allocate P/L (after contributions, before redemptions)
+        # Build explicit list of active series
+        active_temp = [(name, data) for name, data in temp_series.items()
+                      if data['shares'] > 0 and data['total_nav'] > 0]
+        total_nav = sum(data['total_nav'] for _, data in active_temp)
+        if total_nav > 0 and pl != 0:
+            snapshot = {name: data['total_nav'] for name, data in active_temp}
+            for series_name, _ in active_temp:
+                s = temp_series[series_name]
+                if snapshot[series_name] > 0 and s['shares'] > 0:
+                    pl_share = pl * (snapshot[series_name] / total_nav)
+                    s['total_nav'] += pl_share
+                    s['nav_per_share'] = s['total_nav'] / s['shares']
+
+        # 3. Process redemption (after P/L)
+        multi_redemptions = month_info.get('multi_redemptions', [])
+
+        if multi_redemptions:
+            for mr in multi_redemptions:
+                mr_series = mr['series']
+                mr_amount = mr['amount']
+                mr_full = mr['full']
+                if mr_series and mr_series in temp_series:
+                    s = temp_series[mr_series]
+                    if s['nav_per_share'] > 0 and s['shares'] > 0:
+                        if mr_full:
+                            redemption_amount = s['shares'] * s['nav_per_share']
+                            s['total_nav'] -= redemption_amount
+                            s['shares'] = 0
+                        else:
+                            shares_red = mr_amount / s['nav_per_share']
+                            s['shares'] -= shares_red
+                            s['total_nav'] -= mr_amount
+
+        elif (redemptions > 0 or full_redemption) and redemption_series and redemption_series in temp_series:
+            s = temp_series[redemption_series]
+            if s['nav_per_share'] > 0 and s['shares'] > 0:
+                if full_redemption:
+                    redemption_amount = s['shares'] * s['nav_per_share']
+                    s['total_nav'] -= redemption_amount
+                    s['shares'] = 0
+                else:
+                    shares_red = redemptions / s['nav_per_share']
+                    s['shares'] -= shares_red
+                    s['total_nav'] -= redemptions
+
+        # Capture end of month NAV
+        month_row = {'Month': f'End of {month}'}
+        for series_name, s in temp_series.items():
+            if s['shares'] > 0:
+                month_row[series_name] = s['nav_per_share']
+        monthly_nav_data.append(month_row)
+    return {
+        'series_data': series_data,
+        'all_series_ever': all_series_ever,
+        'initial_series_name': initial_series_name,
+        'calc_log': calc_log,
+        'nav_tracking': monthly_nav_data,
+    }
+
+
+# =============================================================================
+# RANDOM FUNDS
+# =============================================================================
+def random_fund(rng, engine_only_features=False):
+    """
+    A random fund-year as (valid_prior_series, monthly_data, par_value, current_year,
+    new_series_fees). With engine_only_features, fees, contributions into
+    existing series and dated flows allocated on daily capital are mixed in as well.
+    """
+    current_year = rng.randint(2001, 2099)
+    par_value = rng.choice([1.0, 10.0, 100.0, 1000.0, rng.uniform(1.0, 2000.0)])
+    n_series = rng.choice([1, 2, 3, 5, 10, 25, 60])
+    pl_allocation = rng.choice(['month_end', 'daily_capital']) if engine_only_features else 'month_end'
+    random_day = lambda: rng.choice([None, 1, 28, rng.randint(1, 28)])
+
+    prior_series = []
+    for i in range(n_series):
+        shares = rng.choice([rng.uniform(0.001, 10.0), rng.uniform(10.0, 10000.0), float(rng.randint(1, 500))])
+        # Spread NAVs around par so roll-ups happen in roughly half the funds
+        nav = par_value * rng.choice([rng.uniform(0.2, 0.99), rng.uniform(1.01, 3.0), 1.0])
+        series = {
+            'Series': 'Initial Series' if i == 0 else f'Series P{i}',
+            'Ending Shares': shares,
+            'NAV per Share': nav,
+            'Total NAV': shares * nav,
+            'is_initial': i == 0,
+        }
+        if engine_only_features:
+            series['Management Fee'] = rng.choice([0.0, 0.01, 0.02])
+            series['Incentive Fee'] = rng.choice([0.0, 0.1, 0.2])
+            series['High-Water Mark'] = nav * rng.uniform(0.8, 1.2)
+        prior_series.append(series)
+
+    fund_nav = sum(s['Total NAV'] for s in prior_series)
+    available = [s['Series'] for s in prior_series]
+    monthly_data = []
+    for i, month in enumerate(MONTHS):
+        activity = rng.random()
+        pl = 0.0
+        if activity < 0.8:
+            pl = fund_nav * rng.choice([rng.uniform(-0.05, 0.05), rng.uniform(-0.4, -0.05), rng.uniform(0.05, 0.3)])
+
+        contributions = 0.0
+        contribution_series = None
+        if rng.random() < 0.3:
+            contributions = fund_nav * rng.uniform(0.001, 0.2)
+            if engine_only_features and rng.random() < 0.5:
+                contribution_series = rng.choice(available)
+
+        redemptions = 0.0
+        redemption_series = None
+        full_redemption = False
+        multi_redemptions = []
+        kind = rng.random()
+        if kind < 0.25:
+            redemption_series = rng.choice(available)
+            redemptions = fund_nav / len(available) * rng.uniform(0.01, 0.5)
+        elif kind < 0.35:
+            redemption_series = rng.choice(available)
+            full_redemption = True
+        elif kind < 0.45:
+            redemption_series = 'Multiple Series'
+            for _ in range(rng.randint(1, 5)):
+                multi_redemptions.append({
+                    'series': rng.choice(available),
+                    'amount': fund_nav / len(available) * rng.uniform(0.01, 0.3),
+                    'full': rng.random() < 0.3,
+                })
+                if engine_only_features:
+                    multi_redemptions[-1]['day'] = random_day()
+
+        month_info = {
+            'month': month,
+            'month_num': i + 1,
+            'pl': pl,
+            'contributions': contributions,
+            'redemptions': redemptions,
+            'redemption_series': redemption_series,
+            'full_redemption': full_redemption,
+            'multi_redemptions': multi_redemptions,
+        }
+        if engine_only_features:
+            month_info['contribution_series'] = contribution_series
+            month_info['contribution_pricing'] = rng.choice(['pre_pl', 'post_pl'])
+            month_info['contribution_day'] = random_day()
+            month_info['redemption_day'] = random_day()
+            month_info['pl_allocation'] = pl_allocation
+            if rng.random() < 0.2:
+                month_info['subscriptions'] = [
+                    {'amount': fund_nav * rng.uniform(0.0001, 0.01),
+                     'series': rng.choice(available + [None]),
+                     'pricing': rng.choice(['pre_pl', 'post_pl']),
+                     'day': random_day()}
+                    for _ in range(rng.randint(1, 200))
+                ]
+        monthly_data.append(month_info)
+        if contributions > 0 and not contribution_series:
+            available.append(f"Series {i + 1}/{current_year}")
+
+    new_series_fees = {}
+    if engine_only_features:
+        new_series_fees = {'management_fee': rng.choice([0.0, 0.015]), 'incentive_fee': rng.choice([0.0, 0.2])}
+    return prior_series, monthly_data, par_value, current_year, new_series_fees
+
+
+# =============================================================================
+# CHECKS
+# =============================================================================
+def close(a, b):
+    return math.isclose(a, b, rel_tol=REL_TOL, abs_tol=ABS_TOL)
+
+
+def compare_to_reference(expected, actual):
+    """Mismatches between the reference result and an engine result."""
+    problems = []
+    if set(expected['series_data']) != set(actual['series_data']):
+        problems.append(f"series differ: {sorted(set(expected['series_data']) ^ set(actual['series_data']))}")
+        return problems
+    if expected['all_series_ever'] != set(actual['all_series_ever']):
+        problems.append("all_series_ever differs")
+    for name, ref in expected['series_data'].items():
+        got = actual['series_data'][name]
+        for field in SERIES_FIELDS:
+            if not close(ref[field], got[field]):
+                problems.append(f"{name}.{field}: reference {ref[field]!r} vs engine {got[field]!r}")
+        if ref['rolled_up'] != got['rolled_up']:
+            problems.append(f"{name}.rolled_up differs")
+    if expected['calc_log'] != actual['calc_log']:
+        problems.append("calc_log differs")
+    if len(expected['nav_tracking']) != len(actual['nav_tracking']):
+        problems.append("nav_tracking length differs")
+    else:
+        for ref_row, got_row in zip(expected['nav_tracking'], actual['nav_tracking']):
+            if ref_row.keys() != got_row.keys() or not all(
+                    close(ref_row[k], got_row[k]) for k in ref_row if k != 'Month'):
+                problems.append(f"nav_tracking differs at {ref_row['Month']}")
+                break
+    return problems
+
+
+def check_identities(prior_series, result):
+    """Share roll and NAV identity violations in an engine result."""
+    problems = []
+    series_data = result['series_data']
+    scale = max(1.0, sum(abs(s['Total NAV']) for s in prior_series))
+
+    totals = {field: 0.0 for field in SERIES_FIELDS}
+    for name, s in series_data.items():
+        rolled = s['beginning_shares'] + s['transfers_in'] - s['transfers_out'] + s['contributed_shares'] - s['redeemed_shares']
+        if not math.isclose(rolled, s['shares'], rel_tol=REL_TOL, abs_tol=1e-6 * max(1.0, abs(s['beginning_shares']))):
+            problems.append(f"{name}: share roll {rolled!r} != ending {s['shares']!r}")
+        if s['shares'] > 0 and not math.isclose(s['shares'] * s['nav_per_share'], s['total_nav'],
+                                                rel_tol=1e-7, abs_tol=1e-6 * scale):
+            problems.append(f"{name}: shares x NAV/share {s['shares'] * s['nav_per_share']!r} != total NAV {s['total_nav']!r}")
+        for field in SERIES_FIELDS:
+            totals[field] += s[field]
+
+    rolled_total = totals['beginning_shares'] + totals['transfers_in'] - totals['transfers_out'] \
+        + totals['contributed_shares'] - totals['redeemed_shares']
+    if not math.isclose(rolled_total, totals['shares'], rel_tol=REL_TOL, abs_tol=1e-4):
+        problems.append(f"fund share roll {rolled_total!r} != ending {totals['shares']!r}")
+
+    # Roll-ups move value between series without changing fund NAV (the
+    # reference doesn't report monthly flows, so it only gets the share checks)
+    if 'monthly_flows' not in result:
+        return problems
+    expected_nav = sum(s['Total NAV'] for s in prior_series)
+    for flow in result['monthly_flows']:
+        expected_nav += flow['pl_allocated'] + flow['contributions'] - flow['redemptions'] - flow['fees']
+    ending_nav = sum(s['total_nav'] for s in series_data.values())
+    if not math.isclose(expected_nav, ending_nav, rel_tol=1e-9, abs_tol=1e-6 * scale):
+        problems.append(f"fund NAV {ending_nav!r} != beginning + flows {expected_nav!r}")
+    return problems
+
+
+def check_fees(fund, result, checkpoints):
+    """
+    Fee schedule violations, from the engine's month-open checkpoints
+    (calculate_share_roll(checkpoints=...)) and its year-end series.
+    """
+    prior_series, monthly_data, par_value, current_year, new_series_fees = fund
+    problems = []
+    starting_marks = {s['Series']: s.get('High-Water Mark') or s['NAV per Share'] for s in prior_series}
+    # Roll-ups merge marks into the initial series, keeping every holder's dollar mark
+    initial = prior_series[0]
+    rolled = [s for s in prior_series[1:] if s['NAV per Share'] > par_value and s['Ending Shares'] > 0]
+    if rolled and initial['Ending Shares'] > 0:
+        shares_in = sum(s['Ending Shares'] * s['NAV per Share'] for s in rolled) / initial['NAV per Share']
+        dollar_marks = sum(s['Ending Shares'] * starting_marks[s['Series']] for s in [initial] + rolled)
+        starting_marks[initial['Series']] = dollar_marks / (initial['Ending Shares'] + shares_in)
+    for month, opening in checkpoints.items():
+        for name, s in opening.items():
+            mark = starting_marks.get(name, par_value)
+            if not close(s['high_water_mark'], mark):
+                problems.append(f"{name}: high-water mark {s['high_water_mark']!r} at the open of {month}, "
+                                f"expected {mark!r} carried")
+            if s['incentive_fees']:
+                problems.append(f"{name}: incentive fee {s['incentive_fees']!r} charged before {month}")
+    if problems or 'December' not in checkpoints:
+        return problems
+
+    for name, opening in checkpoints['December'].items():
+        s = result['series_data'][name]
+        rate = s['incentive_fee_rate']
+        if not rate or s['shares'] <= 0:
+            continue
+        mark = opening['high_water_mark']
+        if s['nav_per_share'] <= mark * (1 + REL_TOL):
+            if s['incentive_fees'] > ABS_TOL or not close(s['high_water_mark'], mark):
+                problems.append(f"{name}: NAV per share {s['nav_per_share']!r} at or below mark {mark!r} "
+                                f"but incentive fee {s['incentive_fees']!r}, mark {s['high_water_mark']!r}")
+            continue
+        if not close(s['high_water_mark'], s['nav_per_share']):
+            problems.append(f"{name}: mark {s['high_water_mark']!r} not reset to NAV per share {s['nav_per_share']!r}")
+        if s['shares'] == opening['shares']:
+            expected = rate / (1 - rate) * (s['nav_per_share'] - mark) * s['shares']
+            if not math.isclose(s['incentive_fees'], expected, rel_tol=1e-7, abs_tol=ABS_TOL):
+                problems.append(f"{name}: incentive fee {s['incentive_fees']!r}, expected {expected!r}")
+    return problems
+
+
+def check_nav_history(engine, fund, path):
+    """
+    NAV history problems after running the fund for three years, recalculating
+    the middle one with half the P/L, then calculating the year before them all.
+    Every year's periods must be kept, in period order, each holding its latest run.
+    """
+    from nav_history import NavHistory
+
+    prior_series, monthly_data, par_value, current_year, new_series_fees = fund
+    history = NavHistory(path)
+    latest = {}
+    for year, scale in ((current_year, 1.0), (current_year + 1, 1.0), (current_year + 2, 1.0),
+                        (current_year + 1, 0.5), (current_year - 1, 1.0)):
+        months = [dict(m, pl=m['pl'] * scale) for m in monthly_data]
+        result = engine(prior_series, months, par_value, year,
+                        **accepted_kwargs(engine, new_series_fees=new_series_fees, nav_history=history))
+        latest[year] = [(f"{year}-{m['month_num']:02d}", row) for m, row in zip(months, result['nav_tracking'][1:])]
+
+    history = NavHistory(path)
+    expected = [entry for year in sorted(latest) for entry in latest[year]]
+    if history.periods != [label for label, _ in expected]:
+        return [f"NAV history periods {history.periods} != {[label for label, _ in expected]}"]
+    matrix = history.matrix()
+    for i, (label, row) in enumerate(expected):
+        for name, column in history.series_index.items():
+            value = matrix[i, column]
+            if name in row and not close(row[name], value) or name not in row and not math.isnan(value):
+                return [f"NAV history {label} {name}: {value!r} != {row.get(name)!r}"]
+    return []
+
+
+# =============================================================================
+# RUNNER
+# =============================================================================
+def load_engine(spec):
+    module_name, func_name = spec.split(':')
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def accepted_kwargs(engine, **kwargs):
+    """The kwargs engine's signature accepts (reference_share_roll takes none of them)."""
+    parameters = inspect.signature(engine).parameters
+    if any(p.kind is inspect.Parameter.VAR_KEYWORD for p in parameters.values()):
+        return kwargs
+    return {name: value for name, value in kwargs.items() if name in parameters}
+
+
+def run_case(args):
+    """Run one seeded case against every engine; returns (seed, [problems])."""
+    seed, engine_specs = args
+    rng = random.Random(seed)
+    engine_only = rng.random() < 0.3
+    fund = random_fund(rng, engine_only)
+    prior_series, monthly_data, par_value, current_year, new_series_fees = fund
+    nav_history_check = rng.random() < NAV_HISTORY_SHARE
+
+    expected = None if engine_only else reference_share_roll(prior_series, monthly_data, par_value, current_year)
+    problems = []
+    for spec in engine_specs:
+        engine = load_engine(spec)
+        kwargs = accepted_kwargs(engine, new_series_fees=new_series_fees, checkpoints={}, nav_history=None)
+        if engine_only and 'new_series_fees' not in kwargs:
+            continue
+        actual = engine(prior_series, monthly_data, par_value, current_year,
+                        **{k: v for k, v in kwargs.items() if k != 'nav_history'})
+        if expected is not None:
+            problems += [f"[{spec}] {p}" for p in compare_to_reference(expected, actual)]
+        problems += [f"[{spec}] {p}" for p in check_identities(prior_series, actual)]
+        if 'checkpoints' in kwargs:
+            problems += [f"[{spec}] {p}" for p in check_fees(fund, actual, kwargs['checkpoints'])]
+        if nav_history_check and 'nav_history' in kwargs:
+            with tempfile.TemporaryDirectory() as tmp:
+                problems += [f"[{spec}] {p}" for p in check_nav_history(engine, fund, tmp)]
+    return seed, problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cases', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0, help="First case seed; case i uses seed + i")
+    parser.add_argument('--engine', action='append', dest='engines',
+                        help="module:function to check (repeatable); default engine:calculate_share_roll")
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--max-failures', type=int, default=10)
+    args = parser.parse_args(argv)
+    engine_specs = args.engines or ['engine:calculate_share_roll']
+
+    started = time.perf_counter()
+    cases = ((args.seed + i, engine_specs) for i in range(args.cases))
+    failures = []
+    with multiprocessing.Pool(args.workers) as pool:
+        for seed, problems in pool.imap_unordered(run_case, cases, chunksize=64):
+            if problems:
+                failures.append((seed, problems))
+    elapsed = time.perf_counter() - started
+
+    for seed, problems in sorted(failures)[:args.max_failures]:
+        print(f"seed {seed}:")
+        for problem in problems[:5]:
+            print(f"    {problem}")
+    print(f"{args.cases} cases, {len(failures)} failing, {elapsed:.1f}s ({', '.join(engine_specs)})")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
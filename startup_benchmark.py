@@ -0,0 +1,109 @@
+"""
+Startup benchmark - Series Accounting
+Times the Streamlit app's cold start and reruns through streamlit's AppTest.
+
+Every sample runs in a fresh interpreter with streamlit already imported (as in
+a running server), against an empty temporary fund store:
+
+- cold start:   first script run (imports of the app's own dependencies included)
+- idle rerun:   a rerun with no input change
+- calculate:    entering a small fund and clicking Calculate
+- export mode:  switching the Excel mode with results on screen
+
+AppTest reruns the whole script on every interaction, so the times are upper
+bounds for the app's fragment-scoped sections (Steps 2-3, the results) in a
+live server.
+
+Pass --app more than once to compare checkouts; their samples are interleaved
+so machine load drifts affect each app alike.
+
+Usage:
+    python startup_benchmark.py
+    python startup_benchmark.py --repeats 15 --app /path/to/baseline/app.py --app app.py
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCENARIOS = ['cold start', 'idle rerun', 'calculate', 'export mode']
+
+
+def timed(run):
+    start = time.perf_counter()
+    run()
+    return (time.perf_counter() - start) * 1000
+
+
+def sample(app_path):
+    """One fresh-process measurement of every scenario (milliseconds)."""
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(app_path)))
+    at = AppTest.from_file(app_path, default_timeout=120)
+    times = {'cold start': timed(at.run)}
+    times['idle rerun'] = statistics.median(timed(at.run) for _ in range(5))
+
+    from fund_inputs import apply_delta
+    tables = at.session_state['fund_inputs']
+    apply_delta(tables['prior'], {
+        'edited_rows': {0: {'Ending Shares': '100', 'NAV per Share': '1100'}},
+        'added_rows': [{'Series': 'Series A', 'Ending Shares': '50', 'NAV per Share': '1200'}],
+    })
+    apply_delta(tables['activity'], {'edited_rows': {
+        0: {'P/L': '5000'}, 1: {'Contrib': '20000'},
+        2: {'P/L': '-3000', 'Redemp $': '1000', 'From Series': 'Series A'},
+    }})
+    at.run()
+    calculate = next(b for b in at.button if 'Calculate' in str(b.label))
+    times['calculate'] = timed(calculate.click().run)
+
+    mode = next(r for r in at.radio if r.label == "Excel Calculation Details")
+    times['export mode'] = timed(mode.set_value('values').run)
+    assert not at.exception, at.exception
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--app', action='append', dest='apps',
+                        help="App script to measure (repeatable; default: this checkout's app.py)")
+    parser.add_argument('--repeats', type=int, default=5, help="Fresh processes to sample")
+    parser.add_argument('--sample', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    apps = [os.path.abspath(app) for app in args.apps or
+            [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')]]
+
+    if args.sample:
+        print(json.dumps(sample(apps[0])))
+        return 0
+
+    samples = {app: [] for app in apps}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SHARE_ROLL_DB=os.path.join(tmp, 'bench.db'),
+                   SHARE_ROLL_NAV_DIR=os.path.join(tmp, 'nav_history'))
+        for _ in range(args.repeats):
+            for app in apps:
+                if os.path.exists(env['SHARE_ROLL_DB']):
+                    os.remove(env['SHARE_ROLL_DB'])
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--sample', '--app', app],
+                                      env=env, capture_output=True, text=True, check=True)
+                samples[app].append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    for app in apps:
+        print(f"{app} ({args.repeats} fresh processes, ms)")
+        print(f"  {'':<12} {'median':>8} {'min':>8} {'max':>8}")
+        for scenario in SCENARIOS:
+            values = [s[scenario] for s in samples[app]]
+            print(f"  {scenario:<12} {statistics.median(values):8.1f} {min(values):8.1f} {max(values):8.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
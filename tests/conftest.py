@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fund_store
+from engine import MONTHS, calculate_share_roll
+from fund_inputs import stored_calc_inputs
+
+
+def stored_inputs(pl=1000.0, prior_year=2023):
+    """
+    Stored inputs (as fund_store.save_inputs takes them) for a two-series fund
+    with P/L every month and a June redemption from the initial series.
+    """
+    inputs = {
+        'tables': {
+            'prior': [{'Series': 'Initial Series', 'Ending Shares': '100.0', 'NAV per Share': '1000.0'},
+                      {'Series': 'Series 6/2023', 'Ending Shares': '50.0', 'NAV per Share': '990.0'}],
+            'activity': [{'Month': month, 'P/L': repr(pl), 'Full?': False} for month in MONTHS],
+            'multi': [],
+        },
+        'settings': {'par_value': 1000.0, 'existing_series_pricing': 'post_pl', 'pl_allocation': 'month_end',
+                     'new_series_mgmt_fee': 0.0, 'new_series_incentive_fee': 0.0, 'prior_year': prior_year},
+    }
+    inputs['tables']['activity'][5].update({'Redemp $': '5000.0', 'From Series': 'Initial Series'})
+    return inputs
+
+
+def calculate(inputs):
+    """(digest, result) for stored inputs, as the app calculates them."""
+    calc_inputs, errors = stored_calc_inputs(inputs)
+    assert not errors
+    result = calculate_share_roll(calc_inputs['prior_series'], calc_inputs['monthly_data'], calc_inputs['par_value'],
+                                  calc_inputs['current_year'], calc_inputs['new_series_fees'])
+    return fund_store.input_hash(calc_inputs), result
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = fund_store.connect(str(tmp_path / 'share_roll.db'))
+    yield conn
+    conn.close()
@@ -0,0 +1,56 @@
+import fund_store
+from audit_diff import SERIES_TOTALS, audit_records, diff_results, diff_stored
+from conftest import calculate, stored_inputs
+
+
+def test_audit_record_keys():
+    _, result = calculate(stored_inputs())
+    values, events = audit_records(result)
+    assert values[('Shares', 'Beginning of Year', 'Initial Series')] == 100.0
+    assert values[('NAV per Share', 'Beginning of Year', 'Series 6/2023')] == 990.0
+    assert ('NAV per Share', 'End of December', 'Initial Series') in values
+    for label, field in SERIES_TOTALS:
+        assert values[(label, 'Year', 'Initial Series')] == result['series_data']['Initial Series'][field]
+
+    # Repeats of a step for a series in a month are numbered in log order
+    assert len(events) == len(result['calc_log'])
+    for (month, series, step, n) in events:
+        assert n == 0 or (month, series, step, n - 1) in events
+
+
+def test_event_keys_are_stable_when_other_months_change():
+    _, old = calculate(stored_inputs())
+    edited = stored_inputs()
+    edited['tables']['activity'][2].update({'Contrib': '1000.0', 'Into Series': 'New Series'})
+    _, new = calculate(edited)
+    rows = diff_results(old, new, year=2024)
+    events = [row for row in rows if row['Change'] in ('added', 'changed', 'removed')]
+    assert {row['Series'] for row in events if row['Change'] == 'added'} == {'Series 3/2024'}
+    assert ('New Series', 'March', 'Series 3/2024') in [(row['Item'], row['Period'], row['Series']) for row in events]
+    assert not [row for row in events if row['Change'] == 'removed']
+    # Months before the new series are untouched
+    assert not [row for row in rows if row['Period'] in ('January', 'February', 'End of January')]
+
+
+def test_diff_results_values():
+    _, old = calculate(stored_inputs())
+    assert diff_results(old, old) == []
+
+    _, new = calculate(stored_inputs(pl=2000.0))
+    rows = diff_results(old, new, year=2024)
+    ending = next(row for row in rows if (row['Item'], row['Series']) == ('Ending NAV per Share', 'Initial Series'))
+    assert ending['Change'] == ending['New'] - ending['Old'] > 0
+    assert ending['Year'] == 2024
+
+
+def test_diff_stored_reports_missing_years(tmp_path):
+    conn = fund_store.connect(str(tmp_path / 'a.db'))
+    against = fund_store.connect(str(tmp_path / 'b.db'))
+    inputs = stored_inputs()
+    digest, result = calculate(inputs)
+    fund_store.save_result(conn, 'Fund A', 2024, inputs, digest, result)
+    fund_store.save_result(against, 'Fund A', 2024, inputs, digest, result)
+    fund_store.save_inputs(against, 'Fund A', 2025, stored_inputs(prior_year=2024), digest)
+    rows, missing = diff_stored(conn, 'Fund A', against, 'Fund A')
+    assert rows == []
+    assert missing == [2025]
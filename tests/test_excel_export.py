@@ -0,0 +1,82 @@
+import pytest
+from openpyxl import Workbook
+
+from engine import MONTHS, calculate_share_roll
+from excel_export import applied_flows, write_calculation_sheet
+
+PRIOR_SERIES = [
+    {'Series': 'Initial Series', 'Ending Shares': 100.0, 'NAV per Share': 1000.0, 'Total NAV': 100000.0,
+     'is_initial': True},
+    {'Series': 'Series 3/2024', 'Ending Shares': 10.0, 'NAV per Share': 990.0, 'Total NAV': 9900.0,
+     'is_initial': False},
+]
+
+
+def month(month_num, **activity):
+    return dict({'month': MONTHS[month_num - 1], 'month_num': month_num, 'pl': 500.0, 'contributions': 0.0,
+                 'contribution_series': None, 'contribution_pricing': 'post_pl', 'redemptions': 0.0,
+                 'redemption_series': None, 'full_redemption': False, 'multi_redemptions': []}, **activity)
+
+
+@pytest.fixture
+def fund():
+    monthly_data = [month(m) for m in range(1, 13)]
+    # A new series whose name a prior series already has, then a contribution into
+    # that prior series after it was fully redeemed (the engine skips it)
+    monthly_data[2] = month(3, contributions=5000.0)
+    monthly_data[3] = month(4, redemption_series='Series 3/2024', full_redemption=True)
+    monthly_data[4] = month(5, contributions=1000.0, contribution_series='Series 3/2024')
+    monthly_data[5] = month(6, multi_redemptions=[
+        {'series': 'Initial Series', 'amount': 1000.0, 'full': False},
+        {'series': 'Series 3/2024-2', 'amount': 100.0, 'full': False},
+        {'series': 'Series 3/2024-2', 'amount': 0.0, 'full': True},
+    ])
+    result = calculate_share_roll(PRIOR_SERIES, monthly_data, 1000.0, 2024)
+    return monthly_data, result
+
+
+def sheet_rows(monthly_data, result, formula_mode):
+    """{month: {series or 'Month Total': [row values from column B]}} of the Calculation Details sheet."""
+    workbook = Workbook()
+    sheet = write_calculation_sheet(workbook, PRIOR_SERIES, monthly_data, result, False, 2024, formula_mode)
+    blocks = {}
+    current = None
+    for row in sheet.iter_rows(values_only=True):
+        if row[0] in MONTHS:
+            current = blocks.setdefault(row[0], {})
+        elif current is not None and row[0] not in (None, 'Series'):
+            current[row[0]] = list(row[1:])
+    return blocks
+
+
+def test_applied_flows_follow_engine(fund):
+    monthly_data, result = fund
+    flows = applied_flows(result, monthly_data)
+    assert flows['March']['new_series'] == ('Series 3/2024-2', 5000.0)
+    assert flows['May']['post_pl'] == {}
+    assert flows['April']['redemptions'] == {'Series 3/2024': (pytest.approx(result['redemption_events'][0]['amount']), True)}
+    assert set(flows['June']['redemptions']) == {'Initial Series', 'Series 3/2024-2'}
+    assert flows['June']['redemptions']['Series 3/2024-2'][1]
+
+
+def test_calculation_sheet_matches_engine(fund):
+    monthly_data, result = fund
+    blocks = sheet_rows(monthly_data, result, 'values')
+    assert 'Series 3/2024-2' in blocks['March']
+    assert blocks['March']['Series 3/2024'][1] == 0
+    assert blocks['May']['Month Total'][1] == 0
+
+    # Ending NAV (last column) of every series matches the engine's month-end NAV
+    for month_name in ('April', 'May', 'June', 'December'):
+        nav_row = next(r for r in result['nav_tracking'] if r['Month'] == f'End of {month_name}')
+        shares_row = next(r for r in result['share_tracking'] if r['Month'] == f'End of {month_name}')
+        for series, values in blocks[month_name].items():
+            if series != 'Month Total':
+                assert values[-1] == pytest.approx(nav_row.get(series, 0) * shares_row.get(series, 0), abs=1e-6)
+
+
+def test_formula_sheet_uses_engine_names(fund):
+    monthly_data, result = fund
+    blocks = sheet_rows(monthly_data, result, 'formulas')
+    assert list(blocks['March']) == ['Initial Series', 'Series 3/2024', 'Series 3/2024-2', 'Month Total']
+    assert str(blocks['March']['Series 3/2024-2'][2]).startswith('=')
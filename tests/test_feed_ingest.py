@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+import feed_ingest
+import fund_store
+from conftest import stored_inputs
+from fund_inputs import stored_calc_inputs
+
+HEADER = 'Type,Series,Amount,Day,Full\n'
+
+
+@pytest.fixture
+def feeds(tmp_path, conn):
+    """Feed folder for 'Fund A', whose 2024 inputs are saved with no activity."""
+    inputs = stored_inputs(pl=0.0)
+    inputs['tables']['activity'][5].update({'Redemp $': None, 'From Series': None})
+    fund_store.save_inputs(conn, 'Fund A', 2024, inputs, fund_store.input_hash(stored_calc_inputs(inputs)[0]))
+    os.makedirs(tmp_path / 'feeds' / 'Fund A')
+    return tmp_path / 'feeds'
+
+
+def drop(feeds, name, text):
+    (feeds / 'Fund A' / name).write_text(HEADER + text)
+
+
+def process(conn, feeds, messages=None):
+    log = (messages.append if messages is not None else lambda message: None)
+    return feed_ingest.process_folder(conn, str(feeds), str(feeds / 'output'), log=log)
+
+
+def current_result(conn):
+    inputs = fund_store.load_inputs(conn, 'Fund A', 2024)
+    return fund_store.load_result(conn, 'Fund A', 2024, fund_store.input_hash(stored_calc_inputs(inputs)[0]))
+
+
+def test_read_feed_validation(tmp_path):
+    path = tmp_path / 'feed.csv'
+    path.write_text(HEADER + 'P/L,,"1,000",,\nBogus,,1,,\nRedemption,Initial Series,,,yes\n'
+                    'Subscription,,inf,,\nSubscription,,-5,,\nRedemption,Initial Series,10,31,\n')
+    items, errors = feed_ingest.read_feed(str(path), 2024, 4)
+    assert errors == [
+        "line 3: unknown type 'Bogus'",
+        "line 5: amount 'inf' is not a finite number",
+        "line 6: subscription amount must not be negative",
+        "April: line 7 day must be a day from 1 to 30",
+    ]
+    assert [item['type'] for item in items] == ['pl', 'redemption', 'redemption']
+    assert items[1]['full'] and items[1]['amount'] == 0.0
+
+
+def test_months_close_in_order(conn, feeds):
+    drop(feeds, '2024-01.csv', 'P/L,,5000,,\nSubscription,,20000,,\n')
+    drop(feeds, '2024-03.csv', 'P/L,,100,,\n')
+    assert process(conn, feeds) == {'closed': 1, 'pending': 1}
+    assert (feeds / 'Fund A' / '2024-03.csv').exists()
+    assert list(fund_store.feed_months(conn, 'Fund A', 2024)) == [1]
+
+    drop(feeds, '2024-02.csv', 'P/L,,-3000,,\nRedemption,Series 1/2024,1000,,\n')
+    messages = []
+    assert process(conn, feeds, messages) == {'closed': 2}
+    assert sorted(fund_store.feed_months(conn, 'Fund A', 2024)) == [1, 2, 3]
+    assert all('(advanced)' in message for message in messages)
+    assert sorted(os.listdir(feeds / 'processed' / 'Fund A')) == ['2024-01.csv', '2024-02.csv', '2024-03.csv']
+
+
+def test_result_is_stored_under_the_apps_digest(conn, feeds):
+    drop(feeds, '2024-01.csv', 'P/L,,5000,,\n')
+    process(conn, feeds)
+    result = current_result(conn)
+    assert result is not None
+    assert len(result['monthly_flows']) == 1
+
+    # A stored result the app recalculated for the full year can't be advanced, only recalculated
+    inputs = fund_store.load_inputs(conn, 'Fund A', 2024)
+    calc_inputs, _ = stored_calc_inputs(inputs)
+    full_year = feed_ingest.calculate_share_roll(calc_inputs['prior_series'], calc_inputs['monthly_data'],
+                                                 calc_inputs['par_value'], calc_inputs['current_year'])
+    fund_store.save_result(conn, 'Fund A', 2024, inputs, fund_store.input_hash(calc_inputs), full_year)
+    drop(feeds, '2024-02.csv', 'P/L,,100,,\n')
+    messages = []
+    assert process(conn, feeds, messages) == {'closed': 1}
+    assert '(recalculated)' in messages[0]
+    assert len(current_result(conn)['monthly_flows']) == 2
+
+
+def test_duplicate_and_conflicting_feeds(conn, feeds):
+    drop(feeds, '2024-01.csv', 'P/L,,5000,,\n')
+    process(conn, feeds)
+    drop(feeds, '2024-01.csv', 'P/L,,5000,,\n')
+    assert process(conn, feeds) == {'duplicate': 1}
+    assert not (feeds / 'Fund A' / '2024-01.csv').exists()
+
+    drop(feeds, '2024-01.csv', 'P/L,,6000,,\n')
+    assert process(conn, feeds) == {'rejected': 1}
+    errors = (feeds / 'rejected' / 'Fund A' / '2024-01.csv.errors.txt').read_text()
+    assert errors == "Fund A 2024-01 is already closed; correct it in the app\n"
+
+
+def test_invalid_feed_is_rejected_with_errors(conn, feeds):
+    drop(feeds, '2024-01.csv', 'P/L,,5000,,\nRedemption,Series 9/2024,100,,\n')
+    assert process(conn, feeds) == {'rejected': 1}
+    errors = (feeds / 'rejected' / 'Fund A' / '2024-01.csv.errors.txt').read_text()
+    assert errors == "January: redemption series 'Series 9/2024' does not exist yet\n"
+    assert fund_store.feed_months(conn, 'Fund A', 2024) == {}
+
+
+def test_unexpected_error_rejects_feed_and_keeps_going(conn, feeds, monkeypatch):
+    drop(feeds, '2024-01.csv', 'P/L,,5000,,\n')
+
+    def fail(*args, **kwargs):
+        raise ZeroDivisionError("division by zero")
+
+    monkeypatch.setattr(feed_ingest, 'calculate_share_roll', fail)
+    assert process(conn, feeds) == {'rejected': 1}
+    errors = (feeds / 'rejected' / 'Fund A' / '2024-01.csv.errors.txt').read_text()
+    assert errors == "ZeroDivisionError: division by zero\n"
@@ -0,0 +1,137 @@
+import pytest
+
+from engine import MONTHS
+from fund_inputs import (
+    ACTIVITY_COLUMNS, MULTI_COLUMNS, MULTIPLE_SERIES, NEW_SERIES, PRIOR_COLUMNS, apply_delta,
+    day_of_month, default_activity_table, default_multi_table, monthly_records, new_table, parse_cell, parse_float,
+    prior_series_records, table_rows,
+)
+
+
+def prior_records(rows=None):
+    rows = rows or [{'Series': 'Initial Series', 'Ending Shares': '100', 'NAV per Share': '1000'}]
+    return prior_series_records(new_table(PRIOR_COLUMNS, rows), 1.0, 20.0)
+
+
+def activity_table(**by_month):
+    """Default activity table with rows for the named months (e.g. January={'P/L': '5'}) replaced."""
+    rows = [dict({'Month': month, 'Full?': False}, **by_month.get(month, {})) for month in MONTHS]
+    return new_table(ACTIVITY_COLUMNS, rows)
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('1,234.5', 1234.5), ('$12', 12.0), (' 7 ', 7.0), ('', 0.0), (None, 0.0), ('abc', 0.0), (3, 3.0),
+])
+def test_parse_float(raw, expected):
+    assert parse_float(raw) == expected
+
+
+def test_parse_cell_types():
+    assert parse_cell('P/L', '$1,000') == (1000.0, None)
+    assert parse_cell('P/L', ' ') == (None, None)
+    assert parse_cell('P/L', 'ten') == (None, "'ten' is not a number")
+    assert parse_cell('Full?', None) == (False, None)
+    assert parse_cell('Into Series', '') == (None, None)
+    assert parse_cell('Series', '  A  ') == ('A', None)
+
+
+@pytest.mark.parametrize('raw', ['inf', '-inf', 'nan', 'Infinity', '1e999'])
+@pytest.mark.parametrize('column', ['P/L', 'Contrib Day', 'Redemp Day', 'Day'])
+def test_parse_cell_rejects_non_finite(column, raw):
+    value, error = parse_cell(column, raw)
+    assert value is None
+    assert error == f"'{raw}' is not a finite number"
+
+
+@pytest.mark.parametrize('raw', ['inf', '-inf', 'nan'])
+def test_non_finite_days_are_errors_not_crashes(raw):
+    activity = activity_table(March={'Contrib': '500', 'Contrib Day': raw, 'Into Series': NEW_SERIES})
+    multi = new_table(MULTI_COLUMNS, [{'Month': 'March', 'Redemp $': '10', 'Day': raw,
+                                       'From Series': 'Initial Series', 'Full?': False}])
+    monthly_data, errors = monthly_records(activity, multi, prior_records(), 2024, 'par')
+    assert monthly_data[2]['contribution_day'] is None
+    assert "Row 3, Contrib Day: '%s' is not a finite number" % raw in errors
+    assert "Row 1, Day: '%s' is not a finite number" % raw in errors
+
+
+def test_apply_delta_reparses_only_changed_cells():
+    table = default_activity_table()
+    apply_delta(table, {'edited_rows': {0: {'P/L': '1,000'}}})
+    assert table['typed']['P/L'][0] == 1000.0
+    cached = table['cache'][(0, 'P/L')]
+    apply_delta(table, {'edited_rows': {'0': {'P/L': '1,000'}, 1: {'P/L': 'x'}}})
+    assert table['cache'][(0, 'P/L')] is cached
+    assert table['errors'] == ["Row 2, P/L: 'x' is not a number"]
+
+    apply_delta(table, {'deleted_rows': [0], 'added_rows': [{'Month': 'January', 'P/L': '5'}]})
+    assert len(table['typed']['Month']) == 12
+    assert table['typed']['P/L'][-1] == 5.0
+
+
+def test_table_rows_round_trip():
+    table = new_table(PRIOR_COLUMNS, [{'Series': 'Initial Series', 'Ending Shares': '1,000.5', 'NAV per Share': ''}])
+    rows = table_rows(table)
+    assert rows[0]['Ending Shares'] == '1000.5'
+    assert rows[0]['NAV per Share'] is None
+    assert new_table(PRIOR_COLUMNS, rows)['typed'] == table['typed']
+
+
+def test_prior_series_records_defaults():
+    record = prior_records()[0]
+    assert record['is_initial']
+    assert record['Total NAV'] == 100000.0
+    assert record['Management Fee'] == 0.01
+    assert record['Incentive Fee'] == 0.2
+    assert record['High-Water Mark'] == 1000.0
+
+
+def test_monthly_records_validation():
+    activity = activity_table(
+        January={'Contrib': '500', 'Into Series': 'Series 3/2024'},
+        February={'Redemp $': '10'},
+        March={'Contrib': '500', 'Into Series': NEW_SERIES},
+        April={'Redemp $': '10', 'From Series': 'Series 3/2024', 'Redemp Day': '31'},
+    )
+    monthly_data, errors = monthly_records(activity, default_multi_table(), prior_records(), 2024, 'par')
+    assert errors == [
+        "January: contribution target 'Series 3/2024' does not exist yet",
+        "February: select the series to redeem from",
+        "April: redemption day must be a day from 1 to 30",
+    ]
+    assert monthly_data[2]['contribution_series'] is None
+    assert monthly_data[3]['redemption_series'] == 'Series 3/2024'
+    assert monthly_data[3]['redemption_day'] is None
+
+
+def test_monthly_records_multi_redemptions():
+    activity = activity_table(May={'From Series': MULTIPLE_SERIES})
+    multi = new_table(MULTI_COLUMNS, [
+        {'Month': 'May', 'Redemp $': '10', 'Day': '2', 'From Series': 'Initial Series', 'Full?': False},
+        {'Month': 'May', 'Redemp $': '', 'Day': None, 'From Series': 'Series 1/2024', 'Full?': True},
+        {'Month': 'May', 'Redemp $': '', 'Day': None, 'From Series': 'Initial Series', 'Full?': False},
+    ])
+    monthly_data, errors = monthly_records(activity, multi, prior_records(), 2024, 'par')
+    assert errors == ["May: redemption series 'Series 1/2024' does not exist yet"]
+    assert [mr['series'] for mr in monthly_data[4]['multi_redemptions']] == ['Initial Series', 'Series 1/2024']
+    assert monthly_data[4]['multi_redemptions'][0]['day'] == 2
+
+
+@pytest.mark.parametrize('value', [float('inf'), float('-inf'), float('nan'), 2.5, 0, 31])
+def test_day_of_month_rejects_without_raising(value):
+    errors = []
+    assert day_of_month(value, 2, 2024, 'day', errors) is None
+    assert errors == ["February: day must be a day from 1 to 29"]
+
+
+def test_multi_rows_need_multiple_series_month():
+    activity = activity_table(June={'Redemp $': '10', 'From Series': 'Initial Series'})
+    multi = new_table(MULTI_COLUMNS, [
+        {'Month': 'June', 'Redemp $': '10', 'Day': None, 'From Series': 'Initial Series', 'Full?': False},
+        {'Month': 'July', 'Redemp $': '', 'Day': None, 'From Series': 'Initial Series', 'Full?': True},
+    ])
+    monthly_data, errors = monthly_records(activity, multi, prior_records(), 2024, 'par')
+    assert errors == [
+        f"June: Multiple Series redemptions are entered but From Series is not '{MULTIPLE_SERIES}'",
+        f"July: Multiple Series redemptions are entered but From Series is not '{MULTIPLE_SERIES}'",
+    ]
+    assert monthly_data[5]['multi_redemptions'] == []
@@ -0,0 +1,71 @@
+import pytest
+
+import fund_store
+from conftest import calculate, stored_inputs
+
+
+def query_rows(conn, fund='Fund A', year=2024):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table} WHERE fund = ? AND year = ?",
+                                (fund, year)).fetchone()[0]
+            for table in fund_store.QUERY_TABLES}
+
+
+def test_result_round_trip(conn):
+    inputs = stored_inputs()
+    digest, result = calculate(inputs)
+    fund_store.save_result(conn, 'Fund A', 2024, inputs, digest, result)
+    assert fund_store.load_inputs(conn, 'Fund A', 2024) == inputs
+    assert fund_store.load_result(conn, 'Fund A', 2024, digest)['series_data'] == result['series_data']
+    assert fund_store.list_fund_years(conn) == {'Fund A': [2024]}
+    assert all(query_rows(conn).values())
+
+
+def test_edited_inputs_make_result_stale(conn):
+    inputs = stored_inputs()
+    digest, result = calculate(inputs)
+    fund_store.save_result(conn, 'Fund A', 2024, inputs, digest, result)
+
+    edited = stored_inputs(pl=-500.0)
+    edited_digest, _ = calculate(edited)
+    fund_store.save_inputs(conn, 'Fund A', 2024, edited, edited_digest)
+    assert fund_store.load_result(conn, 'Fund A', 2024, edited_digest) is None
+    assert fund_store.load_result(conn, 'Fund A', 2024) is not None
+    assert not any(query_rows(conn).values())
+
+    # Changing the inputs back makes the stored result current again
+    fund_store.save_inputs(conn, 'Fund A', 2024, inputs, digest)
+    assert fund_store.load_result(conn, 'Fund A', 2024, digest) is not None
+    assert all(query_rows(conn).values())
+
+
+def test_stale_years_stay_out_of_rebuilt_query_tables(conn):
+    for year in (2024, 2025):
+        inputs = stored_inputs(prior_year=year - 1)
+        digest, result = calculate(inputs)
+        fund_store.save_result(conn, 'Fund A', year, inputs, digest, result)
+    edited = stored_inputs(pl=0.0, prior_year=2024)
+    fund_store.save_inputs(conn, 'Fund A', 2025, edited, calculate(edited)[0])
+
+    fund_store.rebuild_query_tables(conn)
+    assert all(query_rows(conn, year=2024).values())
+    assert not any(query_rows(conn, year=2025).values())
+
+
+def test_failed_save_result_keeps_previous_state(conn, monkeypatch):
+    inputs = stored_inputs()
+    digest, result = calculate(inputs)
+    fund_store.save_result(conn, 'Fund A', 2024, inputs, digest, result)
+    before = query_rows(conn)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("index failed")
+
+    edited = stored_inputs(pl=-500.0)
+    edited_digest, edited_result = calculate(edited)
+    monkeypatch.setattr(fund_store, 'index_result', fail)
+    with pytest.raises(RuntimeError):
+        fund_store.save_result(conn, 'Fund A', 2024, edited, edited_digest, edited_result)
+
+    assert fund_store.load_inputs(conn, 'Fund A', 2024) == inputs
+    assert fund_store.load_result(conn, 'Fund A', 2024, digest) is not None
+    assert query_rows(conn) == before
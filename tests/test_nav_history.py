@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+
+from nav_history import INITIAL_CAPACITY, NavHistory, nav_history_path
+
+
+def rows(history):
+    """{period: {series: NAV}} of a history, skipping NaN cells."""
+    matrix = history.matrix()
+    return {label: {name: matrix[i, col] for name, col in history.series_index.items()
+                    if not math.isnan(matrix[i, col])}
+            for i, label in enumerate(history.periods)}
+
+
+def test_append_keeps_period_order(tmp_path):
+    history = NavHistory(str(tmp_path))
+    history.append('2024-01', {'A': 1.0})
+    history.append('2024-03', {'A': 3.0, 'B': 30.0})
+    history.append('2023-12', {'A': 0.5})
+    history.append('2024-02', {'B': 20.0})
+    assert history.periods == ['2023-12', '2024-01', '2024-02', '2024-03']
+    assert rows(history) == {'2023-12': {'A': 0.5}, '2024-01': {'A': 1.0}, '2024-02': {'B': 20.0},
+                             '2024-03': {'A': 3.0, 'B': 30.0}}
+
+
+def test_append_replaces_same_period(tmp_path):
+    history = NavHistory(str(tmp_path))
+    for label in ('2024-01', '2024-02', '2024-03'):
+        history.append(label, {'A': 1.0})
+    history.append('2024-02', {'B': 2.0})
+    assert history.periods == ['2024-01', '2024-02', '2024-03']
+    assert rows(history)['2024-02'] == {'B': 2.0}
+
+    reopened = NavHistory(str(tmp_path))
+    assert reopened.periods == history.periods
+    assert rows(reopened) == rows(history)
+
+
+def test_repeat_and_clear_periods(tmp_path):
+    history = NavHistory(str(tmp_path))
+    history.append('2023-12', {'A': 9.0})
+    history.append('2024-01', {'A': 1.0})
+    history.repeat('2024-02', '2024-01')
+    history.append('2025-01', {'A': 5.0})
+    assert rows(history)['2024-02'] == {'A': 1.0}
+
+    history.clear_periods('2024-01', '2024-12')
+    assert history.periods == ['2023-12', '2025-01']
+    assert rows(history) == {'2023-12': {'A': 9.0}, '2025-01': {'A': 5.0}}
+
+
+def test_growing_past_capacity_keeps_rows(tmp_path):
+    history = NavHistory(str(tmp_path))
+    history.append('2024-01', {f'S{i}': float(i) for i in range(INITIAL_CAPACITY)})
+    history.append('2024-02', {f'S{i}': float(i) for i in range(INITIAL_CAPACITY + 3)})
+    assert history.capacity == 2 * INITIAL_CAPACITY
+    np.testing.assert_array_equal(history.series_column('S5'), [5.0, 5.0])
+    assert math.isnan(history.series_column(f'S{INITIAL_CAPACITY}')[0])
+    assert list(history.to_frame(series=['S1']).index) == ['2024-01', '2024-02']
+
+
+def test_partial_trailing_row_is_dropped(tmp_path):
+    history = NavHistory(str(tmp_path))
+    history.append('2024-01', {'A': 1.0})
+    history.append('2024-02', {'A': 2.0})
+    with open(history._matrix_path, 'ab') as f:
+        f.truncate(history.capacity * 8 + 8)
+    assert NavHistory(str(tmp_path)).periods == ['2024-01']
+
+
+def test_nav_history_path_is_filesystem_safe(tmp_path):
+    assert nav_history_path('Fund A / Class B', str(tmp_path)) == str(tmp_path / 'Fund_A_Class_B')
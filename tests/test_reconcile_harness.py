@@ -0,0 +1,20 @@
+import reconcile_harness
+from engine import calculate_share_roll
+from reconcile_harness import accepted_kwargs, reference_share_roll
+
+
+def test_accepted_kwargs_follow_signature():
+    kwargs = {'new_series_fees': None, 'checkpoints': {}, 'nav_history': None}
+    assert accepted_kwargs(reference_share_roll, **kwargs) == {}
+    assert accepted_kwargs(calculate_share_roll, **kwargs) == kwargs
+    assert accepted_kwargs(lambda *args, **rest: None, **kwargs) == kwargs
+
+
+def test_harness_runs_reference_as_engine(capsys):
+    assert reconcile_harness.main(['--cases', '200', '--workers', '1',
+                                   '--engine', 'reconcile_harness:reference_share_roll']) == 0
+    assert '200 cases, 0 failing' in capsys.readouterr().out
+
+
+def test_harness_passes_engine():
+    assert reconcile_harness.main(['--cases', '200', '--workers', '1']) == 0